@@ -0,0 +1,90 @@
+import random
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from pypes.models.pipeline import Pipeline
+from pypes.models.step import Step
+
+
+def step_name(i: int) -> str:
+    return "step {}".format(i)
+
+
+def resource_name(i: int) -> str:
+    return "r{}".format(i)
+
+
+def build_pipeline(
+    name: str, inputs: List[List[int]], resource_dir: Path = Path(".")
+) -> Pipeline:
+    # step i writes resource i and reads the resources of the steps it
+    # depends on, every step is a no-op
+    steps = [
+        Step(
+            name=step_name(i),
+            inputs=[resource_name(x) for x in depends],
+            outputs=[resource_name(i)],
+            argv=["true"],
+        )
+        for i, depends in enumerate(inputs)
+    ]
+    pipeline = Pipeline(name=name, owner="benchmarks")
+    pipeline.add_steps(steps)
+    pipeline.add_resources(
+        {resource_name(i): resource_dir / resource_name(i) for i in range(len(steps))}
+    )
+    return pipeline
+
+
+def wide_inputs(size: int) -> List[List[int]]:
+    # one step fans out to all the others, which fan back in to the last
+    if size < 3:
+        return deep_inputs(size)
+    middle = list(range(1, size - 1))
+    return [[]] + [[0] for _ in middle] + [middle]
+
+
+def deep_inputs(size: int) -> List[List[int]]:
+    return [[]] + [[i - 1] for i in range(1, size)]
+
+
+def diamond_inputs(size: int) -> List[List[int]]:
+    # a chain of diamonds, each step splits in two and joins again
+    inputs: List[List[int]] = []
+    for i in range(size):
+        position = i % 3
+        if i == 0:
+            inputs.append([])
+        elif position == 0:
+            inputs.append([i - 2, i - 1])
+        elif position == 1:
+            inputs.append([i - 1])
+        else:
+            inputs.append([i - 2])
+    return inputs
+
+
+def random_inputs(size: int, seed: int = 0, max_inputs: int = 3) -> List[List[int]]:
+    # each step reads up to max_inputs of the steps before it, so the graph
+    # is always acyclic
+    rng = random.Random(seed)
+    return [
+        sorted(rng.sample(range(i), min(i, rng.randint(0, max_inputs))))
+        for i in range(size)
+    ]
+
+
+SHAPES: Dict[str, Callable[[int], List[List[int]]]] = {
+    "wide": wide_inputs,
+    "deep": deep_inputs,
+    "diamond": diamond_inputs,
+    "random": random_inputs,
+}
+
+
+def generate_pipeline(
+    shape: str, size: int, resource_dir: Path = Path(".")
+) -> Pipeline:
+    return build_pipeline(
+        "{} {}".format(shape, size), SHAPES[shape](size), resource_dir=resource_dir
+    )
@@ -0,0 +1,65 @@
+"""Per step launch latency of shell and argv commands.
+
+Run from the repository root:
+
+    python benchmarks/spawn.py --steps 500
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from pypes.exec.step import run_step_async  # noqa: E402
+from pypes.exec.template import TemplateCache  # noqa: E402
+from pypes.history import percentile  # noqa: E402
+from pypes.models.step import Step  # noqa: E402
+
+MODES = {
+    "shell": Step(name="shell", command="true"),
+    "argv": Step(name="argv", argv=["true"]),
+}
+
+
+async def time_steps(step: Step, count: int) -> List[float]:
+    # one template cache for every step, like a pipeline run
+    templates = TemplateCache()
+    latencies: List[float] = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await run_step_async(step, {}, {}, templates=templates)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def spawn_latencies(count: int, warmup: int = 20) -> Dict[str, List[float]]:
+    results: Dict[str, List[float]] = {}
+    for mode, step in MODES.items():
+        asyncio.run(time_steps(step, warmup))
+        results[mode] = asyncio.run(time_steps(step, count))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args(argv)
+    for mode, latencies in spawn_latencies(args.steps, args.warmup).items():
+        print(
+            "{:<6} mean {:.3f}ms  p50 {:.3f}ms  p95 {:.3f}ms".format(
+                mode,
+                sum(latencies) / len(latencies),
+                percentile(latencies, 50),
+                percentile(latencies, 95),
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
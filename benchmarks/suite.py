@@ -0,0 +1,173 @@
+"""Times pypes on synthetic pipelines and fails on regressions.
+
+Run from the repository root:
+
+    python -m benchmarks.suite             # compare against the baseline
+    python -m benchmarks.suite --update    # record a new baseline
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from benchmarks.generators import SHAPES, generate_pipeline  # noqa: E402
+from pypes.exec.depend import get_execution_order, pipeline_to_dag  # noqa: E402
+from pypes.exec.pipeline import run_pipeline  # noqa: E402
+from pypes.persist import deserialise_pipeline, serialise_pipeline  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+SIZES = [10, 100, 1000, 10000, 100000]
+
+# running starts a process per step, so only smaller pipelines are run
+MAX_RUN_SIZE = 1000
+
+# a result regresses when it is slower than its baseline by both of these
+DEFAULT_TOLERANCE = 0.5
+MIN_REGRESSION = 0.005
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    # the fastest run is the one least disturbed by everything else
+    times: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def calibrate(repeat: int) -> float:
+    # a fixed workload, so a baseline from another machine can be scaled
+    return best_time(lambda: sorted(str(i) for i in range(200_000)), repeat)
+
+
+def result_key(shape: str, size: int, operation: str) -> str:
+    return "{}/{}/{}".format(shape, size, operation)
+
+
+def time_pipeline(
+    shape: str,
+    size: int,
+    repeat: int,
+    run_dir: Path,
+    jobs: int = 4,
+    max_run_size: int = MAX_RUN_SIZE,
+) -> Dict[str, float]:
+    pipeline = generate_pipeline(shape, size, resource_dir=run_dir)
+    dag = pipeline_to_dag(pipeline)
+    text = serialise_pipeline(pipeline)
+    names = [x.name for x in pipeline.steps]
+
+    def run():
+        pipeline_run = run_pipeline(pipeline, jobs=jobs)
+        if pipeline_run.outcome != "finished":
+            raise RuntimeError("{} did not finish!".format(pipeline.name))
+
+    operations: Dict[str, Callable[[], Any]] = {
+        "pipeline_to_dag": lambda: pipeline_to_dag(pipeline),
+        "get_execution_order": lambda: get_execution_order(dag),
+        "serialise_pipeline": lambda: serialise_pipeline(pipeline),
+        "deserialise_pipeline": lambda: deserialise_pipeline(text),
+        "get_step": lambda: [pipeline.get_step(x) for x in names],
+    }
+    if size <= max_run_size:
+        operations["run_pipeline"] = run
+    return {
+        result_key(shape, size, operation): best_time(func, repeat)
+        for operation, func in operations.items()
+    }
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    scale: float = 1.0,
+    tolerance: float = DEFAULT_TOLERANCE,
+    min_regression: float = MIN_REGRESSION,
+) -> List[str]:
+    regressions: List[str] = []
+    for key, seconds in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key] * scale
+        if seconds > expected * (1 + tolerance) and seconds - expected > min_regression:
+            regressions.append(
+                "{} took {:.4f}s, baseline {:.4f}s".format(key, seconds, expected)
+            )
+    return regressions
+
+
+def read_baseline(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=None)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--max-run-size", type=int, default=MAX_RUN_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument(
+        "--update", action="store_true", help="record the results as the baseline"
+    )
+    args = parser.parse_args(argv)
+
+    calibration = calibrate(args.repeat)
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as run_dir:
+        for shape in args.shapes or list(SHAPES):
+            for size in args.sizes:
+                timings = time_pipeline(
+                    shape,
+                    size,
+                    args.repeat,
+                    Path(run_dir),
+                    jobs=args.jobs,
+                    max_run_size=args.max_run_size,
+                )
+                for key, seconds in timings.items():
+                    print("{:<40} {:>10.4f}s".format(key, seconds), flush=True)
+                results.update(timings)
+
+    report = {
+        "python": platform.python_version(),
+        "calibration": calibration,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True))
+    if args.update:
+        args.baseline.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print("baseline written to {}".format(args.baseline))
+        return 0
+
+    baseline = read_baseline(args.baseline)
+    if baseline is None:
+        print("no baseline at {}, run with --update".format(args.baseline))
+        return 1
+    scale = calibration / baseline["calibration"]
+    regressions = compare(
+        results, baseline["results"], scale=scale, tolerance=args.tolerance
+    )
+    for regression in regressions:
+        print("regression: {}".format(regression))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,6 +14,7 @@ from pypes.cli.validators import (
     YesNoValidator,
 )
 from pypes.models.pipeline import Pipeline
+from pypes.models.resource import Resource
 from pypes.models.step import Step
 
 T = TypeVar("T", Dict[Any, Any], List[Any])
@@ -117,9 +118,9 @@ def add_resources(pipeline: Pipeline):
         name = prompt(
             "Name of resource: ",
             default=os.path.splitext(os.path.split(path)[-1])[0],
-            validator=UniqueValidator([x for x in pipeline.resources]),
+            validator=UniqueValidator(pipeline.known_keys),
         )
-        pipeline.resources[name] = Path(path)
+        pipeline.add_resources({name: Path(path)})
         return pipeline
 
     return while_not_finished_pipeline(
@@ -130,8 +131,8 @@ def add_resources(pipeline: Pipeline):
 
 
 def choose_resource(
-    resources: Dict[str, Path], prompt_message: str
-) -> Tuple[str, Path]:
+    resources: Dict[str, Resource], prompt_message: str
+) -> Tuple[str, Resource]:
     resource_names = [x for x in resources.keys()]
     choice = prompt(
         prompt_message,
@@ -185,11 +186,11 @@ def add_context(pipeline: Pipeline) -> Pipeline:
     ) -> Dict[str, str]:
         key = prompt(
             "Context key: ",
-            validator=KeyValidator([x for x in context]),
+            validator=KeyValidator(pipeline.known_keys),
         )
         value = prompt("Context value: ")
-        context[key] = value
-        return context
+        pipeline.add_context({key: value})
+        return pipeline.context
 
     pipeline.context = while_not_finished_mutateable(
         pipeline,
@@ -216,7 +217,7 @@ def add_steps(pipeline: Pipeline):
             + [x for x in pipeline.context.keys()],
         )
 
-        pipeline.steps.append(
+        pipeline.add_step(
             Step(
                 name=name,
                 inputs=inputs,
@@ -1,12 +1,12 @@
 import re
-from pathlib import Path
 from typing import Dict, List, Optional
 
 from prompt_toolkit.validation import ValidationError, Validator
+from pypes.models.resource import Resource
 
 
 class PathValidator(Validator):
-    def __init__(self, resources: Optional[Dict[str, Path]] = None):
+    def __init__(self, resources: Optional[Dict[str, Resource]] = None):
         self.resources = resources or {}
 
     def validate(self, document):
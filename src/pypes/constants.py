@@ -2,9 +2,51 @@ from typing import Dict
 
 DEFAULT_CONFIG_PATH = "./.pipeline.conf"
 
-qsub_template = (
-    "qsub {% if depends_str %}{{ depends_str }}{% endif %} {{ header_file }}"
-)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_LOG_DIR = "./.pypes/logs"
+
+DEFAULT_JOBS_DIR = "./.pypes/jobs"
+
+DEFAULT_JOURNAL_DIR = "./.pypes/runs"
+
+DEFAULT_HISTORY_PATH = "./.pypes/history.db"
+
+# how many past runs of a pipeline its duration estimates are taken from
+DEFAULT_HISTORY_RUNS = 20
+
+# seconds assumed for a step with no history or estimate, if no step has one
+DEFAULT_STEP_ESTIMATE = 1.0
+
+DEFAULT_SUBMIT_JOBS = 8
+
+# seconds a step gets to exit after SIGTERM before it is sent SIGKILL
+DEFAULT_KILL_GRACE = 5.0
+
+# longer afterok lists are split across intermediate barrier jobs
+DEFAULT_MAX_DEPENDS = 100
+
+barrier_pbs_context: Dict[str, str] = {
+    "walltime": "00:05:00",
+    "ncpus": "1",
+    "conda_env": "",
+    "load_module": "",
+}
+
+# names a map step's command sees for each shard, and its gather command sees
+MAP_SHARD_NAMES = ["item", "index"]
+MAP_GATHER_NAMES = ["items"]
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+MAX_POLL_INTERVAL = 60.0
+
+# polls in a row a job can be missing from qstat before it counts as lost
+MAX_MISSING_POLLS = 3
+
+DEFAULT_EXCERPT_SIZE = 4 * 1024
+
+DEFAULT_CACHE_MAX_SIZE = 10 * 1024**3
 
 default_env = "nullarbor"
 
@@ -17,12 +59,22 @@ default_pbs_context: Dict[str, str] = {
     "conda_env": default_env,
 }
 
+# header keys that are only tested with {% if %}, so they may be left unset
+optional_pbs_context: Dict[str, str] = {
+    "email": "",
+    "notify": "",
+    "mem": "",
+    "conda_env": "",
+    "load_module": "",
+}
+
 header_template = """
 #PBS -S {{ shell }}
 #PBS -N {{ job_name }}
 #PBS -l walltime={{ walltime }}
 #PBS -l ncpus={{ ncpus }}
-#PBS -j {{ join }}
+{% if mem %}#PBS -l mem={{ mem }}
+{% endif %}#PBS -j {{ join }}
 {% if email %}#PBS -M {{ email }}
 {% if notify %}#PBS -m {{ notify }}{% endif %}
 {% endif %}
@@ -35,7 +87,10 @@ fi
 cd $PBS_O_WORKDIR
 
 # load module
-. /etc/profile.d/modules.sh
+if [ -f /etc/profile.d/modules.sh ]
+    then
+        . /etc/profile.d/modules.sh
+fi
 
 {% if conda_env %}
 module load python/miniconda
@@ -49,8 +104,10 @@ module load {{ load_module }}
 {{ command }}
 ret_code=$?
 
+{% if conda_env %}
 # deactivate conda
 conda deactivate
+{% endif %}
 
 exit $ret_code
 """
@@ -1,19 +1,38 @@
 import json
 import os
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
 
 import typer
-from names_generator import generate_name
 
-from pypes.cli.utils import build_pipeline_interactive, edit_pipeline_interactive
-from pypes.constants import default_pbs_context
-from pypes.exec.pipeline import run_pbs_pipeline
-from pypes.models.pipeline import Pipeline
-from pypes.persist import read_pipeline, write_pipeline
+from pypes.constants import (
+    DEFAULT_CACHE_MAX_SIZE,
+    DEFAULT_EXCERPT_SIZE,
+    DEFAULT_HISTORY_PATH,
+    DEFAULT_JOURNAL_DIR,
+    DEFAULT_LOG_DIR,
+    DEFAULT_SUBMIT_JOBS,
+    default_pbs_context,
+)
+from pypes.units import format_size, parse_size
+
+# pypes is called from batch scripts thousands of times, so each command
+# imports what it needs (prompt_toolkit, networkx, jinja2, ...) itself
+if TYPE_CHECKING:  # pragma: no cover
+    from pypes.exec.cache import StepCache
+    from pypes.models.run import StepRun
 
 app = typer.Typer(name="pypes", help="Pypes: the unix pipeline builder!")
+cache_app = typer.Typer(name="cache", help="Inspect and prune the step result cache.")
+app.add_typer(cache_app, name="cache")
 
 
 def get_name() -> str:
+    from names_generator import generate_name
+
     return generate_name(style="capital")
 
 
@@ -30,6 +49,10 @@ def pipeline_create(
         help="The name of the author of this pipeline (you).",
     ),
 ):
+    from pypes.cli.utils import build_pipeline_interactive
+    from pypes.models.pipeline import Pipeline
+    from pypes.persist import write_pipeline
+
     pipeline = Pipeline(name=name, owner=owner)
     pipeline.add_context(default_pbs_context)
     pipeline = build_pipeline_interactive(pipeline)
@@ -38,16 +61,431 @@ def pipeline_create(
 
 @app.command("edit")
 def pipeline_edit():
+    from pypes.cli.utils import edit_pipeline_interactive
+    from pypes.persist import read_pipeline, write_pipeline
+
     pipeline = read_pipeline()
     pipeline = edit_pipeline_interactive(pipeline)
     write_pipeline(pipeline)
 
 
 @app.command("run")
-def pipeline_run():
+def pipeline_run(
+    targets: Optional[List[str]] = typer.Option(
+        None,
+        "--target",
+        help="Only run what is needed to build this step or resource, "
+        "skipping steps that are up to date. Can be repeated.",
+    ),
+    from_steps: Optional[List[str]] = typer.Option(
+        None,
+        "--from",
+        help="Only run this step and the steps downstream of it. Can be repeated.",
+    ),
+    only: Optional[List[str]] = typer.Option(
+        None,
+        "--only",
+        help="Run this step on its own. Can be repeated.",
+    ),
+    local: bool = typer.Option(
+        False,
+        "--local",
+        help="Run the steps on this machine instead of submitting them to PBS.",
+    ),
+    jobs: Optional[int] = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        min=1,
+        help="The maximum number of steps to run at once (local runs only). "
+        "Defaults to 1, or to the number of cpus when steps declare requirements.",
+    ),
+    cpus: Optional[int] = typer.Option(
+        None,
+        "--cpus",
+        min=1,
+        help="Pack steps by their declared cpus into this many cpus instead of "
+        "the ones this machine has (local runs only).",
+    ),
+    memory: Optional[str] = typer.Option(
+        None,
+        "--memory",
+        help="Pack steps by their declared memory into this much memory instead "
+        "of what this machine has available (local runs only).",
+    ),
+    keep_going: bool = typer.Option(
+        False,
+        "--keep-going",
+        "-k",
+        help="Keep running independent steps after a step fails (local runs only).",
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Skip steps whose outputs are newer than their inputs (local runs only). "
+        "An empty output a shell command redirects into counts as out of date.",
+    ),
+    cache: bool = typer.Option(
+        False,
+        "--cache",
+        help="Restore step outputs from the result cache when possible "
+        "(local runs only).",
+    ),
+    log_dir: Path = typer.Option(
+        DEFAULT_LOG_DIR,
+        "--log-dir",
+        help="Directory to write each step's stdout and stderr to (local runs only).",
+    ),
+    compress_logs: bool = typer.Option(
+        False,
+        "--compress-logs",
+        help="Gzip the step log files (local runs only).",
+    ),
+    excerpt_size: str = typer.Option(
+        format_size(DEFAULT_EXCERPT_SIZE),
+        "--excerpt-size",
+        help="How much of the start and end of each step's output to keep "
+        "in the results.",
+    ),
+    resume: Optional[str] = typer.Option(
+        None,
+        "--resume",
+        help="Rerun only the failed and unfinished steps of an earlier run, "
+        "given its id (local runs only).",
+    ),
+    journal_dir: Path = typer.Option(
+        DEFAULT_JOURNAL_DIR,
+        "--journal-dir",
+        help="Directory to record the progress of each run in (local runs only).",
+    ),
+    history_path: Path = typer.Option(
+        DEFAULT_HISTORY_PATH,
+        "--history-db",
+        help="The sqlite database to record the run in.",
+    ),
+    events: str = typer.Option(
+        "json",
+        "--events",
+        help="Print the result as one json document when the run is over, or "
+        "with ndjson, one json line per event as it happens (local runs only).",
+    ),
+    events_file: Optional[Path] = typer.Option(
+        None,
+        "--events-file",
+        help="Write the ndjson events to this file instead of stdout.",
+    ),
+    submit_jobs: int = typer.Option(
+        DEFAULT_SUBMIT_JOBS,
+        "--submit-jobs",
+        min=1,
+        help="The maximum number of jobs to submit to PBS at once.",
+    ),
+    reduce_depends: bool = typer.Option(
+        False,
+        "--reduce-depends",
+        help="Drop PBS dependencies already implied by other dependencies.",
+    ),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        help="Wait for the submitted PBS jobs to finish, reporting their progress.",
+    ),
+):
+    from pypes.exceptions import NoMatchingRunException, NoMatchingStepException
+    from pypes.exec.backends.pbs import PBSBackend
+    from pypes.exec.cache import StepCache
+    from pypes.exec.capacity import declares_requirements, detect_capacity
+    from pypes.exec.depend import pipeline_to_dag, select_steps
+    from pypes.exec.events import EVENT_FORMATS, NdjsonEvents
+    from pypes.exec.fresh import stale_steps
+    from pypes.exec.journal import RunJournal, completed_step_runs, read_journal
+    from pypes.exec.observers import RunObserver
+    from pypes.exec.pipeline import run_pbs_pipeline, run_pipeline
+    from pypes.exec.plan import step_priorities
+    from pypes.exec.spool import LogConfig
+    from pypes.exec.track import JobTracker
+    from pypes.history import HistoryStore
+    from pypes.models.run import StepRun
+    from pypes.persist import read_pipeline
+
     pipeline = read_pipeline()
-    exec_results = run_pbs_pipeline(pipeline)
-    print(json.dumps(exec_results.dict(), indent=2, default=str))
+    dag = pipeline_to_dag(pipeline)
+    steps = None
+    if targets or from_steps or only:
+        try:
+            steps = select_steps(
+                pipeline,
+                dag,
+                targets=targets or [],
+                from_steps=from_steps or [],
+                only=only or [],
+            )
+        except NoMatchingStepException as e:
+            raise typer.BadParameter(str(e))
+    if resume is not None and not local:
+        raise typer.BadParameter("--resume only applies to local runs")
+    if events not in EVENT_FORMATS:
+        raise typer.BadParameter(
+            "must be one of {}".format(EVENT_FORMATS), param_hint="--events"
+        )
+    if events == "ndjson" and not local:
+        raise typer.BadParameter("--events ndjson only applies to local runs")
+    if events_file is not None and events != "ndjson":
+        raise typer.BadParameter("--events-file only applies to --events ndjson")
+    completed: List[StepRun] = []
+    if resume is not None:
+        try:
+            completed = completed_step_runs(read_journal(resume, journal_dir))
+        except NoMatchingRunException as e:
+            raise typer.BadParameter(str(e), param_hint="--resume")
+    # the history only informs scheduling, a database that can not be used
+    # (e.g. locked, or on a network filesystem) must not fail the run
+    history: Optional[HistoryStore] = None
+    try:
+        history = HistoryStore(history_path)
+    except sqlite3.Error as e:
+        warn_history(history_path, e)
+    try:
+        if local:
+            capacity = None
+            if cpus or memory or any(declares_requirements(x) for x in pipeline.steps):
+                capacity = detect_capacity(
+                    cpus=cpus, memory=parse_size(memory) if memory else None
+                )
+            priorities = None
+            try:
+                priorities = step_priorities(pipeline, dag, history)
+            except sqlite3.Error as e:
+                warn_history(history_path, e)
+            journal = RunJournal(journal_dir)
+            observers: List[RunObserver] = [journal]
+            events_stream = None
+            if events == "ndjson":
+                events_stream = open(events_file, "a") if events_file else sys.stdout
+                observers.append(NdjsonEvents(events_stream))
+            try:
+                exec_results = run_pipeline(
+                    pipeline,
+                    jobs=jobs or (capacity.cpus if capacity else 1),
+                    keep_going=keep_going,
+                    # like make, targets are only rebuilt when they are out of date
+                    incremental=incremental or bool(targets),
+                    cache=StepCache() if cache else None,
+                    logs=LogConfig(
+                        path=log_dir,
+                        compress=compress_logs,
+                        excerpt_size=parse_size(excerpt_size),
+                    ),
+                    steps=steps,
+                    observers=observers,
+                    run_id=resume,
+                    completed=completed,
+                    capacity=capacity,
+                    priorities=priorities,
+                    dag=dag,
+                )
+            finally:
+                # a run that raised never reached pipeline_finished
+                journal.close()
+                if events_file is not None and events_stream is not None:
+                    events_stream.close()
+        else:
+            if targets and steps is not None:
+                # jobs are submitted up front, so up to date steps are left out
+                # before submitting rather than skipped as they come up
+                steps = stale_steps(pipeline, dag, steps)
+            exec_results = run_pbs_pipeline(
+                pipeline,
+                submit_jobs=submit_jobs,
+                reduce_depends=reduce_depends,
+                steps=steps,
+                dag=dag,
+            )
+            if wait:
+                JobTracker(PBSBackend()).wait(
+                    exec_results, on_update=print_step_progress
+                )
+        if events == "json":
+            print(json.dumps(exec_results.dict(), indent=2, default=str))
+        if history is not None:
+            try:
+                history.record(exec_results)
+            except sqlite3.Error as e:
+                warn_history(history_path, e)
+    finally:
+        if history is not None:
+            history.close()
+
+
+@app.command("plan")
+def pipeline_plan(
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", min=1, help="Plan for this many steps running at once."
+    ),
+    history_path: Path = typer.Option(
+        DEFAULT_HISTORY_PATH,
+        "--history-db",
+        help="The sqlite database past step durations are read from.",
+    ),
+):
+    from pypes.exec.plan import plan_pipeline
+    from pypes.history import HistoryStore
+    from pypes.persist import read_pipeline
+
+    pipeline = read_pipeline()
+    history = HistoryStore(history_path)
+    plan = plan_pipeline(pipeline, jobs=jobs, history=history)
+    history.close()
+    print("estimated makespan: {:.1f}s with {} job(s)".format(plan.makespan, plan.jobs))
+    print("critical path: {:.1f}s".format(plan.critical_path_length))
+    for name in plan.critical_path:
+        estimate = plan.steps[name]
+        print("  {}\t{:.1f}s\t({})".format(name, estimate.seconds, estimate.source))
+
+
+def format_usage(metric: str, value: float) -> str:
+    if metric.endswith("_time"):
+        return "{:.2f}s".format(value)
+    if metric == "max_rss":
+        return format_size(int(value))
+    return "{:.0f} blocks".format(value)
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else "{:.0f}ms".format(value)
+
+
+@app.command("history")
+def pipeline_history(
+    pipeline_name: Optional[str] = typer.Option(
+        None, "--pipeline", help="Only show runs of this pipeline."
+    ),
+    step_name: Optional[str] = typer.Option(
+        None, "--step", help="Show the runs of this step instead of whole pipelines."
+    ),
+    outcome: Optional[str] = typer.Option(
+        None, "--outcome", help="Only show runs with this outcome."
+    ),
+    since: Optional[datetime] = typer.Option(
+        None, "--since", help="Only show runs started after this time (UTC)."
+    ),
+    limit: int = typer.Option(
+        20, "--limit", "-n", min=1, help="How many of the latest runs to show."
+    ),
+    stats: bool = typer.Option(
+        False,
+        "--stats",
+        help="Show the p50 and p95 duration of each step over the latest runs.",
+    ),
+    usage: bool = typer.Option(
+        False,
+        "--usage",
+        help="Rank the steps by each kind of resource they used over the latest runs.",
+    ),
+    top: int = typer.Option(
+        5, "--top", min=1, help="How many steps to show for each --usage ranking."
+    ),
+    history_path: Path = typer.Option(
+        DEFAULT_HISTORY_PATH,
+        "--history-db",
+        help="The sqlite database runs are recorded in.",
+    ),
+):
+    from pypes.history import USAGE_METRICS, HistoryStore, duration_ms, rank_steps
+
+    history = HistoryStore(history_path)
+    if usage:
+        usages = history.step_usage(pipeline_name, since=since, last=limit)
+        for metric in USAGE_METRICS:
+            print("{}:".format(metric))
+            for step_usage in rank_steps(usages, metric, top=top):
+                print(
+                    "  {}\t{}".format(
+                        step_usage.step_name,
+                        format_usage(metric, getattr(step_usage, metric)),
+                    )
+                )
+    elif stats:
+        for step_stats in history.step_stats(pipeline_name, since=since, last=limit):
+            print(
+                "{}\t{} runs\t{} errors\tp50 {}\tp95 {}".format(
+                    step_stats.step_name,
+                    step_stats.runs,
+                    step_stats.errors,
+                    format_ms(step_stats.p50_ms),
+                    format_ms(step_stats.p95_ms),
+                )
+            )
+    elif step_name is not None:
+        step_runs = history.step_runs(
+            step_name=step_name, outcome=outcome, since=since, limit=limit
+        )
+        for step_run in step_runs:
+            print(
+                "{}\t{}\t{}\t{}".format(
+                    step_run.ran_at.isoformat(timespec="seconds"),
+                    step_run.outcome,
+                    format_ms(duration_ms(step_run)),
+                    step_run.id,
+                )
+            )
+    else:
+        pipeline_runs = history.pipeline_runs(
+            pipeline_name, outcome=outcome, since=since, limit=limit
+        )
+        for pipeline_run in pipeline_runs:
+            print(
+                "{}\t{}\t{}\t{}".format(
+                    pipeline_run.ran_at.isoformat(timespec="seconds"),
+                    pipeline_run.pipeline_name,
+                    pipeline_run.outcome,
+                    pipeline_run.id,
+                )
+            )
+    history.close()
+
+
+def warn_history(path: Path, error: Exception):
+    typer.echo(
+        "warning: could not use the run history {}: {}".format(path, error), err=True
+    )
+
+
+def print_step_progress(step_run: "StepRun"):
+    typer.echo("{}: {}".format(step_run.step_name, step_run.outcome), err=True)
+
+
+def print_cache_stats(cache: "StepCache"):
+    stats = cache.stats()
+    print("cache path: {}".format(stats.path))
+    print("entries:    {}".format(stats.entries))
+    print("objects:    {}".format(stats.objects))
+    print(
+        "size:       {} / {}".format(
+            format_size(stats.size), format_size(stats.max_size)
+        )
+    )
+
+
+@cache_app.command("stats")
+def cache_stats():
+    from pypes.exec.cache import StepCache
+
+    print_cache_stats(StepCache())
+
+
+@cache_app.command("prune")
+def cache_prune(
+    max_size: str = typer.Option(
+        default=format_size(DEFAULT_CACHE_MAX_SIZE),
+        help="Evict least recently used results until the cache fits in this size.",
+    ),
+):
+    from pypes.exec.cache import StepCache
+
+    cache = StepCache(max_size=parse_size(max_size))
+    cache.prune()
+    print_cache_stats(cache)
 
 
 def main():
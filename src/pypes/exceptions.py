@@ -8,3 +8,27 @@ class InvalidDAGException(Exception):
 
 class KeyAlreadyInUseException(Exception):
     pass
+
+
+class DuplicateProducerException(InvalidDAGException):
+    pass
+
+
+class DuplicateStepException(KeyAlreadyInUseException):
+    pass
+
+
+class InvalidTemplateException(Exception):
+    pass
+
+
+class SubmissionException(Exception):
+    pass
+
+
+class JobStatusException(Exception):
+    pass
+
+
+class NoMatchingRunException(Exception):
+    pass
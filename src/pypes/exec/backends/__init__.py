@@ -0,0 +1,32 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+from pypes.models.job import JobStatus
+
+
+class SchedulerBackend(ABC):
+    """A batch scheduler that pypes can submit pipeline steps to."""
+
+    @abstractmethod
+    def submit(
+        self,
+        name: str,
+        command: str,
+        namespace: Dict[str, Any],
+        depends: List[str],
+    ) -> str:
+        """Submit one job running command, returning its job id."""
+
+    @abstractmethod
+    def submit_array(
+        self,
+        name: str,
+        commands: List[str],
+        namespace: Dict[str, Any],
+        depends: List[str],
+    ) -> str:
+        """Submit a job array with one sub job per command, returning its id."""
+
+    @abstractmethod
+    def status(self, job_ids: List[str]) -> Dict[str, JobStatus]:
+        """Look up the status of many jobs at once, missing ids are unknown."""
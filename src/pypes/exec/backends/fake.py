@@ -0,0 +1,172 @@
+"""A local stand-in for the PBS command line tools, used to test backends.
+
+Jobs are run to completion by qsub itself and recorded as json files in the
+directory named by the PYPES_FAKE_PBS_DIR environment variable. This file
+must not import pypes, it is run directly by path:
+
+    python fake.py qsub [-J 0-N] [-W depend=afterok:ID[:ID...]] script
+    python fake.py qstat -x -f -F json ID [ID...]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SERVER = "fake"
+
+PBS_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+
+# exit status recorded for jobs deleted because a dependency failed
+DEPENDENCY_FAILED = -1
+
+
+def fake_pbs_command(tool: str) -> List[str]:
+    return [sys.executable, os.path.abspath(__file__), tool]
+
+
+def state_dir() -> Path:
+    path = Path(os.environ["PYPES_FAKE_PBS_DIR"])
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def job_number(job_id: str) -> int:
+    return int(job_id.split(".")[0].split("[")[0])
+
+
+def record_path(job_id: str) -> Path:
+    return state_dir() / "{}.json".format(job_number(job_id))
+
+
+def read_record(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(record_path(job_id).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_record(record: Dict[str, Any]):
+    path = record_path(record["id"])
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(record))
+    os.replace(tmp_path, path)
+
+
+def next_job_number() -> int:
+    with open(state_dir() / "counter.lock", "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        counter_path = state_dir() / "counter"
+        number = int(counter_path.read_text()) + 1 if counter_path.exists() else 1
+        counter_path.write_text(str(number))
+        return number
+
+
+def dependencies_ok(depend: Optional[str]) -> bool:
+    if not depend:
+        return True
+    kind, _, job_ids = depend.partition(":")
+    if kind != "depend=afterok":
+        raise SystemExit("fake qsub only supports depend=afterok")
+    for job_id in job_ids.split(":"):
+        record = read_record(job_id)
+        if record is None or record["Exit_status"] != 0:
+            return False
+    return True
+
+
+def run_script(script: str, job_id: str, array_index: Optional[int]) -> int:
+    env = dict(os.environ, PBS_JOBID=job_id, PBS_O_WORKDIR=os.getcwd())
+    if array_index is not None:
+        env["PBS_ARRAY_INDEX"] = str(array_index)
+    log_path = state_dir() / "{}.o".format(job_id)
+    with open(log_path, "wb") as log:
+        return subprocess.call(["/bin/sh", script], stdout=log, stderr=log, env=env)
+
+
+def qsub(args: argparse.Namespace) -> int:
+    number = next_job_number()
+    job_id = "{}{}.{}".format(number, "[]" if args.J else "", SERVER)
+    record: Dict[str, Any] = {
+        "id": job_id,
+        "script": args.script,
+        "job_state": "R",
+        "Exit_status": None,
+        "stime": time.time(),
+        "mtime": None,
+    }
+    write_record(record)
+    print(job_id)
+    sys.stdout.flush()
+
+    if not dependencies_ok(args.W):
+        record["Exit_status"] = DEPENDENCY_FAILED
+    elif args.J:
+        first, last = (int(x) for x in args.J.split("-"))
+        codes = [
+            run_script(args.script, "{}[{}].{}".format(number, i, SERVER), i)
+            for i in range(first, last + 1)
+        ]
+        record["Exit_status"] = max(codes, key=abs)
+    else:
+        record["Exit_status"] = run_script(args.script, job_id, None)
+    record["job_state"] = "F"
+    record["mtime"] = time.time()
+    write_record(record)
+    return 0
+
+
+def format_time(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime(PBS_TIME_FORMAT, time.localtime(timestamp))
+
+
+def qstat(args: argparse.Namespace) -> int:
+    jobs: Dict[str, Any] = {}
+    unknown = False
+    for job_id in args.job_ids:
+        record = read_record(job_id)
+        if record is None or record["id"] != job_id:
+            print("qstat: Unknown Job Id {}".format(job_id), file=sys.stderr)
+            unknown = True
+            continue
+        job = {
+            "job_state": record["job_state"],
+            "stime": format_time(record["stime"]),
+            "mtime": format_time(record["mtime"] or record["stime"]),
+        }
+        if record["Exit_status"] is not None:
+            job["Exit_status"] = record["Exit_status"]
+        jobs[job_id] = job
+    print(json.dumps({"Jobs": jobs}))
+    return 153 if unknown else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="fake-pbs")
+    tools = parser.add_subparsers(dest="tool", required=True)
+    qsub_parser = tools.add_parser("qsub")
+    qsub_parser.add_argument("-J", help="array range, e.g. 0-9")
+    qsub_parser.add_argument("-W", help="attributes, e.g. depend=afterok:1.fake")
+    qsub_parser.add_argument("script")
+    qstat_parser = tools.add_parser("qstat")
+    qstat_parser.add_argument("-x", action="store_true", help="include finished")
+    qstat_parser.add_argument("-f", action="store_true", help="full output")
+    qstat_parser.add_argument("-F", choices=["json"], required=True)
+    qstat_parser.add_argument("job_ids", nargs="+")
+    args = parser.parse_args(argv)
+    if args.tool == "qsub":
+        return qsub(args)
+    if args.tool == "qstat":
+        return qstat(args)
+    return 1  # pragma: no cover
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pypes.constants import DEFAULT_JOBS_DIR, header_template, optional_pbs_context
+from pypes.exceptions import JobStatusException, SubmissionException
+from pypes.exec.backends import SchedulerBackend
+from pypes.exec.template import TemplateCache
+from pypes.models.job import JobStatus
+from slugify import slugify
+
+PBS_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+
+
+def parse_pbs_time(text: Optional[str]) -> Optional[datetime]:
+    # qstat reports local times, pypes records utc
+    if not text:
+        return None
+    return datetime.utcfromtimestamp(time.mktime(time.strptime(text, PBS_TIME_FORMAT)))
+
+
+def parse_qstat_json(text: str) -> Dict[str, JobStatus]:
+    try:
+        jobs: Dict[str, Dict[str, Any]] = json.loads(text or "{}").get("Jobs", {})
+    except ValueError as e:
+        raise JobStatusException("could not parse qstat output! {}".format(e))
+    return {
+        job_id: JobStatus(
+            job_id=job_id,
+            state=job.get("job_state", "U"),
+            exit_status=job.get("Exit_status"),
+            started_at=parse_pbs_time(job.get("stime")),
+            finished_at=(
+                parse_pbs_time(job.get("obittime") or job.get("mtime"))
+                if job.get("job_state") == "F"
+                else None
+            ),
+        )
+        for job_id, job in jobs.items()
+    }
+
+
+def build_depends_args(depends: List[str]) -> List[str]:
+    if not depends:
+        return []
+    return ["-W", "depend=afterok:{}".format(":".join(depends))]
+
+
+def build_array_command(commands: List[str]) -> str:
+    cases = "".join(
+        "    {})\n        {}\n        ;;\n".format(i, command)
+        for i, command in enumerate(commands)
+    )
+    return 'case "$PBS_ARRAY_INDEX" in\n{}esac'.format(cases)
+
+
+def job_script_name(name: str) -> str:
+    # names that slugify the same are submitted side by side, the hash keeps
+    # their scripts apart
+    digest = hashlib.sha256(name.encode()).hexdigest()[:8]
+    return "{}_{}.header.pbs".format(slugify(name, separator="_"), digest)
+
+
+class PBSBackend(SchedulerBackend):
+    def __init__(
+        self,
+        jobs_dir: Path = Path(DEFAULT_JOBS_DIR),
+        qsub_command: Optional[List[str]] = None,
+        qstat_command: Optional[List[str]] = None,
+        templates: Optional[TemplateCache] = None,
+    ):
+        self.jobs_dir = jobs_dir
+        self.qsub_command = qsub_command or ["qsub"]
+        self.qstat_command = qstat_command or ["qstat"]
+        self.templates = templates or TemplateCache()
+
+    def write_header(self, name: str, command: str, namespace: Dict[str, Any]) -> Path:
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        header_file_path = self.jobs_dir / job_script_name(name)
+        header_file_path.write_text(
+            self.templates.render(
+                header_template,
+                **{**optional_pbs_context, **namespace, "command": command},
+            )
+        )
+        return header_file_path
+
+    def qsub(self, args: List[str]) -> str:
+        process = subprocess.run(
+            self.qsub_command + args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if process.returncode != 0:
+            raise SubmissionException(
+                "{} failed! {}".format(
+                    " ".join(self.qsub_command + args), process.stderr.decode()
+                )
+            )
+        return process.stdout.decode().strip()
+
+    def submit(
+        self,
+        name: str,
+        command: str,
+        namespace: Dict[str, Any],
+        depends: List[str],
+    ) -> str:
+        header_file_path = self.write_header(name, command, namespace)
+        return self.qsub(build_depends_args(depends) + [str(header_file_path)])
+
+    def submit_array(
+        self,
+        name: str,
+        commands: List[str],
+        namespace: Dict[str, Any],
+        depends: List[str],
+    ) -> str:
+        # pbs refuses single element arrays
+        if len(commands) == 1:
+            return self.submit(name, commands[0], namespace, depends)
+        header_file_path = self.write_header(
+            name, build_array_command(commands), namespace
+        )
+        return self.qsub(
+            ["-J", "0-{}".format(len(commands) - 1)]
+            + build_depends_args(depends)
+            + [str(header_file_path)]
+        )
+
+    def status(self, job_ids: List[str]) -> Dict[str, JobStatus]:
+        if not job_ids:
+            return {}
+        process = subprocess.run(
+            self.qstat_command + ["-x", "-f", "-F", "json"] + job_ids,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        # qstat fails if any id is unknown, but still reports all the others
+        if process.returncode != 0 and not process.stdout.strip():
+            raise JobStatusException("qstat failed! {}".format(process.stderr.decode()))
+        return parse_qstat_json(process.stdout.decode())
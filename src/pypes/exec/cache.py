@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pypes.constants import DEFAULT_CACHE_MAX_SIZE, STREAM_CHUNK_SIZE
+from pypes.exec.listing import listing_digest
+from pypes.exec.spool import LogConfig
+from pypes.exec.step import render_command, run_step_async
+from pypes.exec.template import TemplateCache
+from pypes.models.cache import CacheStats
+from pypes.models.resource import FileSet, Resource
+from pypes.models.run import StepRun
+from pypes.models.step import Step
+
+# linux ioctl to share the extents of one file with another (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+RESTORE_MODES = ["reflink", "hardlink", "copy"]
+
+
+class InvalidRestoreModeException(Exception):
+    pass
+
+
+def default_cache_dir() -> Path:
+    if os.environ.get("PYPES_CACHE_DIR"):
+        return Path(os.environ["PYPES_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(cache_home) / "pypes"
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(source: Path, target: Path):
+    import fcntl
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+class StepCache:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_size: int = DEFAULT_CACHE_MAX_SIZE,
+        restore_mode: str = "reflink",
+    ):
+        if restore_mode not in RESTORE_MODES:
+            raise InvalidRestoreModeException(
+                "{} is not one of {}!".format(restore_mode, RESTORE_MODES)
+            )
+        self.path = path or default_cache_dir()
+        self.max_size = max_size
+        self.restore_mode = restore_mode
+
+    @property
+    def entries_dir(self) -> Path:
+        return self.path / "entries"
+
+    @property
+    def objects_dir(self) -> Path:
+        return self.path / "objects"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.entries_dir / key[:2] / "{}.json".format(key)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def step_key(
+        self,
+        step: Step,
+        resources: Dict[str, Resource],
+        context: Dict[str, str],
+        templates: Optional[TemplateCache] = None,
+    ) -> Optional[str]:
+        # steps without outputs are run for their side effects, never cache them
+        if not step.outputs:
+            return None
+        # only single files can be stored as outputs
+        if any(isinstance(resources.get(x), FileSet) for x in step.outputs):
+            return None
+        inputs: Dict[str, str] = {}
+        for key in step.inputs:
+            resource = resources.get(key)
+            if isinstance(resource, FileSet):
+                digest = listing_digest(resource)
+                if digest is None:
+                    return None
+                inputs[key] = digest
+                continue
+            if resource is None or not resource.is_file():
+                return None
+            inputs[key] = hash_file(resource)
+        templates = templates or TemplateCache()
+        used_keys = set().union(*(templates.names(x) for x in step.command_templates()))
+        payload = {
+            "command": render_command(step, resources, context, templates=templates),
+            "context": {k: v for k, v in context.items() if k in used_keys},
+            "inputs": inputs,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def restore(self, key: str, step: Step, resources: Dict[str, Resource]) -> bool:
+        entry_path = self._entry_path(key)
+        try:
+            outputs: Dict[str, str] = json.loads(entry_path.read_text())["outputs"]
+        except (OSError, ValueError, KeyError):
+            return False
+        if sorted(outputs) != sorted(step.outputs):
+            return False
+        targets: List[Path] = []
+        for name in outputs:
+            target = resources.get(name)
+            if not isinstance(target, Path):
+                return False
+            targets.append(target)
+        if not all(self._object_path(x).exists() for x in outputs.values()):
+            return False
+        for digest, target in zip(outputs.values(), targets):
+            self._materialise(self._object_path(digest), target)
+        # the entry mtime doubles as its last access time for eviction
+        os.utime(entry_path)
+        return True
+
+    def store(self, key: str, step: Step, resources: Dict[str, Resource]):
+        outputs: Dict[str, str] = {}
+        for name in step.outputs:
+            path = resources.get(name)
+            if not isinstance(path, Path) or not path.is_file():
+                return
+            outputs[name] = self._store_object(path)
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=entry_path.parent)
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps({"step_name": step.name, "outputs": outputs}))
+        os.replace(tmp_path, entry_path)
+
+    def detach_outputs(self, step: Step, resources: Dict[str, Resource]):
+        # a hardlinked output shares its file with a cache object, a command
+        # writing it in place would write into the cache
+        for name in step.outputs:
+            path = resources.get(name)
+            if not isinstance(path, Path):
+                continue
+            try:
+                if path.stat().st_nlink > 1:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def _store_object(self, path: Path) -> str:
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir)
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                for chunk in iter(lambda: src.read(STREAM_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            object_path = self._object_path(digest.hexdigest())
+            if object_path.exists():
+                os.unlink(tmp_path)
+            else:
+                object_path.parent.mkdir(exist_ok=True)
+                # objects may be hardlinked into place, keep them read only
+                os.chmod(tmp_path, 0o444)
+                os.replace(tmp_path, object_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return digest.hexdigest()
+
+    def _materialise(self, source: Path, target: Path):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        if self.restore_mode == "hardlink":
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        if self.restore_mode == "reflink":
+            try:
+                reflink(source, target)
+                return
+            except (OSError, ImportError):
+                target.unlink(missing_ok=True)
+        shutil.copyfile(source, target)
+
+    def _entries(self) -> Iterator[Tuple[Path, float, List[str]]]:
+        for entry_path in self.entries_dir.glob("*/*.json"):
+            try:
+                mtime = entry_path.stat().st_mtime
+                outputs = json.loads(entry_path.read_text())["outputs"]
+            except (OSError, ValueError, KeyError):
+                continue
+            yield entry_path, mtime, list(outputs.values())
+
+    def _object_sizes(self) -> Dict[str, int]:
+        sizes: Dict[str, int] = {}
+        for object_path in self.objects_dir.glob("*/*"):
+            try:
+                sizes[object_path.name] = object_path.stat().st_size
+            except OSError:
+                continue
+        return sizes
+
+    def stats(self) -> CacheStats:
+        sizes = self._object_sizes()
+        return CacheStats(
+            path=str(self.path),
+            entries=sum(1 for _ in self._entries()),
+            objects=len(sizes),
+            size=sum(sizes.values()),
+            max_size=self.max_size,
+        )
+
+    def prune(self, max_size: Optional[int] = None) -> CacheStats:
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self._entries(), key=lambda x: x[1])
+        sizes = self._object_sizes()
+        references: Dict[str, int] = {}
+        for _, _, digests in entries:
+            for digest in digests:
+                references[digest] = references.get(digest, 0) + 1
+
+        def remove_object(digest: str):
+            self._object_path(digest).unlink(missing_ok=True)
+            sizes.pop(digest, None)
+
+        for digest in [x for x in sizes if x not in references]:
+            remove_object(digest)
+
+        # evict the least recently used entries until the objects fit
+        total = sum(sizes.values())
+        while entries and total > max_size:
+            entry_path, _, digests = entries.pop(0)
+            entry_path.unlink(missing_ok=True)
+            for digest in digests:
+                references[digest] -= 1
+                if references[digest] == 0:
+                    total -= sizes.get(digest, 0)
+                    remove_object(digest)
+        return self.stats()
+
+
+async def run_step_cached(
+    step: Step,
+    resources: Dict[str, Resource],
+    context: Dict[str, str],
+    cache: StepCache,
+    logs: Optional[LogConfig] = None,
+    templates: Optional[TemplateCache] = None,
+    timeout: Optional[float] = None,
+) -> StepRun:
+    # hashing and restoring outputs is file io, keep it off the event loop
+    key = await asyncio.to_thread(cache.step_key, step, resources, context, templates)
+    if key is not None:
+        if await asyncio.to_thread(cache.restore, key, step, resources):
+            return StepRun(step_name=step.name, outcome="cached")
+    await asyncio.to_thread(cache.detach_outputs, step, resources)
+    step_run = await run_step_async(
+        step, resources, context, logs=logs, templates=templates, timeout=timeout
+    )
+    if key is not None and step_run.outcome == "finished":
+        await asyncio.to_thread(cache.store, key, step, resources)
+    return step_run
@@ -0,0 +1,80 @@
+import os
+from typing import Optional, Tuple
+
+from pypes.models.base import PypesModel
+from pypes.models.step import Step
+
+Requirement = Tuple[int, int]
+
+
+class Capacity(PypesModel):
+    cpus: int
+    memory: Optional[int] = None
+
+
+def available_cpus() -> int:
+    # respect taskset and cgroup cpusets rather than counting every core
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1  # pragma: no cover
+
+
+def available_memory() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):  # pragma: no cover
+        return None
+
+
+def detect_capacity(
+    cpus: Optional[int] = None, memory: Optional[int] = None
+) -> Capacity:
+    return Capacity(
+        cpus=cpus or available_cpus(),
+        memory=memory if memory is not None else available_memory(),
+    )
+
+
+def declares_requirements(step: Step) -> bool:
+    return step.cpus is not None or step.memory is not None
+
+
+class CapacityPool:
+    """Tracks how much of a machine the running steps have claimed."""
+
+    def __init__(self, capacity: Capacity):
+        self.capacity = capacity
+        self.free_cpus = capacity.cpus
+        self.free_memory = capacity.memory or 0
+
+    def requirement(self, step: Step) -> Requirement:
+        # a step bigger than the machine still runs, it just runs alone
+        cpus = min(max(step.cpus or 1, 1), self.capacity.cpus)
+        memory = step.memory or 0
+        if self.capacity.memory is None:
+            memory = 0
+        else:
+            memory = min(memory, self.capacity.memory)
+        return cpus, memory
+
+    def fits(self, requirement: Requirement, reserved: Requirement = (0, 0)) -> bool:
+        cpus, memory = requirement
+        return (
+            cpus <= self.free_cpus - reserved[0]
+            and memory <= self.free_memory - reserved[1]
+        )
+
+    def acquire(self, requirement: Requirement):
+        self.free_cpus -= requirement[0]
+        self.free_memory -= requirement[1]
+
+    def release(self, requirement: Requirement):
+        self.free_cpus += requirement[0]
+        self.free_memory += requirement[1]
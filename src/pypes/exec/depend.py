@@ -1,21 +1,39 @@
-from pathlib import Path
-from typing import List, Tuple
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import networkx
-from pypes.exceptions import InvalidDAGException
+from pypes.exceptions import (
+    DuplicateProducerException,
+    InvalidDAGException,
+    NoMatchingStepException,
+)
 from pypes.models.pipeline import Pipeline
 
 
 def pipeline_to_dag(pipeline: Pipeline) -> networkx.MultiDiGraph:
-    edge_list: List[Tuple[str, str, str]] = []
-    for source in pipeline.steps:
-        for target in pipeline.steps:
-            for output in source.outputs:
-                if source.name == target.name:
-                    continue
-                for _input in target.inputs:
-                    if output == _input:
-                        edge_list.append((source.name, target.name, output))
+    producers: Dict[str, str] = {}
+    duplicates: Dict[str, List[str]] = defaultdict(list)
+    consumers: Dict[str, List[str]] = defaultdict(list)
+    for step in pipeline.steps:
+        for output in step.outputs:
+            producer = producers.setdefault(output, step.name)
+            if producer != step.name:
+                duplicates[output].append(step.name)
+        for _input in step.all_inputs():
+            consumers[_input].append(step.name)
+    if duplicates:
+        raise DuplicateProducerException(
+            "Resources produced by more than one step! {}".format(
+                {key: [producers[key]] + names for key, names in duplicates.items()}
+            )
+        )
+
+    edge_list: List[Tuple[str, str, str]] = [
+        (source, target, resource)
+        for resource, source in producers.items()
+        for target in consumers.get(resource, [])
+        if source != target
+    ]
     nodes = [step.name for step in pipeline.steps]
     dag = networkx.MultiDiGraph()
     dag.update(edges=edge_list, nodes=nodes)
@@ -36,3 +54,77 @@ def get_ancestors(dag: networkx.MultiDiGraph, name: str) -> List[str]:
 
 def get_descendants(dag: networkx.MultiDiGraph, name: str) -> List[str]:
     return [x for x in networkx.descendants(dag, name)]
+
+
+def get_generations(dag: networkx.MultiDiGraph) -> List[List[str]]:
+    return [list(x) for x in networkx.topological_generations(dag)]
+
+
+def get_predecessors(dag: networkx.MultiDiGraph, name: str) -> List[str]:
+    return [x for x in dag.pred[name]]
+
+
+def get_reduced_dag(dag: networkx.MultiDiGraph) -> networkx.DiGraph:
+    return networkx.transitive_reduction(networkx.DiGraph(dag))
+
+
+def get_bottom_levels(
+    dag: networkx.MultiDiGraph, durations: Dict[str, float]
+) -> Dict[str, float]:
+    # the longest path from each step to the end of the pipeline, including
+    # the step itself
+    levels: Dict[str, float] = {}
+    for name in reversed(get_execution_order(dag)):
+        levels[name] = durations.get(name, 0.0) + max(
+            (levels[x] for x in dag.successors(name)), default=0.0
+        )
+    return levels
+
+
+def get_critical_path(
+    dag: networkx.MultiDiGraph, levels: Dict[str, float]
+) -> List[str]:
+    path: List[str] = []
+    candidates = [x for x in dag.nodes if dag.in_degree(x) == 0]
+    while candidates:
+        name = max(candidates, key=lambda x: levels[x])
+        path.append(name)
+        candidates = list(dag.successors(name))
+    return path
+
+
+def select_steps(
+    pipeline: Pipeline,
+    dag: networkx.MultiDiGraph,
+    targets: Iterable[str] = (),
+    from_steps: Iterable[str] = (),
+    only: Iterable[str] = (),
+) -> Optional[Set[str]]:
+    targets, from_steps, only = list(targets), list(from_steps), list(only)
+    if not (targets or from_steps or only):
+        return None
+
+    def check_step(name: str) -> str:
+        if name not in dag:
+            raise NoMatchingStepException("{} is not a step!".format(name))
+        return name
+
+    producers = {x: step.name for step in pipeline.steps for x in step.outputs}
+    selected: Set[str] = set(dag.nodes) if targets or from_steps else set()
+    if targets:
+        # a target is a step name or a resource produced by a step
+        needed: Set[str] = set()
+        for target in targets:
+            if target not in dag and target in producers:
+                target = producers[target]
+            needed.add(check_step(target))
+            needed.update(get_ancestors(dag, target))
+        selected &= needed
+    if from_steps:
+        downstream: Set[str] = set()
+        for name in from_steps:
+            downstream.add(check_step(name))
+            downstream.update(get_descendants(dag, name))
+        selected &= downstream
+    selected.update(check_step(x) for x in only)
+    return selected
@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+from typing import IO, Any, Dict, Optional
+
+from pypes.exec.observers import RunObserver
+from pypes.models.run import PipelineRun, StepRun
+
+EVENT_FORMATS = ["json", "ndjson"]
+
+
+class NdjsonEvents(RunObserver):
+    """Writes one compact json line per run event as it happens."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+
+    def _emit(self, event: str, pipeline_run: PipelineRun, **fields: Any):
+        record = {
+            "event": event,
+            "at": datetime.utcnow(),
+            "run_id": pipeline_run.id,
+            **fields,
+        }
+        self.stream.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        # readers tail the stream, so never leave an event in the buffer
+        self.stream.flush()
+
+    def pipeline_started(self, pipeline_run: PipelineRun):
+        self._emit(
+            "pipeline_started",
+            pipeline_run,
+            pipeline_name=pipeline_run.pipeline.name,
+            steps=len(pipeline_run.pipeline.steps),
+        )
+
+    def step_started(self, pipeline_run: PipelineRun, step_name: str):
+        self._emit("step_started", pipeline_run, step_name=step_name)
+
+    def step_finished(self, pipeline_run: PipelineRun, step_run: StepRun):
+        self._emit("step_finished", pipeline_run, step_run=step_run.dict())
+
+    def pipeline_finished(self, pipeline_run: PipelineRun):
+        outcomes: Dict[Optional[str], int] = {}
+        for step_run in pipeline_run.step_runs:
+            outcomes[step_run.outcome] = outcomes.get(step_run.outcome, 0) + 1
+        self._emit(
+            "pipeline_finished",
+            pipeline_run,
+            outcome=pipeline_run.outcome,
+            step_outcomes=outcomes,
+        )
@@ -0,0 +1,96 @@
+import os
+import re
+from pathlib import Path
+from typing import Collection, Dict, Optional, Set, Tuple
+
+import networkx
+
+from pypes.exec.depend import get_execution_order
+from pypes.exec.listing import MISSING_MTIME, default_index
+from pypes.models.pipeline import Pipeline
+from pypes.models.resource import FileSet, Resource
+from pypes.models.step import Step
+
+
+def stat_resource(path: Path) -> Optional[os.stat_result]:
+    try:
+        return path.stat()
+    except OSError:
+        return None
+
+
+def resource_mtimes(resource: Resource) -> Optional[Tuple[int, int, bool]]:
+    # the oldest and newest mtime of what the resource holds, and whether
+    # it is empty, or None if it does not exist
+    if isinstance(resource, FileSet):
+        listing = default_index.listing(resource)
+        if MISSING_MTIME in listing.directories.values():
+            return None
+        if not listing.files:
+            newest = max(listing.directories.values())
+            return newest, newest, True
+        mtimes = [x.mtime_ns for x in listing.files]
+        # a removed file only shows in the mtime of its directory
+        newest = max(mtimes + list(listing.directories.values()))
+        return min(mtimes), newest, False
+    stat = stat_resource(resource)
+    if stat is None:
+        return None
+    return stat.st_mtime_ns, stat.st_mtime_ns, stat.st_size == 0
+
+
+def redirected_outputs(step: Step) -> Set[str]:
+    # outputs the shell creates by redirecting into them, before the command
+    # has run, argv steps have no shell to do that
+    if step.argv is not None:
+        return set()
+    return {
+        x
+        for x in step.outputs
+        if re.search(r">\s*\{\{\s*" + re.escape(x) + r"\s*\}\}", step.command)
+    }
+
+
+def is_step_fresh(step: Step, resources: Dict[str, Resource]) -> bool:
+    # a step without outputs has nothing to compare against, always run it
+    if not step.outputs:
+        return False
+
+    newest_input = 0
+    for key in step.all_inputs():
+        if key not in resources:
+            return False
+        mtimes = resource_mtimes(resources[key])
+        if mtimes is None:
+            return False
+        newest_input = max(newest_input, mtimes[1])
+
+    for key in step.outputs:
+        if key not in resources:
+            return False
+        mtimes = resource_mtimes(resources[key])
+        if mtimes is None:
+            return False
+        # an empty file set, or an empty file a failed command was redirected
+        # into, is more likely a failed run than a real result
+        if mtimes[2] and (
+            isinstance(resources[key], FileSet) or key in redirected_outputs(step)
+        ):
+            return False
+        if mtimes[0] < newest_input:
+            return False
+    return True
+
+
+def stale_steps(
+    pipeline: Pipeline, dag: networkx.MultiDiGraph, steps: Collection[str]
+) -> Set[str]:
+    # the steps an incremental run would not skip, a fresh step still runs
+    # when a step it depends on does
+    selected = dag.subgraph(steps)
+    stale: Set[str] = set()
+    for name in get_execution_order(selected):
+        upstream = any(x in stale for x in selected.predecessors(name))
+        if upstream or not is_step_fresh(pipeline.get_step(name), pipeline.resources):
+            stale.add(name)
+    return stale
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+from pypes.constants import DEFAULT_JOURNAL_DIR
+from pypes.exceptions import NoMatchingRunException
+from pypes.exec.observers import RunObserver
+from pypes.models.run import PipelineRun, StepRun
+
+DONE_OUTCOMES = ["finished", "skipped", "cached"]
+
+
+def journal_path(run_id: str, journal_dir: Path = Path(DEFAULT_JOURNAL_DIR)) -> Path:
+    return journal_dir / "{}.jsonl".format(run_id)
+
+
+class RunJournal(RunObserver):
+    """Appends every finished step of a run to a json lines file."""
+
+    def __init__(self, journal_dir: Path = Path(DEFAULT_JOURNAL_DIR)):
+        self.journal_dir = journal_dir
+        self._file: Optional[IO[str]] = None
+
+    def _write(self, record: Dict):
+        if self._file is not None:
+            self._file.write(json.dumps(record, default=str) + "\n")
+            # flush every record so a crash loses at most the running steps
+            self._file.flush()
+
+    def pipeline_started(self, pipeline_run: PipelineRun):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        path = journal_path(pipeline_run.id, self.journal_dir)
+        resumed = path.exists()
+        self._file = open(path, "a")
+        if not resumed:
+            self._write(
+                {
+                    "type": "pipeline",
+                    "id": pipeline_run.id,
+                    "ran_at": pipeline_run.ran_at,
+                    "pipeline_name": pipeline_run.pipeline.name,
+                }
+            )
+
+    def step_finished(self, pipeline_run: PipelineRun, step_run: StepRun):
+        self._write({"type": "step", **step_run.dict()})
+
+    def pipeline_finished(self, pipeline_run: PipelineRun):
+        self._write(
+            {
+                "type": "pipeline_finished",
+                "id": pipeline_run.id,
+                "outcome": pipeline_run.outcome,
+            }
+        )
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_journal(
+    run_id: str, journal_dir: Path = Path(DEFAULT_JOURNAL_DIR)
+) -> List[StepRun]:
+    path = journal_path(run_id, journal_dir)
+    if not path.exists():
+        raise NoMatchingRunException("no journal for run {}!".format(run_id))
+    step_runs: List[StepRun] = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line may be cut short by a crash
+                continue
+            if record.pop("type", None) == "step":
+                step_runs.append(StepRun(**record))
+    return step_runs
+
+
+def completed_step_runs(step_runs: List[StepRun]) -> List[StepRun]:
+    # a step may appear more than once after a resume, the latest record wins
+    latest = {x.step_name: x for x in step_runs}
+    return [x for x in latest.values() if x.outcome in DONE_OUTCOMES]
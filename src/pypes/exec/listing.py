@@ -0,0 +1,110 @@
+import fnmatch
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pypes.models.resource import FileEntry, FileListing, FileSet
+
+# recorded for a directory that could not be read, so it is checked again
+MISSING_MTIME = -1
+
+# mtimes are only as fine as the filesystem's clock, a directory changed this
+# close to a scan could change again without its mtime moving
+RACY_WINDOW_NS = 2 * 10**9
+
+
+def directory_mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return MISSING_MTIME
+
+
+def is_listing_current(listing: FileListing) -> bool:
+    return all(
+        directory_mtime(path) == mtime for path, mtime in listing.directories.items()
+    )
+
+
+def is_match(name: str, pattern: str) -> bool:
+    # like a shell glob, hidden files only match a pattern that asks for them
+    if name.startswith(".") and not pattern.startswith("."):
+        return False
+    return fnmatch.fnmatch(name, pattern)
+
+
+def scan_file_set(file_set: FileSet) -> Tuple[FileListing, bool]:
+    started = time.time_ns()
+    listing = FileListing()
+    pending = [str(file_set.path)]
+    while pending:
+        directory = pending.pop()
+        listing.directories[directory] = directory_mtime(directory)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if file_set.recursive:
+                            pending.append(entry.path)
+                    elif entry.is_file() and is_match(entry.name, file_set.pattern):
+                        stat = entry.stat()
+                        listing.files.append(
+                            FileEntry(
+                                path=entry.path,
+                                size=stat.st_size,
+                                mtime_ns=stat.st_mtime_ns,
+                            )
+                        )
+        except OSError:
+            continue
+    listing.files.sort(key=lambda x: x.path)
+    racy = any(x >= started - RACY_WINDOW_NS for x in listing.directories.values())
+    return listing, racy
+
+
+class ListingIndex:
+    """Listings of file sets, rescanned only when one of their directories
+    changes, so checks over big directories share a single scan."""
+
+    def __init__(self):
+        self._listings: Dict[Tuple[str, str, bool], FileListing] = {}
+        self.scans = 0
+
+    def listing(self, file_set: FileSet) -> FileListing:
+        key = (str(file_set.path), file_set.pattern, file_set.recursive)
+        listing = self._listings.get(key)
+        if listing is not None and is_listing_current(listing):
+            return listing
+        listing, racy = scan_file_set(file_set)
+        self.scans += 1
+        if racy:
+            self._listings.pop(key, None)
+        else:
+            self._listings[key] = listing
+        return listing
+
+
+default_index = ListingIndex()
+
+
+def list_files(
+    file_set: FileSet, index: Optional[ListingIndex] = None
+) -> List[FileEntry]:
+    return (index or default_index).listing(file_set).files
+
+
+def listing_digest(
+    file_set: FileSet, index: Optional[ListingIndex] = None
+) -> Optional[str]:
+    # a digest of what is in the set, by name, size and mtime rather than
+    # content, so a set of any size costs one scan
+    listing = (index or default_index).listing(file_set)
+    if MISSING_MTIME in listing.directories.values():
+        return None
+    digest = hashlib.sha256()
+    for entry in listing.files:
+        digest.update(
+            "{}\0{}\0{}\n".format(entry.path, entry.size, entry.mtime_ns).encode()
+        )
+    return digest.hexdigest()
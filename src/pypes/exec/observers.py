@@ -0,0 +1,17 @@
+from pypes.models.run import PipelineRun, StepRun
+
+
+class RunObserver:
+    """Is told about the progress of a local run as it happens."""
+
+    def pipeline_started(self, pipeline_run: PipelineRun):
+        pass
+
+    def step_started(self, pipeline_run: PipelineRun, step_name: str):
+        pass
+
+    def step_finished(self, pipeline_run: PipelineRun, step_run: StepRun):
+        pass
+
+    def pipeline_finished(self, pipeline_run: PipelineRun):
+        pass
@@ -1,46 +1,513 @@
-from typing import Dict, List
+import asyncio
+import math
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from heapq import heappop, heappush
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set, Tuple
 
-from pypes.exec.depend import get_ancestors, get_execution_order, pipeline_to_dag
-from pypes.exec.step import run_pbs_step, run_step
-from pypes.models.guards import is_pbs_step
+import networkx
+from pypes.constants import (
+    DEFAULT_JOBS_DIR,
+    DEFAULT_MAX_DEPENDS,
+    DEFAULT_SUBMIT_JOBS,
+    barrier_pbs_context,
+)
+from pypes.exceptions import SubmissionException
+from pypes.exec.backends import SchedulerBackend
+from pypes.exec.backends.pbs import PBSBackend
+from pypes.exec.cache import StepCache, run_step_cached
+from pypes.exec.capacity import Capacity, CapacityPool, Requirement
+from pypes.exec.depend import (
+    get_execution_order,
+    get_generations,
+    get_predecessors,
+    get_reduced_dag,
+    pipeline_to_dag,
+)
+from pypes.exec.fresh import is_step_fresh
+from pypes.exec.observers import RunObserver
+from pypes.exec.scatter import (
+    ExpandedMap,
+    expand_map_step,
+    gather_name,
+    map_gather,
+    map_items,
+    map_shards,
+)
+from pypes.exec.spool import LogConfig
+from pypes.exec.step import render_command, run_step_async, step_timeout
+from pypes.exec.template import TemplateCache, pbs_namespace
+from pypes.models.base import FAILED_OUTCOMES
+from pypes.models.guards import is_map_step, is_pbs_step
 from pypes.models.pipeline import Pipeline
+from pypes.models.resource import FileSet
 from pypes.models.run import PipelineRun, StepRun
+from pypes.models.step import MapStep, Step
 
 
-def run_pipeline(pipeline: Pipeline) -> PipelineRun:
+async def run_pipeline_async(
+    pipeline: Pipeline,
+    jobs: int = 1,
+    keep_going: bool = False,
+    incremental: bool = False,
+    cache: Optional[StepCache] = None,
+    logs: Optional[LogConfig] = None,
+    steps: Optional[Collection[str]] = None,
+    observers: Sequence[RunObserver] = (),
+    run_id: Optional[str] = None,
+    completed: Sequence[StepRun] = (),
+    capacity: Optional[Capacity] = None,
+    priorities: Optional[Dict[str, float]] = None,
+    dag: Optional[networkx.MultiDiGraph] = None,
+) -> PipelineRun:
     pipeline_run = PipelineRun(pipeline=pipeline)
-    dag = pipeline_to_dag(pipeline)
-    step_runs = []
+    if run_id is not None:
+        pipeline_run.id = run_id
+    if dag is None:
+        dag = pipeline_to_dag(pipeline)
+    # steps outside the selection, or completed by an earlier attempt at this
+    # run, are treated as already done
+    if steps is not None or completed:
+        completed_names = {x.step_name for x in completed}
+        dag = dag.subgraph(
+            x
+            for x in (dag.nodes if steps is None else steps)
+            if x not in completed_names
+        )
+    templates = TemplateCache()
+    templates.check_pipeline(pipeline)
+    # a bad walltime fails the run before anything has started
+    timeouts = {
+        name: step_timeout(pipeline.get_step(name), pipeline.context)
+        for name in dag.nodes
+    }
+    if logs is not None and logs.path is not None:
+        logs = logs.copy(update={"path": logs.path / pipeline_run.id})
+
+    # ready steps on the longest remaining path go first, ties (and every
+    # step, without priorities) go in topological order, so jobs=1 behaves
+    # exactly like a sequential walk of the execution order
+    order = {name: i for i, name in enumerate(get_execution_order(dag))}
+    priorities = priorities or {}
+    waiting_on = {name: len(dag.pred[name]) for name in dag.nodes}
+    ready: List[Tuple[float, int, int, str]] = []
+
+    def push_ready(step_id: str, part: int = 0):
+        heappush(ready, (-priorities.get(step_id, 0.0), order[step_id], part, step_id))
+
+    # map steps are expanded when they are ready to run, their shards and
+    # gather queue behind the map step's own place in the order
+    maps: Dict[str, ExpandedMap] = {}
+    parts: Dict[str, Tuple[str, Step, Dict[str, Any]]] = {}
+
+    def push_part(map_id: str, part: int, step: Step, context: Dict[str, Any]):
+        parts[step.name] = (map_id, step, context)
+        heappush(ready, (-priorities.get(map_id, 0.0), order[map_id], part, step.name))
+
+    for name, count in waiting_on.items():
+        if count == 0:
+            push_ready(name)
+
+    def release(step_id: str):
+        for successor in dag.successors(step_id):
+            waiting_on[successor] -= 1
+            if waiting_on[successor] == 0:
+                push_ready(successor)
+
+    pool = CapacityPool(capacity) if capacity is not None else None
+    claimed: Dict[str, Requirement] = {}
+    step_runs: List[StepRun] = list(completed)
+    invalidated: Set[str] = set()
     errored = False
-    for step_id in get_execution_order(dag):
-        step = pipeline.get_step(step_id)
-        step_run = run_step(step, pipeline.resources, pipeline.context)
-        step_runs.append(step_run)
-        if step_run.returncode and step_run.returncode > 0:
-            errored = True
-            break
-    pipeline_run.outcome = "error" if errored else "finished"
+    interrupted = False
+    running: Dict[asyncio.Task, str] = {}
+    cancelled: Set[asyncio.Task] = set()
     pipeline_run.step_runs = step_runs
+    for observer in observers:
+        observer.pipeline_started(pipeline_run)
+
+    def cancel_running():
+        # each task is cancelled once, a second cancel would cut short the
+        # grace period it gives its process group to exit
+        for task in running:
+            if task not in cancelled:
+                cancelled.add(task)
+                task.cancel()
+
+    def interrupt():
+        nonlocal interrupted
+        interrupted = True
+        cancel_running()
+
+    loop = asyncio.get_running_loop()
+    handled_signals = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, interrupt)
+            handled_signals.append(signum)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # not the main thread, or no signal support on this platform
+            pass
+
+    def finish(step_run: StepRun):
+        step_runs.append(step_run)
+        for observer in observers:
+            observer.step_finished(pipeline_run, step_run)
+
+    def complete(step_id: str):
+        if incremental:
+            # each successor that reruns invalidates its own successors
+            invalidated.update(dag.successors(step_id))
+        release(step_id)
+
+    def settle_map(map_id: str):
+        expanded = maps[map_id]
+        if expanded.left:
+            return
+        if not expanded.failed and expanded.gather is not None:
+            gather, expanded.gather = expanded.gather, None
+            expanded.left = 1
+            push_part(map_id, len(expanded.shards) + 1, *gather)
+            return
+        del maps[map_id]
+        finish(
+            StepRun(
+                step_name=map_id,
+                ran_at=expanded.started_at,
+                finished_at=datetime.utcnow(),
+                outcome="error" if expanded.failed else "finished",
+                returncode=1 if expanded.failed else 0,
+            )
+        )
+        if not expanded.failed:
+            complete(map_id)
+
+    try:
+        while ready or running:
+            waiting: List[Tuple[float, int, int, str]] = []
+            reserved: Requirement = (0, 0)
+            while (
+                ready
+                and len(running) < jobs
+                and (keep_going or not errored)
+                and not interrupted
+            ):
+                item = heappop(ready)
+                step_id = item[-1]
+                if step_id in parts:
+                    map_id, step, context = parts[step_id]
+                else:
+                    map_id, step, context = step_id, pipeline.get_step(step_id), None
+                if (
+                    context is None
+                    and incremental
+                    and step_id not in invalidated
+                    and is_step_fresh(step, pipeline.resources)
+                ):
+                    finish(StepRun(step_name=step_id, outcome="skipped"))
+                    release(step_id)
+                    continue
+                if is_map_step(step):
+                    for observer in observers:
+                        observer.step_started(pipeline_run, step_id)
+                    maps[step_id] = expand_map_step(
+                        step, pipeline.resources, pipeline.context, templates=templates
+                    )
+                    for i, shard in enumerate(maps[step_id].shards):
+                        push_part(step_id, i + 1, *shard)
+                    settle_map(step_id)
+                    continue
+                if pool is not None:
+                    requirement = pool.requirement(step)
+                    if not pool.fits(requirement, reserved):
+                        # the first step that does not fit holds on to what it
+                        # needs, so smaller steps behind it can not starve it
+                        if not waiting:
+                            reserved = requirement
+                        waiting.append(item)
+                        if pool.free_cpus <= reserved[0]:
+                            break
+                        continue
+                    pool.acquire(requirement)
+                    claimed[step_id] = requirement
+                if context is not None:
+                    # a gather reads what its shards wrote, neither can be cached
+                    coroutine = run_step_async(
+                        step,
+                        pipeline.resources,
+                        context,
+                        logs=logs,
+                        templates=templates,
+                        timeout=timeouts[map_id],
+                    )
+                elif cache is not None:
+                    coroutine = run_step_cached(
+                        step,
+                        pipeline.resources,
+                        pipeline.context,
+                        cache,
+                        logs=logs,
+                        templates=templates,
+                        timeout=timeouts[step_id],
+                    )
+                else:
+                    coroutine = run_step_async(
+                        step,
+                        pipeline.resources,
+                        pipeline.context,
+                        logs=logs,
+                        templates=templates,
+                        timeout=timeouts[step_id],
+                    )
+                for observer in observers:
+                    observer.step_started(pipeline_run, step_id)
+                task = asyncio.create_task(coroutine)
+                running[task] = step_id
+            for item in waiting:
+                heappush(ready, item)
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step_id = running.pop(task)
+                if pool is not None:
+                    pool.release(claimed.pop(step_id))
+                if task.cancelled():
+                    step_run = StepRun(
+                        step_name=step_id,
+                        outcome="cancelled",
+                        finished_at=datetime.utcnow(),
+                    )
+                else:
+                    step_run = task.result()
+                finish(step_run)
+                failed = step_run.outcome in FAILED_OUTCOMES
+                # descendants of a failed step are never released
+                errored = errored or failed
+                if step_id in parts:
+                    map_id = parts.pop(step_id)[0]
+                    maps[map_id].left -= 1
+                    maps[map_id].failed = maps[map_id].failed or failed
+                    settle_map(map_id)
+                elif not failed:
+                    complete(step_id)
+            # fail fast stops the steps that are still running as well
+            if errored and not keep_going:
+                cancel_running()
+    finally:
+        for signum in handled_signals:
+            loop.remove_signal_handler(signum)
+        # an exception, or the run itself being cancelled, must not leave
+        # steps running once the event loop is gone
+        if running:
+            cancel_running()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    # map steps left unfinished when the run stopped early, a failed shard
+    # fails its map whether or not the others were cancelled
+    for map_id, expanded in list(maps.items()):
+        finish(
+            StepRun(
+                step_name=map_id,
+                ran_at=expanded.started_at,
+                finished_at=datetime.utcnow(),
+                outcome="error" if expanded.failed else "cancelled",
+                returncode=1 if expanded.failed else -1,
+            )
+        )
+
+    if cache is not None:
+        await asyncio.to_thread(cache.prune)
+
+    if interrupted:
+        pipeline_run.outcome = "cancelled"
+    else:
+        pipeline_run.outcome = "error" if errored else "finished"
+    for observer in observers:
+        observer.pipeline_finished(pipeline_run)
     return pipeline_run
 
 
-def run_pbs_pipeline(pipeline: Pipeline) -> PipelineRun:
+def run_pipeline(
+    pipeline: Pipeline,
+    jobs: int = 1,
+    keep_going: bool = False,
+    incremental: bool = False,
+    cache: Optional[StepCache] = None,
+    logs: Optional[LogConfig] = None,
+    steps: Optional[Collection[str]] = None,
+    observers: Sequence[RunObserver] = (),
+    run_id: Optional[str] = None,
+    completed: Sequence[StepRun] = (),
+    capacity: Optional[Capacity] = None,
+    priorities: Optional[Dict[str, float]] = None,
+    dag: Optional[networkx.MultiDiGraph] = None,
+) -> PipelineRun:
+    return asyncio.run(
+        run_pipeline_async(
+            pipeline,
+            jobs=jobs,
+            keep_going=keep_going,
+            incremental=incremental,
+            cache=cache,
+            logs=logs,
+            steps=steps,
+            observers=observers,
+            run_id=run_id,
+            completed=completed,
+            capacity=capacity,
+            priorities=priorities,
+            dag=dag,
+        )
+    )
+
+
+def step_pbs_namespace(namespace: Dict[str, Any], step: Step) -> Dict[str, Any]:
+    # requirements declared on the step win over the pipeline's pbs context
+    overrides: Dict[str, Any] = {}
+    if step.cpus is not None:
+        overrides["ncpus"] = str(step.cpus)
+    if step.walltime is not None:
+        overrides["walltime"] = step.walltime
+    if step.memory is not None:
+        overrides["mem"] = "{}kb".format(math.ceil(step.memory / 1024))
+    return {**namespace, **overrides} if overrides else namespace
+
+
+def submit_barriers(
+    backend: SchedulerBackend,
+    name: str,
+    depends: List[str],
+    namespace: Dict[str, Any],
+    max_depends: int = DEFAULT_MAX_DEPENDS,
+) -> List[str]:
+    # each barrier job waits on one chunk, so the caller only waits on the
+    # barriers, repeated until the list is short enough
+    level = 0
+    namespace = {**namespace, **barrier_pbs_context}
+    while len(depends) > max_depends:
+        level += 1
+        depends = [
+            backend.submit(
+                "{} barrier {}.{}".format(name, level, i),
+                "true",
+                namespace,
+                depends[start : start + max_depends],
+            )
+            for i, start in enumerate(range(0, len(depends), max_depends))
+        ]
+    return depends
+
+
+def run_pbs_pipeline(
+    pipeline: Pipeline,
+    backend: Optional[SchedulerBackend] = None,
+    submit_jobs: int = DEFAULT_SUBMIT_JOBS,
+    max_depends: int = DEFAULT_MAX_DEPENDS,
+    reduce_depends: bool = False,
+    steps: Optional[Collection[str]] = None,
+    dag: Optional[networkx.MultiDiGraph] = None,
+) -> PipelineRun:
     pipeline_run = PipelineRun(pipeline=pipeline)
-    dag = pipeline_to_dag(pipeline)
-    step_runs: List[StepRun] = []
+    if dag is None:
+        dag = pipeline_to_dag(pipeline)
+    if steps is not None:
+        dag = dag.subgraph(steps)
+    templates = TemplateCache()
+    templates.check_pipeline(pipeline, pbs=True)
+    if backend is None:
+        backend = PBSBackend(
+            jobs_dir=Path(DEFAULT_JOBS_DIR) / pipeline_run.id, templates=templates
+        )
+    namespace = pbs_namespace(pipeline.resources, pipeline.context)
     step_to_pbs_id_map: Dict[str, str] = {}
-    errored = False
-    for step_id in get_execution_order(dag):
-        print("running step: {}".format(step_id))
+    # afterok is transitive, so the direct predecessors are always enough
+    depends_dag = get_reduced_dag(dag) if reduce_depends else dag
+
+    # a job array has its size fixed at submission, so every map is expanded
+    # before anything is submitted
+    items_by_map: Dict[str, List[Path]] = {}
+    for step_id in dag.nodes:
+        step = pipeline.get_step(step_id)
+        if not is_map_step(step):
+            continue
+        predecessors = list(dag.predecessors(step_id))
+        if isinstance(step.over, str):
+            listed_late = bool(predecessors)
+        else:
+            produced = {x for p in predecessors for x in pipeline.get_step(p).outputs}
+            listed_late = any(
+                isinstance(pipeline.resources.get(x), FileSet) and x in produced
+                for x in step.over
+            )
+        if listed_late:
+            raise SubmissionException(
+                "map step {} lists files made by other steps, which do not exist "
+                "at submission, map over resource keys of single files or run "
+                "it locally instead!".format(step_id)
+            )
+        items = map_items(step, pipeline.resources, pipeline.context, templates)
+        if not items:
+            raise SubmissionException(
+                "map step {} has nothing to map over!".format(step_id)
+            )
+        items_by_map[step_id] = items
+
+    def submit_map(
+        step: MapStep, namespace: Dict[str, Any], depends: List[str]
+    ) -> List[Tuple[str, str]]:
+        items = items_by_map[step.name]
+        commands = [
+            render_command(x, pipeline.resources, context, templates=templates)
+            for x, context in map_shards(step, items, pipeline.context)
+        ]
+        array_id = backend.submit_array(step.name, commands, namespace, depends)
+        gather = map_gather(step, items, pipeline.context)
+        if gather is None:
+            return [(step.name, array_id)]
+        command = render_command(
+            gather[0], pipeline.resources, gather[1], templates=templates
+        )
+        gather_id = backend.submit(gather_name(step), command, namespace, [array_id])
+        return [(step.name, array_id), (gather_name(step), gather_id)]
+
+    def submit(step_id: str) -> List[Tuple[str, str]]:
+        # the last job submitted for a step is the one its dependents wait on
         step = pipeline.get_step(step_id)
-        pbs_depends = [step_to_pbs_id_map[x] for x in get_ancestors(dag, step_id)]
-        pbs_id = run_pbs_step(
-            step,
-            pipeline.resources,
-            pipeline.context,
-            depends=pbs_depends,
-        )
-        step_to_pbs_id_map[step_id] = pbs_id
-    pipeline_run.outcome = "error" if errored else "finished"
+        pbs_depends = submit_barriers(
+            backend,
+            step_id,
+            [step_to_pbs_id_map[x] for x in get_predecessors(depends_dag, step_id)],
+            namespace,
+            max_depends=max_depends,
+        )
+        if is_map_step(step):
+            return submit_map(step, step_pbs_namespace(namespace, step), pbs_depends)
+        command = render_command(
+            step, pipeline.resources, pipeline.context, templates=templates
+        )
+        return [
+            (
+                step_id,
+                backend.submit(
+                    step_id, command, step_pbs_namespace(namespace, step), pbs_depends
+                ),
+            )
+        ]
+
+    # steps in one generation never depend on each other, so each generation
+    # can be submitted concurrently once the previous one has job ids
+    step_runs: List[StepRun] = []
+    with ThreadPoolExecutor(max_workers=max(submit_jobs, 1)) as executor:
+        for generation in get_generations(dag):
+            for step_id, jobs in zip(generation, executor.map(submit, generation)):
+                step_to_pbs_id_map[step_id] = jobs[-1][1]
+                step_runs.extend(
+                    StepRun(step_name=name, job_id=pbs_id, outcome="submitted")
+                    for name, pbs_id in jobs
+                )
+    pipeline_run.outcome = "submitted"
     pipeline_run.step_runs = step_runs
     return pipeline_run
@@ -0,0 +1,110 @@
+from heapq import heappop, heappush
+from statistics import median
+from typing import Collection, Dict, List, Optional, Tuple
+
+import networkx
+
+from pypes.constants import DEFAULT_HISTORY_RUNS, DEFAULT_STEP_ESTIMATE
+from pypes.exec.depend import (
+    get_bottom_levels,
+    get_critical_path,
+    get_execution_order,
+    pipeline_to_dag,
+)
+from pypes.history import HistoryStore
+from pypes.models.pipeline import Pipeline
+from pypes.models.plan import Plan, StepEstimate
+
+
+def estimate_durations(
+    pipeline: Pipeline,
+    history: Optional[HistoryStore] = None,
+    last: int = DEFAULT_HISTORY_RUNS,
+) -> Dict[str, Tuple[float, str]]:
+    recorded: Dict[str, float] = {}
+    if history is not None:
+        for step_stats in history.step_stats(pipeline.name, last=last):
+            if step_stats.p50_ms is not None:
+                recorded[step_stats.step_name] = step_stats.p50_ms / 1000
+    declared = {x.name: x.estimate for x in pipeline.steps if x.estimate is not None}
+    known = list({**declared, **recorded}.values())
+    # steps nobody knows anything about are assumed to be typical
+    default = median(known) if known else DEFAULT_STEP_ESTIMATE
+    durations: Dict[str, Tuple[float, str]] = {}
+    for step in pipeline.steps:
+        if step.name in recorded:
+            durations[step.name] = (recorded[step.name], "history")
+        elif step.name in declared:
+            durations[step.name] = (declared[step.name], "estimate")
+        else:
+            durations[step.name] = (default, "default")
+    return durations
+
+
+def step_priorities(
+    pipeline: Pipeline,
+    dag: networkx.MultiDiGraph,
+    history: Optional[HistoryStore] = None,
+) -> Optional[Dict[str, float]]:
+    # without any durations every order is a guess, keep the topological one
+    durations = estimate_durations(pipeline, history)
+    if all(source == "default" for _, source in durations.values()):
+        return None
+    return get_bottom_levels(dag, {k: v for k, (v, _) in durations.items()})
+
+
+def simulate_makespan(
+    dag: networkx.MultiDiGraph,
+    durations: Dict[str, float],
+    priorities: Dict[str, float],
+    jobs: int = 1,
+) -> float:
+    # list scheduling, the way the local executor dispatches ready steps
+    order = {name: i for i, name in enumerate(get_execution_order(dag))}
+    waiting_on = {name: len(dag.pred[name]) for name in dag.nodes}
+    ready: List[Tuple[float, int, str]] = []
+    for name, count in waiting_on.items():
+        if count == 0:
+            heappush(ready, (-priorities[name], order[name], name))
+    running: List[Tuple[float, str]] = []
+    now = 0.0
+    while ready or running:
+        while ready and len(running) < jobs:
+            _, _, name = heappop(ready)
+            heappush(running, (now + durations[name], name))
+        now, name = heappop(running)
+        for successor in dag.successors(name):
+            waiting_on[successor] -= 1
+            if waiting_on[successor] == 0:
+                heappush(ready, (-priorities[successor], order[successor], successor))
+    return now
+
+
+def plan_pipeline(
+    pipeline: Pipeline,
+    jobs: int = 1,
+    history: Optional[HistoryStore] = None,
+    steps: Optional[Collection[str]] = None,
+) -> Plan:
+    dag = pipeline_to_dag(pipeline)
+    if steps is not None:
+        dag = dag.subgraph(steps)
+    estimates = estimate_durations(pipeline, history)
+    durations = {k: v for k, (v, _) in estimates.items() if k in dag}
+    levels = get_bottom_levels(dag, durations)
+    critical_path = get_critical_path(dag, levels)
+    return Plan(
+        jobs=jobs,
+        makespan=simulate_makespan(dag, durations, levels, jobs=jobs),
+        critical_path_length=sum(durations[x] for x in critical_path),
+        critical_path=critical_path,
+        steps={
+            name: StepEstimate(
+                step_name=name,
+                seconds=durations[name],
+                source=estimates[name][1],
+                priority=levels[name],
+            )
+            for name in get_execution_order(dag)
+        },
+    )
@@ -0,0 +1,97 @@
+import glob
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pypes.exec.listing import list_files
+from pypes.exec.template import TemplateCache
+from pypes.models.resource import FileSet, Resource
+from pypes.models.step import MapStep, Step
+
+# a step to run and the context to render its command with
+Part = Tuple[Step, Dict[str, Any]]
+
+
+def map_items(
+    step: MapStep,
+    resources: Dict[str, Resource],
+    context: Dict[str, str],
+    templates: Optional[TemplateCache] = None,
+) -> List[Path]:
+    if not isinstance(step.over, str):
+        items: List[Path] = []
+        for key in step.over:
+            resource = resources[key]
+            if isinstance(resource, FileSet):
+                items.extend(Path(x.path) for x in list_files(resource))
+            else:
+                items.append(resource)
+        return items
+    templates = templates or TemplateCache()
+    pattern = templates.render(step.over, **resources, **context)
+    return [Path(x) for x in sorted(glob.glob(pattern, recursive=True))]
+
+
+def shard_name(step: MapStep, index: int) -> str:
+    return "{}[{}]".format(step.name, index)
+
+
+def gather_name(step: MapStep) -> str:
+    return "{} gather".format(step.name)
+
+
+def map_shards(step: MapStep, items: List[Path], context: Dict[str, str]) -> List[Part]:
+    # shards declare no outputs, so they are never cached or skipped as fresh
+    return [
+        (
+            Step(
+                name=shard_name(step, i),
+                inputs=step.all_inputs(),
+                command=step.command,
+                argv=step.argv,
+                cpus=step.cpus,
+                memory=step.memory,
+                walltime=step.walltime,
+            ),
+            {**context, "item": item, "index": i},
+        )
+        for i, item in enumerate(items)
+    ]
+
+
+def map_gather(
+    step: MapStep, items: List[Path], context: Dict[str, str]
+) -> Optional[Part]:
+    if step.gather is None:
+        return None
+    gather = Step(
+        name=gather_name(step),
+        inputs=step.all_inputs(),
+        outputs=step.outputs,
+        command=step.gather,
+        walltime=step.walltime,
+    )
+    return gather, {**context, "items": " ".join(str(x) for x in items)}
+
+
+class ExpandedMap:
+    """The shards of a map step that are still to finish, and its gather."""
+
+    def __init__(self, shards: List[Part], gather: Optional[Part]):
+        self.started_at = datetime.utcnow()
+        self.shards = shards
+        self.gather = gather
+        self.left = len(shards)
+        self.failed = False
+
+
+def expand_map_step(
+    step: MapStep,
+    resources: Dict[str, Resource],
+    context: Dict[str, str],
+    templates: Optional[TemplateCache] = None,
+) -> ExpandedMap:
+    items = map_items(step, resources, context, templates=templates)
+    return ExpandedMap(
+        map_shards(step, items, context), map_gather(step, items, context)
+    )
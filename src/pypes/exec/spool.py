@@ -0,0 +1,70 @@
+import gzip
+from pathlib import Path
+from typing import BinaryIO, Optional, cast
+
+from pypes.constants import DEFAULT_EXCERPT_SIZE
+from pypes.models.base import PypesModel
+from slugify import slugify
+
+
+class LogConfig(PypesModel):
+    path: Optional[Path] = None
+    compress: bool = False
+    excerpt_size: int = DEFAULT_EXCERPT_SIZE
+
+    def log_path(self, step_name: str, step_run_id: str, stream: str) -> Optional[Path]:
+        if self.path is None:
+            return None
+        file_name = "{}-{}.{}".format(slugify(step_name), step_run_id[:8], stream)
+        return self.path / (file_name + ".gz" if self.compress else file_name)
+
+
+class OutputSpool:
+    """Streams output to an optional log file, keeping only its head and tail."""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        compress: bool = False,
+        excerpt_size: int = DEFAULT_EXCERPT_SIZE,
+    ):
+        self.path = path
+        self.excerpt_size = excerpt_size
+        self.size = 0
+        self.head = bytearray()
+        self.tail = bytearray()
+        self._file: Optional[BinaryIO] = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if compress:
+                self._file = cast(BinaryIO, gzip.open(path, "wb"))
+            else:
+                self._file = open(path, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+        room = self.excerpt_size - len(self.head)
+        if room > 0:
+            self.head.extend(chunk[:room])
+            chunk = chunk[room:]
+        if chunk:
+            self.tail.extend(chunk)
+            if len(self.tail) > self.excerpt_size:
+                del self.tail[: len(self.tail) - self.excerpt_size]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def excerpt(self) -> str:
+        omitted = self.size - len(self.head) - len(self.tail)
+        if omitted == 0:
+            return (self.head + self.tail).decode(errors="replace")
+        return "{}\n... {} bytes omitted ...\n{}".format(
+            self.head.decode(errors="replace"),
+            omitted,
+            self.tail.decode(errors="replace"),
+        )
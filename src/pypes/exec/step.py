@@ -1,66 +1,271 @@
+import asyncio
+import functools
+import os
+import shlex
+import shutil
+import signal
 import subprocess
-from pathlib import Path
-from typing import Dict, List
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from jinja2 import Environment
-from pypes.constants import default_pbs_context, header_template, qsub_template
+from pypes.constants import DEFAULT_KILL_GRACE, STREAM_CHUNK_SIZE
+from pypes.exec.spool import LogConfig, OutputSpool
+from pypes.exec.template import TemplateCache
+from pypes.models.resource import Resource
 from pypes.models.run import StepRun
 from pypes.models.step import Step
-from slugify import slugify
+from pypes.units import parse_duration
 
 
-def build_depends_array(depends: List[str]):
-    return "-W depend=afterok:{}".format(":".join(depends))
+async def connect_pipe(fd: int) -> asyncio.StreamReader:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=STREAM_CHUNK_SIZE)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0)
+    )
+    return reader
+
+
+async def wait_for_exit(pid: int) -> Tuple[int, Any]:
+    # asyncio reaps its children with waitpid and throws the rusage away, so
+    # wait on a pidfd and reap the child with wait4 ourselves
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        _, status, rusage = await asyncio.to_thread(os.wait4, pid, 0)
+        return os.waitstatus_to_exitcode(status), rusage
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+
+    def on_exit():
+        # the pidfd stays readable, so this can run again before it is removed
+        if not exited.done():
+            exited.set_result(None)
+
+    loop.add_reader(pidfd, on_exit)
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    _, status, rusage = os.wait4(pid, 0)
+    return os.waitstatus_to_exitcode(status), rusage
+
+
+def apply_rusage(step_run: StepRun, rusage: Any, wall_time: float):
+    step_run.wall_time = wall_time
+    step_run.user_time = rusage.ru_utime
+    step_run.system_time = rusage.ru_stime
+    # linux reports kilobytes, macos reports bytes
+    step_run.max_rss = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    step_run.read_blocks = rusage.ru_inblock
+    step_run.write_blocks = rusage.ru_oublock
+
+
+async def drain_stream(stream: Optional[asyncio.StreamReader], sink: OutputSpool):
+    if stream is None:
+        return
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        sink.write(chunk)
+
+
+def signal_process_group(pgid: int, signum: int):
+    try:
+        os.killpg(pgid, signum)
+    except ProcessLookupError:
+        pass
+
+
+async def kill_process_group(
+    pgid: int, exited: "asyncio.Future", grace: float = DEFAULT_KILL_GRACE
+):
+    # only signal while the leader is unreaped, so the group id can not have
+    # been reused by an unrelated process
+    if exited.done():
+        return
+    signal_process_group(pgid, signal.SIGTERM)
+    done, _ = await asyncio.wait([exited], timeout=grace)
+    if not done:
+        signal_process_group(pgid, signal.SIGKILL)
+    await exited
+
+
+@functools.lru_cache(maxsize=1024)
+def resolve_program(program: str, search_path: Optional[str]) -> str:
+    # look a program up once, rather than have every exec walk the path
+    if os.sep in program:
+        return program
+    return shutil.which(program, path=search_path) or program
+
+
+async def run_process(
+    command: Union[str, List[str]],
+    stdout: OutputSpool,
+    stderr: OutputSpool,
+    timeout: Optional[float] = None,
+) -> Tuple[int, Any, float, bool]:
+    executable = None
+    if not isinstance(command, str):
+        executable = resolve_program(command[0], os.environ.get("PATH"))
+    stdout_read, stdout_write = os.pipe()
+    stderr_read, stderr_write = os.pipe()
+    started = time.monotonic()
+    try:
+        # a session of its own puts the step and everything it starts in one
+        # process group, so it can all be killed together. an argv command
+        # skips the shell, and with it a fork and exec per step
+        process = subprocess.Popen(
+            command,
+            shell=isinstance(command, str),
+            executable=executable,
+            stdout=stdout_write,
+            stderr=stderr_write,
+            start_new_session=True,
+        )
+    except BaseException:
+        os.close(stdout_read)
+        os.close(stderr_read)
+        raise
+    finally:
+        os.close(stdout_write)
+        os.close(stderr_write)
+    exited = asyncio.ensure_future(wait_for_exit(process.pid))
+    unconnected = [stdout_read, stderr_read]
+    drained: Optional[asyncio.Future] = None
+    timed_out = False
+    try:
+        readers = []
+        for fd in list(unconnected):
+            readers.append(await connect_pipe(fd))
+            unconnected.remove(fd)
+        drained = asyncio.ensure_future(
+            asyncio.gather(
+                drain_stream(readers[0], stdout), drain_stream(readers[1], stderr)
+            )
+        )
+        done, _ = await asyncio.wait([exited], timeout=timeout)
+        if not done:
+            timed_out = True
+            await kill_process_group(process.pid, exited)
+        await drained
+    except BaseException:
+        # cancelled by a signal, fail fast or the loop shutting down, the
+        # process group must not outlive the step
+        for fd in unconnected:
+            os.close(fd)
+        await kill_process_group(process.pid, exited)
+        # reaped already, stop Popen from trying again
+        process.returncode = exited.result()[0]
+        if drained is not None:
+            drained.cancel()
+            await asyncio.gather(drained, return_exceptions=True)
+        raise
+    returncode, rusage = exited.result()
+    # reaped already, stop Popen from trying again
+    process.returncode = returncode
+    return returncode, rusage, time.monotonic() - started, timed_out
 
 
-def run_pbs_step(
+def step_timeout(step: Step, context: Dict[str, str]) -> Optional[float]:
+    walltime = step.walltime or context.get("walltime")
+    return parse_duration(walltime) if walltime else None
+
+
+def render_argv(
     step: Step,
-    resources: Dict[str, Path],
+    resources: Dict[str, Resource],
     context: Dict[str, str],
-    depends: List[str],
+    templates: Optional[TemplateCache] = None,
+) -> List[str]:
+    templates = templates or TemplateCache()
+    return [templates.render(x, **resources, **context) for x in step.argv or []]
+
+
+def render_command(
+    step: Step,
+    resources: Dict[str, Resource],
+    context: Dict[str, str],
+    templates: Optional[TemplateCache] = None,
 ) -> str:
-    command = Environment().from_string(step.command).render(**resources, **context)
-    header_file_contents = (
-        Environment()
-        .from_string(header_template)
-        .render(**context, **resources, command=command)
-    )
+    # argv steps are quoted into a shell command wherever one is needed, like
+    # in a pbs job script
+    if step.argv is not None:
+        return shlex.join(render_argv(step, resources, context, templates))
+    templates = templates or TemplateCache()
+    return templates.render(step.command, **resources, **context)
 
-    header_file_path = "{}.header.pbs".format(slugify(step.name, separator="_"))
-    with open(header_file_path, "w+") as f:
-        print("writing pbs header to {}".format(header_file_path))
-        f.write(header_file_contents)
-
-    process = subprocess.Popen(
-        Environment()
-        .from_string(qsub_template)
-        .render(depends_str=build_depends_array(depends), header_file=header_file_path),
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    process.wait()
-    pbs_id = process.stdout.read().decode() if process.stdout else ""
-    return pbs_id
+
+async def run_step_async(
+    step: Step,
+    resources: Dict[str, Resource],
+    context: Dict[str, str],
+    logs: Optional[LogConfig] = None,
+    templates: Optional[TemplateCache] = None,
+    timeout: Optional[float] = None,
+) -> StepRun:
+    logs = logs or LogConfig()
+    step_run = StepRun(step_name=step.name)
+    command: Union[str, List[str]]
+    if step.argv is not None:
+        command = render_argv(step, resources, context, templates=templates)
+    else:
+        command = render_command(step, resources, context, templates=templates)
+    spools = [
+        OutputSpool(
+            logs.log_path(step.name, step_run.id, stream),
+            compress=logs.compress,
+            excerpt_size=logs.excerpt_size,
+        )
+        for stream in ("stdout", "stderr")
+    ]
+    stdout, stderr = spools
+    rusage = None
+    try:
+        returncode, rusage, wall_time, timed_out = await run_process(
+            command, stdout, stderr, timeout=timeout
+        )
+    except OSError as e:
+        # the program could not be executed, e.g. a script without a shebang,
+        # report it like a shell would
+        stderr.write("{}\n".format(e).encode())
+        returncode = 127 if isinstance(e, FileNotFoundError) else 126
+        timed_out = False
+    finally:
+        for spool in spools:
+            spool.close()
+
+    if rusage is not None:
+        apply_rusage(step_run, rusage, wall_time)
+    step_run.stdout = stdout.excerpt()
+    step_run.stderr = stderr.excerpt()
+    step_run.stdout_path = str(stdout.path) if stdout.path else None
+    step_run.stderr_path = str(stderr.path) if stderr.path else None
+    step_run.stdout_bytes = stdout.size
+    step_run.stderr_bytes = stderr.size
+    step_run.finished_at = datetime.utcnow()
+    step_run.returncode = returncode
+    if timed_out:
+        step_run.outcome = "timeout"
+    else:
+        step_run.outcome = "finished" if returncode == 0 else "error"
+    return step_run
 
 
 def run_step(
-    step: Step, resources: Dict[str, Path], context: Dict[str, str]
+    step: Step,
+    resources: Dict[str, Resource],
+    context: Dict[str, str],
+    logs: Optional[LogConfig] = None,
+    templates: Optional[TemplateCache] = None,
+    timeout: Optional[float] = None,
 ) -> StepRun:
-    command_subbed = (
-        Environment().from_string(step.command).render(**resources, **context)
-    )
-    process = subprocess.Popen(
-        command_subbed, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    )
-    process.wait()
-    stdout = process.stdout.read().decode() if process.stdout else ""
-    stderr = process.stderr.read().decode() if process.stderr else ""
-    returncode = process.returncode
-    return StepRun(
-        step_name=step.name,
-        stdout=stdout,
-        stderr=stderr,
-        returncode=returncode,
-        outcome="finished" if returncode == 0 else "error",
+    return asyncio.run(
+        run_step_async(
+            step, resources, context, logs=logs, templates=templates, timeout=timeout
+        )
     )
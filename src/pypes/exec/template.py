@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Set
+
+from jinja2 import Environment, StrictUndefined, Template, TemplateError, meta
+from pypes.constants import (
+    MAP_GATHER_NAMES,
+    MAP_SHARD_NAMES,
+    header_template,
+    optional_pbs_context,
+)
+from pypes.exceptions import InvalidTemplateException
+from pypes.models.guards import is_map_step
+from pypes.models.pipeline import Pipeline
+from pypes.models.resource import Resource
+
+
+class TemplateCache:
+    """A shared jinja environment that compiles each template source once."""
+
+    def __init__(self):
+        self.environment = Environment(undefined=StrictUndefined)
+        self._templates: Dict[str, Template] = {}
+        self._names: Dict[str, Set[str]] = {}
+
+    def get(self, source: str) -> Template:
+        template = self._templates.get(source)
+        if template is None:
+            template = self.environment.from_string(source)
+            self._templates[source] = template
+        return template
+
+    def render(self, source: str, **namespace: Any) -> str:
+        # plain text, like most argv arguments, renders to itself
+        if "{" not in source and "\n" not in source and "\r" not in source:
+            return source
+        return self.get(source).render(**namespace)
+
+    def names(self, source: str) -> Set[str]:
+        names = self._names.get(source)
+        if names is None:
+            names = meta.find_undeclared_variables(self.environment.parse(source))
+            self._names[source] = names
+        return names
+
+    def check_source(self, label: str, source: str, known_names: Set[str]) -> List[str]:
+        try:
+            self.get(source)
+            missing = self.names(source) - known_names
+        except TemplateError as e:
+            return ["{}: {}".format(label, e)]
+        if missing:
+            return [
+                "{} uses undefined names: {}".format(label, ", ".join(sorted(missing)))
+            ]
+        return []
+
+    def check_pipeline(self, pipeline: Pipeline, pbs: bool = False):
+        known_names = set(pipeline.resources) | set(pipeline.context)
+        errors: List[str] = []
+        for step in pipeline.steps:
+            label = "step '{}'".format(step.name)
+            shard_names = set(MAP_SHARD_NAMES) if is_map_step(step) else set()
+            for source in step.command_templates():
+                errors += self.check_source(label, source, known_names | shard_names)
+            if not is_map_step(step):
+                continue
+            if step.gather is not None:
+                errors += self.check_source(
+                    "{} gather".format(label),
+                    step.gather,
+                    known_names | set(MAP_GATHER_NAMES),
+                )
+            if isinstance(step.over, str):
+                errors += self.check_source(label, step.over, known_names)
+            else:
+                unknown = [x for x in step.over if x not in pipeline.resources]
+                if unknown:
+                    errors.append(
+                        "{} maps over undefined resources: {}".format(
+                            label, ", ".join(unknown)
+                        )
+                    )
+        if pbs:
+            try:
+                self.render(
+                    header_template,
+                    **pbs_namespace(pipeline.resources, pipeline.context, command=""),
+                )
+            except TemplateError as e:
+                errors.append("pbs header: {}".format(e))
+        if errors:
+            raise InvalidTemplateException(
+                "Pipeline has invalid templates!\n{}".format("\n".join(errors))
+            )
+
+
+def pbs_namespace(
+    resources: Dict[str, Resource], context: Dict[str, str], **extra: Any
+) -> Dict[str, Any]:
+    return {**optional_pbs_context, **context, **resources, **extra}
@@ -0,0 +1,113 @@
+import time
+from typing import Callable, Dict, List, Optional
+
+from pypes.constants import (
+    DEFAULT_POLL_INTERVAL,
+    MAX_MISSING_POLLS,
+    MAX_POLL_INTERVAL,
+)
+from pypes.exceptions import JobStatusException
+from pypes.exec.backends import SchedulerBackend
+from pypes.models.base import FAILED_OUTCOMES
+from pypes.models.job import JobStatus
+from pypes.models.run import PipelineRun, StepRun
+
+
+def is_outstanding(step_run: StepRun) -> bool:
+    return step_run.job_id is not None and step_run.outcome in ("submitted", "running")
+
+
+def apply_job_status(step_run: StepRun, status: JobStatus) -> bool:
+    before = (step_run.outcome, step_run.returncode)
+    if status.started_at is not None:
+        step_run.ran_at = status.started_at
+    if status.finished:
+        # jobs deleted by the scheduler (e.g. a failed dependency) have no status
+        step_run.returncode = -1 if status.exit_status is None else status.exit_status
+        step_run.outcome = "finished" if status.exit_status == 0 else "error"
+        step_run.finished_at = status.finished_at
+    elif status.state in ("R", "B"):
+        # B is an array job with some of its subjobs started
+        step_run.outcome = "running"
+    return (step_run.outcome, step_run.returncode) != before
+
+
+class JobTracker:
+    """Polls every outstanding job with one status call per interval."""
+
+    def __init__(
+        self,
+        backend: SchedulerBackend,
+        min_interval: float = DEFAULT_POLL_INTERVAL,
+        max_interval: float = MAX_POLL_INTERVAL,
+        backoff: float = 1.5,
+        max_missing: int = MAX_MISSING_POLLS,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_missing = max_missing
+        self.sleep = sleep
+        self.clock = clock
+        self._missing: Dict[str, int] = {}
+
+    def update(self, step_runs: List[StepRun]) -> List[StepRun]:
+        outstanding: Dict[str, StepRun] = {
+            x.job_id: x for x in step_runs if x.job_id and is_outstanding(x)
+        }
+        if not outstanding:
+            return []
+        try:
+            statuses = self.backend.status(list(outstanding))
+        except JobStatusException:
+            # treat a failed poll like a quiet one and back off
+            return []
+        changed = [
+            outstanding[job_id]
+            for job_id, status in statuses.items()
+            if job_id in outstanding and apply_job_status(outstanding[job_id], status)
+        ]
+        # a job the scheduler has forgotten, e.g. past its history, would
+        # otherwise be waited on forever
+        for job_id, step_run in outstanding.items():
+            if job_id in statuses:
+                self._missing.pop(job_id, None)
+                continue
+            self._missing[job_id] = self._missing.get(job_id, 0) + 1
+            if self._missing[job_id] >= self.max_missing:
+                del self._missing[job_id]
+                lost = JobStatus(job_id=job_id, state="F")
+                apply_job_status(step_run, lost)
+                changed.append(step_run)
+        return changed
+
+    def wait(
+        self,
+        pipeline_run: PipelineRun,
+        on_update: Optional[Callable[[StepRun], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> PipelineRun:
+        interval = self.min_interval
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            changed = self.update(pipeline_run.step_runs)
+            if on_update is not None:
+                for step_run in changed:
+                    on_update(step_run)
+            if not any(is_outstanding(x) for x in pipeline_run.step_runs):
+                break
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            if deadline is not None and self.clock() + interval > deadline:
+                raise JobStatusException(
+                    "jobs still outstanding after {}s!".format(timeout)
+                )
+            self.sleep(interval)
+        errored = any(x.outcome in FAILED_OUTCOMES for x in pipeline_run.step_runs)
+        pipeline_run.outcome = "error" if errored else "finished"
+        return pipeline_run
@@ -0,0 +1,274 @@
+import math
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pypes.constants import DEFAULT_HISTORY_PATH
+from pypes.models.base import FAILED_OUTCOMES
+from pypes.models.history import PipelineRunSummary, StepStats, StepUsage
+from pypes.models.run import PipelineRun, StepRun
+
+SCHEMA = """
+create table if not exists pipeline_runs (
+    id text primary key,
+    pipeline_name text not null,
+    ran_at text not null,
+    outcome text
+);
+create table if not exists step_runs (
+    id text primary key,
+    pipeline_run_id text not null references pipeline_runs (id) on delete cascade,
+    step_name text not null,
+    ran_at text not null,
+    finished_at text,
+    duration_ms real,
+    outcome text,
+    job_id text,
+    returncode integer not null,
+    stdout_path text,
+    stderr_path text,
+    stdout_bytes integer not null,
+    stderr_bytes integer not null,
+    wall_time real,
+    user_time real,
+    system_time real,
+    max_rss integer,
+    read_blocks integer,
+    write_blocks integer
+);
+create index if not exists pipeline_runs_name on pipeline_runs (pipeline_name, ran_at);
+create index if not exists pipeline_runs_ran_at on pipeline_runs (ran_at);
+create index if not exists pipeline_runs_outcome on pipeline_runs (outcome, ran_at);
+create index if not exists step_runs_run on step_runs (pipeline_run_id);
+create index if not exists step_runs_step on step_runs (step_name, ran_at);
+create index if not exists step_runs_outcome on step_runs (outcome, ran_at);
+"""
+
+STEP_RUN_COLUMNS = [
+    "id",
+    "ran_at",
+    "finished_at",
+    "step_name",
+    "job_id",
+    "outcome",
+    "stdout_path",
+    "stderr_path",
+    "stdout_bytes",
+    "stderr_bytes",
+    "returncode",
+    "wall_time",
+    "user_time",
+    "system_time",
+    "max_rss",
+    "read_blocks",
+    "write_blocks",
+]
+
+# columns added after the first schema, with their types
+ADDED_STEP_RUN_COLUMNS = {
+    "wall_time": "real",
+    "user_time": "real",
+    "system_time": "real",
+    "max_rss": "integer",
+    "read_blocks": "integer",
+    "write_blocks": "integer",
+}
+
+USAGE_METRICS = list(ADDED_STEP_RUN_COLUMNS)
+
+
+def sql_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def where_clause(
+    equals: Dict[str, Any], since: Optional[datetime] = None
+) -> Tuple[str, List[Any]]:
+    clauses = ["{} = ?".format(k) for k, v in equals.items() if v is not None]
+    params = [v for v in equals.values() if v is not None]
+    if since is not None:
+        clauses.append("ran_at >= ?")
+        params.append(since.isoformat())
+    return ("where " + " and ".join(clauses) if clauses else ""), params
+
+
+def duration_ms(step_run: StepRun) -> Optional[float]:
+    if step_run.finished_at is None:
+        return None
+    return (step_run.finished_at - step_run.ran_at).total_seconds() * 1000
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    # nearest rank, so the result is always one of the recorded durations
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(math.ceil(q * len(values) / 100), 1)
+    return values[rank - 1]
+
+
+class HistoryStore:
+    """Records pipeline and step runs in a sqlite database."""
+
+    def __init__(self, path: Path = Path(DEFAULT_HISTORY_PATH)):
+        self.path = path
+        if str(path) != ":memory:":
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("pragma foreign_keys = on")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        existing = {
+            x["name"] for x in self.connection.execute("pragma table_info(step_runs)")
+        }
+        for column, kind in ADDED_STEP_RUN_COLUMNS.items():
+            if column not in existing:
+                self.connection.execute(
+                    "alter table step_runs add column {} {}".format(column, kind)
+                )
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, pipeline_run: PipelineRun):
+        # a resumed run is recorded again under the same id, keeping the
+        # records of its earlier attempts
+        with self.connection:
+            self.connection.execute(
+                "insert into pipeline_runs values (?, ?, ?, ?) "
+                "on conflict (id) do update set outcome = excluded.outcome",
+                (
+                    pipeline_run.id,
+                    pipeline_run.pipeline.name,
+                    pipeline_run.ran_at.isoformat(),
+                    pipeline_run.outcome,
+                ),
+            )
+            columns = ["pipeline_run_id", "duration_ms", *STEP_RUN_COLUMNS]
+            self.connection.executemany(
+                "insert or replace into step_runs ({}) values ({})".format(
+                    ", ".join(columns), ", ".join("?" * len(columns))
+                ),
+                [
+                    (
+                        pipeline_run.id,
+                        duration_ms(x),
+                        *(sql_value(getattr(x, c)) for c in STEP_RUN_COLUMNS),
+                    )
+                    for x in pipeline_run.step_runs
+                ],
+            )
+
+    def pipeline_runs(
+        self,
+        pipeline_name: Optional[str] = None,
+        outcome: Optional[str] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[PipelineRunSummary]:
+        where, params = where_clause(
+            {"pipeline_name": pipeline_name, "outcome": outcome}, since
+        )
+        query = "select * from pipeline_runs {} order by ran_at desc".format(where)
+        if limit is not None:
+            query += " limit ?"
+            params.append(limit)
+        return [PipelineRunSummary(**x) for x in self.connection.execute(query, params)]
+
+    def step_runs(
+        self,
+        pipeline_run_id: Optional[str] = None,
+        step_name: Optional[str] = None,
+        outcome: Optional[str] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[StepRun]:
+        where, params = where_clause(
+            {
+                "pipeline_run_id": pipeline_run_id,
+                "step_name": step_name,
+                "outcome": outcome,
+            },
+            since,
+        )
+        query = "select {} from step_runs {} order by ran_at desc".format(
+            ", ".join(STEP_RUN_COLUMNS), where
+        )
+        if limit is not None:
+            query += " limit ?"
+            params.append(limit)
+        return [StepRun(**x) for x in self.connection.execute(query, params)]
+
+    def step_stats(
+        self,
+        pipeline_name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        last: Optional[int] = None,
+    ) -> List[StepStats]:
+        """Duration percentiles per step over the last `last` pipeline runs."""
+        runs, params = self._latest_runs(pipeline_name, since, last)
+        rows = self.connection.execute(
+            "select step_name, outcome, duration_ms from step_runs "
+            "where pipeline_run_id in ({})".format(runs),
+            params,
+        )
+        durations: Dict[str, List[float]] = {}
+        stats: Dict[str, StepStats] = {}
+        for row in rows:
+            step_stats = stats.setdefault(
+                row["step_name"], StepStats(step_name=row["step_name"])
+            )
+            step_stats.runs += 1
+            if row["outcome"] in FAILED_OUTCOMES:
+                step_stats.errors += 1
+            elif row["duration_ms"] is not None:
+                durations.setdefault(row["step_name"], []).append(row["duration_ms"])
+        for step_name, step_stats in stats.items():
+            step_stats.p50_ms = percentile(durations.get(step_name, []), 50)
+            step_stats.p95_ms = percentile(durations.get(step_name, []), 95)
+        return sorted(stats.values(), key=lambda x: x.step_name)
+
+    def step_usage(
+        self,
+        pipeline_name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        last: Optional[int] = None,
+    ) -> List[StepUsage]:
+        """Mean resource usage per step over the last `last` pipeline runs."""
+        runs, params = self._latest_runs(pipeline_name, since, last)
+        rows = self.connection.execute(
+            "select step_name, count(wall_time) as runs, {} from step_runs "
+            "where pipeline_run_id in ({}) and wall_time is not null "
+            "group by step_name order by step_name".format(
+                ", ".join(
+                    # peak memory is the worst case, the rest are typical
+                    "{0}({1}) as {1}".format("max" if x == "max_rss" else "avg", x)
+                    for x in USAGE_METRICS
+                ),
+                runs,
+            ),
+            params,
+        )
+        return [StepUsage(**x) for x in rows]
+
+    def _latest_runs(
+        self,
+        pipeline_name: Optional[str],
+        since: Optional[datetime],
+        last: Optional[int],
+    ) -> Tuple[str, List[Any]]:
+        where, params = where_clause({"pipeline_name": pipeline_name}, since)
+        runs = "select id from pipeline_runs {} order by ran_at desc".format(where)
+        if last is not None:
+            runs += " limit ?"
+            params.append(last)
+        return runs, params
+
+
+def rank_steps(usages: List[StepUsage], metric: str, top: int = 5) -> List[StepUsage]:
+    ranked = [x for x in usages if getattr(x, metric) is not None]
+    return sorted(ranked, key=lambda x: getattr(x, metric), reverse=True)[:top]
@@ -1,8 +1,18 @@
 from pydantic import BaseModel
 from typing import Literal
 
+Outcome = Literal[
+    "error",
+    "finished",
+    "skipped",
+    "cached",
+    "submitted",
+    "running",
+    "timeout",
+    "cancelled",
+]
 
-Outcome = Literal["error", "finished"]
+FAILED_OUTCOMES = ["error", "timeout", "cancelled"]
 
 
 class PypesModel(BaseModel):
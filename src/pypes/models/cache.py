@@ -0,0 +1,9 @@
+from pypes.models.base import PypesModel
+
+
+class CacheStats(PypesModel):
+    path: str
+    entries: int = 0
+    objects: int = 0
+    size: int = 0
+    max_size: int = 0
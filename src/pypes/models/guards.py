@@ -1,6 +1,6 @@
 from typing import TypeGuard, Union
 
-from pypes.models.step import Step, StepPBS
+from pypes.models.step import MapStep, Step, StepPBS
 
 
 def is_step(obj: Union[Step, StepPBS]) -> TypeGuard[Step]:
@@ -13,3 +13,9 @@ def is_pbs_step(obj: Union[Step, StepPBS]) -> TypeGuard[StepPBS]:
     if type(obj) == StepPBS:
         return True
     return False
+
+
+def is_map_step(obj: Step) -> TypeGuard[MapStep]:
+    if type(obj) is MapStep:
+        return True
+    return False
@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Optional, Union
+
+from pypes.models.base import Outcome, PypesModel
+
+
+class PipelineRunSummary(PypesModel):
+    id: str
+    pipeline_name: str
+    ran_at: datetime
+    outcome: Union[Outcome, None] = None
+
+
+class StepStats(PypesModel):
+    step_name: str
+    runs: int = 0
+    errors: int = 0
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+
+
+class StepUsage(PypesModel):
+    step_name: str
+    runs: int = 0
+    wall_time: Optional[float] = None
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    max_rss: Optional[float] = None
+    read_blocks: Optional[float] = None
+    write_blocks: Optional[float] = None
@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import Optional
+
+from pypes.models.base import PypesModel
+
+
+class JobStatus(PypesModel):
+    job_id: str
+    state: str
+    exit_status: Optional[int] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state == "F"
@@ -1,44 +1,126 @@
 from datetime import datetime
-from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 from pypes.constants import default_pbs_context
-from pypes.exceptions import KeyAlreadyInUseException, NoMatchingStepException
+from pypes.exceptions import (
+    DuplicateStepException,
+    KeyAlreadyInUseException,
+    NoMatchingStepException,
+)
 from pypes.models.base import PypesModel
-from pypes.models.step import Step
+from pypes.models.resource import Resource
+from pypes.models.step import MapStep, Step
 
 
 class Pipeline(PypesModel):
     name: str
     owner: str
-    resources: Dict[str, Path] = Field(default_factory=dict)
+    resources: Dict[str, Resource] = Field(default_factory=dict)
     context: Dict[str, str] = Field(default_factory=dict)
-    steps: List[Step] = Field(default_factory=list)
+    steps: List[Union[MapStep, Step]] = Field(default_factory=list)
     created: datetime = Field(default_factory=datetime.utcnow)
     known_keys: List[str] = Field(default_factory=list)
 
+    # built in __init__ and kept in sync by the add_* methods, so lookups
+    # stay constant time however big the pipeline gets, and rebuilt when the
+    # fields were changed directly
+    _steps_by_name: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _key_kinds: Dict[str, str] = PrivateAttr(default_factory=dict)
+    _indexed: Tuple[int, ...] = PrivateAttr(default=())
+
+    def __init__(self, **data: Any):
+        super().__init__(**data)
+        self._index()
+
+    def __eq__(self, other: Any) -> bool:
+        # the indexes are derived from the fields, stale ones must not count
+        if not isinstance(other, Pipeline):
+            return NotImplemented
+        return type(self) is type(other) and self.__dict__ == other.__dict__
+
+    def _stamp(self) -> Tuple[int, ...]:
+        fields = [self.steps, self.resources, self.context, self.known_keys]
+        return tuple(f(x) for x in fields for f in (id, len))
+
+    def _index(self):
+        # the first step with a name wins, like a scan of the list would
+        self._steps_by_name = {
+            x.name: i for i, x in reversed(list(enumerate(self.steps)))
+        }
+        self._key_kinds = {
+            **{x: "unknown" for x in self.known_keys},
+            **{x: "context" for x in self.context},
+            **{x: "resource" for x in self.resources},
+        }
+        self._indexed = self._stamp()
+
+    def _check_index(self):
+        # the fields may have been replaced or changed directly
+        if self._indexed != self._stamp():
+            self._index()
+
+    def _find_step(self, name: str) -> Optional[Step]:
+        # a hit is checked against the list, which may have been changed
+        steps = self.steps
+        i = self._steps_by_name.get(name)
+        if i is not None and i < len(steps) and steps[i].name == name:
+            return steps[i]
+        self._index()
+        i = self._steps_by_name.get(name)
+        return None if i is None else self.steps[i]
+
     def _check_unique_key(self, key: str):
-        if key in self.known_keys:
+        if key in self._key_kinds:
             raise KeyAlreadyInUseException("{} is already in use!".format(key))
 
-    def add_resources(self, new_resources: Dict[str, Path]):
-        for key, path in new_resources.items():
+    def _add_keys(self, new_keys: Iterable[str], kind: str):
+        new_keys = list(new_keys)
+        self._check_index()
+        for key in new_keys:
             self._check_unique_key(key)
-            self.known_keys.append(key)
-            self.resources[key] = path
+        for key in new_keys:
+            self._key_kinds[key] = kind
+        self.known_keys.extend(new_keys)
+
+    def add_resources(self, new_resources: Dict[str, Resource]):
+        # every key is checked before any is added, a clash adds nothing
+        self._add_keys(new_resources, "resource")
+        self.resources.update(new_resources)
+        self._indexed = self._stamp()
 
     def add_context(self, new_context: Dict[str, str]):
-        for key, val in new_context.items():
-            self._check_unique_key(key)
-            self.known_keys.append(key)
-            self.context[key] = val
+        self._add_keys(new_context, "context")
+        self.context.update(new_context)
+        self._indexed = self._stamp()
+
+    def key_kind(self, key: str) -> Optional[str]:
+        self._check_index()
+        return self._key_kinds.get(key)
+
+    def add_steps(self, new_steps: Iterable[Step]):
+        new_steps = list(new_steps)
+        self._check_index()
+        names = set()
+        for step in new_steps:
+            if step.name in self._steps_by_name or step.name in names:
+                raise DuplicateStepException(
+                    "step {} is already in use!".format(step.name)
+                )
+            names.add(step.name)
+        first = len(self.steps)
+        self.steps.extend(new_steps)
+        self._steps_by_name.update({x.name: first + i for i, x in enumerate(new_steps)})
+        self._indexed = self._stamp()
+
+    def add_step(self, step: Step):
+        self.add_steps([step])
 
     def get_step(self, name: str) -> Step:
-        step_list = [x for x in self.steps if x.name == name]
-        if not step_list:
+        step = self._find_step(name)
+        if step is None:
             raise NoMatchingStepException()
-        return step_list[0]
+        return step
 
 
 class PipelinePBS(Pipeline):
@@ -0,0 +1,18 @@
+from typing import Dict, List
+
+from pypes.models.base import PypesModel
+
+
+class StepEstimate(PypesModel):
+    step_name: str
+    seconds: float
+    source: str
+    priority: float
+
+
+class Plan(PypesModel):
+    jobs: int
+    makespan: float
+    critical_path_length: float
+    critical_path: List[str]
+    steps: Dict[str, StepEstimate]
@@ -0,0 +1,32 @@
+from pathlib import Path
+from typing import Dict, List, Union
+
+from pydantic import Field
+from pypes.models.base import PypesModel
+
+
+class FileSet(PypesModel):
+    # a directory, or the files in it whose names match pattern
+    path: Path
+    pattern: str = "*"
+    recursive: bool = False
+
+    def __str__(self) -> str:
+        # templates see the directory, like they would a plain path
+        return str(self.path)
+
+
+class FileEntry(PypesModel):
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class FileListing(PypesModel):
+    # mtimes of every directory scanned, which only change when files are
+    # added, removed or renamed in them
+    directories: Dict[str, int] = Field(default_factory=dict)
+    files: List[FileEntry] = Field(default_factory=list)
+
+
+Resource = Union[Path, FileSet]
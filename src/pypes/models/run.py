@@ -1,4 +1,4 @@
-from typing import Union, List
+from typing import List, Optional, Union
 from pydantic import Field
 from datetime import datetime
 from uuid import uuid4
@@ -9,11 +9,24 @@ from pypes.models.pipeline import Pipeline
 class StepRun(PypesModel):
     id: str = Field(default_factory=lambda: uuid4().hex)
     ran_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
     step_name: str
+    job_id: Optional[str] = None
     outcome: Union[Outcome, None] = None
     stdout: str = ""
     stderr: str = ""
+    stdout_path: Optional[str] = None
+    stderr_path: Optional[str] = None
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
     returncode: int = -1
+    # resource usage of the step's process tree, seconds, bytes and blocks
+    wall_time: Optional[float] = None
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    max_rss: Optional[int] = None
+    read_blocks: Optional[int] = None
+    write_blocks: Optional[int] = None
 
 
 class PipelineRun(PypesModel):
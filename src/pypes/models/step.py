@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
 
 from pydantic import Field
 from pypes.models.base import PypesModel
@@ -10,6 +10,37 @@ class Step(PypesModel):
     inputs: List[str] = Field(default_factory=list)
     outputs: List[str] = Field(default_factory=list)
     command: str = "echo {name}"
+    # run without a shell, each argument rendered on its own, instead of
+    # command. the first argument is the program, so it can not be empty
+    argv: Optional[List[str]] = Field(default=None, min_length=1)
+    # what the step needs from the machine, in cpus and bytes of memory
+    cpus: Optional[int] = None
+    memory: Optional[int] = None
+    # expected run time in seconds, used until the step has run history
+    estimate: Optional[float] = None
+    # [[hours:]minutes:]seconds the step may run for, instead of the
+    # pipeline's walltime
+    walltime: Optional[str] = None
+
+    def all_inputs(self) -> List[str]:
+        return self.inputs
+
+    def command_templates(self) -> List[str]:
+        return self.argv if self.argv is not None else [self.command]
+
+
+class MapStep(Step):
+    # resource keys to run the command over, or a glob of paths, expanded
+    # when the step is ready to run. the command sees each one as `item`
+    # and its position as `index`
+    over: Union[List[str], str]
+    # run once every shard has finished, with their paths in `items`
+    gather: Optional[str] = None
+
+    def all_inputs(self) -> List[str]:
+        if isinstance(self.over, str):
+            return self.inputs
+        return self.inputs + [x for x in self.over if x not in self.inputs]
 
 
 class StepPBS(Step):
@@ -1,15 +1,36 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from functools import lru_cache
 from json import dumps, loads
 from pathlib import Path
+from types import ModuleType
+from typing import Optional, Tuple
+
+import pydantic
 
 from pypes.constants import DEFAULT_CONFIG_PATH
 from pypes.models.pipeline import Pipeline
 
+orjson: Optional[ModuleType]
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# bump when the pickle layout of the sidecar itself changes
+SIDECAR_VERSION = 2
+
 
 class InvalidConfigFileException(Exception):
     pass
 
 
 def deserialise_pipeline(pipeline_text: str) -> Pipeline:
+    # orjson is an optional, much faster parser for big pipelines
+    if orjson is not None:
+        return Pipeline(**orjson.loads(pipeline_text))
     pipeline = Pipeline(**loads(pipeline_text))
     return pipeline
 
@@ -18,8 +39,80 @@ def serialise_pipeline(pipeline: Pipeline) -> str:
     return dumps(pipeline.dict(), indent=2, default=str)
 
 
+def sidecar_path(path: Path) -> Path:
+    return path.with_name(path.name + ".cache")
+
+
+@lru_cache(maxsize=None)
+def sidecar_version() -> Tuple[int, str, str]:
+    # any change to the models changes their schema, so a sidecar pickled
+    # before a field was added is never loaded
+    schema = dumps(Pipeline.model_json_schema(), sort_keys=True)
+    fingerprint = hashlib.sha256(schema.encode()).hexdigest()
+    return SIDECAR_VERSION, pydantic.VERSION, fingerprint
+
+
+def read_sidecar(
+    path: Path, stat: os.stat_result, config_bytes: Optional[bytes] = None
+) -> Optional[Pipeline]:
+    try:
+        with open(sidecar_path(path), "rb") as f:
+            header = pickle.load(f)
+            if header["version"] != sidecar_version():
+                return None
+            # an unchanged stat is trusted like make and git do, otherwise
+            # the content hash decides
+            if config_bytes is None:
+                if (header["mtime_ns"], header["size"]) != (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                ):
+                    return None
+            elif header["sha256"] != hashlib.sha256(config_bytes).hexdigest():
+                return None
+            return pickle.load(f)
+    except Exception:
+        # a missing, truncated or stale sidecar just means parsing the config
+        return None
+
+
+def write_sidecar(
+    path: Path, stat: os.stat_result, config_bytes: bytes, pipeline: Pipeline
+):
+    header = {
+        "version": sidecar_version(),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": hashlib.sha256(config_bytes).hexdigest(),
+    }
+    target = sidecar_path(path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=target.name)
+    except OSError:
+        # the sidecar only saves time, a read only directory is fine
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(pipeline, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, target)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
 def read_pipeline(path: Path = Path(DEFAULT_CONFIG_PATH)) -> Pipeline:
-    return deserialise_pipeline(path.read_text())
+    stat = path.stat()
+    pipeline = read_sidecar(path, stat)
+    if pipeline is not None:
+        return pipeline
+    config_bytes = path.read_bytes()
+    # the config may only have been touched or copied, check the content
+    pipeline = read_sidecar(path, stat, config_bytes)
+    if pipeline is None:
+        pipeline = deserialise_pipeline(config_bytes.decode())
+    write_sidecar(path, stat, config_bytes, pipeline)
+    return pipeline
 
 
 def write_pipeline(pipeline: Pipeline, path: Path = Path("./.pipeline.conf")):
@@ -0,0 +1,41 @@
+import re
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+class InvalidSizeException(Exception):
+    pass
+
+
+class InvalidDurationException(Exception):
+    pass
+
+
+def parse_size(text: str) -> int:
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$", text.lower())
+    if not match:
+        raise InvalidSizeException("{} is not a valid size!".format(text))
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def format_size(size: int) -> str:
+    for unit in ["", "K", "M", "G"]:
+        if size < 1024:
+            return "{:.1f}{}".format(size, unit) if unit else "{}B".format(size)
+        size = size / 1024  # type: ignore
+    return "{:.1f}T".format(size)
+
+
+def parse_duration(text: str) -> float:
+    # pbs style [[hours:]minutes:]seconds
+    try:
+        parts = [float(x) for x in text.strip().split(":")]
+    except ValueError:
+        parts = []
+    if not 1 <= len(parts) <= 3 or any(x < 0 for x in parts):
+        raise InvalidDurationException("{} is not a valid duration!".format(text))
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
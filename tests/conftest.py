@@ -2,6 +2,8 @@ import sys
 
 src_dir = "./src"
 sys.path.append(src_dir)
+# the benchmarks package, from the repository root
+sys.path.append(".")
 
 import pytest
 
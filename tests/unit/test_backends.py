@@ -0,0 +1,232 @@
+import itertools
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+from pypes.constants import default_pbs_context
+from pypes.exceptions import SubmissionException
+from pypes.exec.backends import SchedulerBackend
+from pypes.exec.backends.fake import fake_pbs_command
+from pypes.exec.backends.pbs import (
+    PBSBackend,
+    build_depends_args,
+    job_script_name,
+    parse_qstat_json,
+)
+from pypes.exec.pipeline import run_pbs_pipeline
+from pypes.exec.track import JobTracker
+from pypes.models.pipeline import Pipeline
+from pypes.models.step import MapStep, Step
+
+
+@pytest.fixture
+def fake_pbs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> PBSBackend:
+    monkeypatch.setenv("PYPES_FAKE_PBS_DIR", str(tmp_path / "fake_pbs"))
+    return PBSBackend(
+        jobs_dir=tmp_path / "jobs",
+        qsub_command=fake_pbs_command("qsub"),
+        qstat_command=fake_pbs_command("qstat"),
+    )
+
+
+def _record(tmp_path: Path, job_id: str) -> dict:
+    number = job_id.split(".")[0].split("[")[0]
+    return json.loads((tmp_path / "fake_pbs" / "{}.json".format(number)).read_text())
+
+
+def _namespace() -> dict:
+    return dict(default_pbs_context, conda_env="")
+
+
+def test_build_depends_args():
+    assert build_depends_args([]) == []
+    assert build_depends_args(["1.a", "2.a"]) == ["-W", "depend=afterok:1.a:2.a"]
+
+
+def test_pbs_backend_submit(tmp_path: Path, fake_pbs: PBSBackend):
+    out = tmp_path / "out"
+    job_id = fake_pbs.submit("step 1", "echo hi > {}".format(out), _namespace(), [])
+    assert job_id == "1.fake"
+    assert _record(tmp_path, job_id)["Exit_status"] == 0
+    assert out.read_text() == "hi\n"
+    assert (tmp_path / "jobs" / job_script_name("step 1")).exists()
+
+
+def test_pbs_backend_similar_names(tmp_path: Path, fake_pbs: PBSBackend):
+    # both names slugify to align_sample and are submitted at the same time
+    steps = [
+        Step(name=name, command="echo {} > {}".format(i, tmp_path / str(i)))
+        for i, name in enumerate(["align sample", "align-sample"])
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_context(_namespace())
+    run_pbs_pipeline(pipeline, backend=fake_pbs, submit_jobs=2)
+    assert (tmp_path / "0").read_text() == "0\n"
+    assert (tmp_path / "1").read_text() == "1\n"
+    assert len(list((tmp_path / "jobs").glob("align_sample_*.header.pbs"))) == 2
+
+
+def test_pbs_backend_depends(tmp_path: Path, fake_pbs: PBSBackend):
+    failed = fake_pbs.submit("step 1", "false", _namespace(), [])
+    job_id = fake_pbs.submit("step 2", "true", _namespace(), [failed])
+    assert _record(tmp_path, job_id)["Exit_status"] != 0
+
+
+def test_pbs_backend_submit_array(tmp_path: Path, fake_pbs: PBSBackend):
+    commands = ["echo {} >> {}".format(i, tmp_path / "out") for i in range(3)]
+    job_id = fake_pbs.submit_array("step 1", commands, _namespace(), [])
+    assert job_id == "1[].fake"
+    assert (tmp_path / "out").read_text().split() == ["0", "1", "2"]
+
+
+def test_pbs_backend_submit_failure(tmp_path: Path):
+    backend = PBSBackend(jobs_dir=tmp_path, qsub_command=["false"])
+    with pytest.raises(SubmissionException):
+        backend.submit("step 1", "true", _namespace(), [])
+
+
+def test_run_pbs_pipeline(
+    tmp_path: Path,
+    fake_pbs: PBSBackend,
+    create_split_merge_pipeline,
+):
+    pipeline: Pipeline = create_split_merge_pipeline()
+    pipeline.add_context(_namespace())
+    run = run_pbs_pipeline(pipeline, backend=fake_pbs, submit_jobs=2)
+    assert run.outcome == "submitted"
+    assert pipeline.resources["d"].read_text().strip() == "abcabc"
+    assert sorted(x.job_id or "" for x in run.step_runs) == [
+        "1.fake",
+        "2.fake",
+        "3.fake",
+    ]
+    assert all(x.outcome == "submitted" for x in run.step_runs)
+
+
+def test_pbs_backend_status(fake_pbs: PBSBackend):
+    finished = fake_pbs.submit("step 1", "true", _namespace(), [])
+    failed = fake_pbs.submit("step 2", "exit 3", _namespace(), [])
+    statuses = fake_pbs.status([finished, failed, "99.fake"])
+    assert sorted(statuses) == [finished, failed]
+    assert statuses[finished].finished and statuses[finished].exit_status == 0
+    assert statuses[failed].exit_status == 3
+    assert statuses[failed].finished_at is not None
+
+
+def test_parse_qstat_json():
+    statuses = parse_qstat_json(
+        json.dumps(
+            {
+                "Jobs": {
+                    "1.server": {"job_state": "Q"},
+                    "2.server": {
+                        "job_state": "F",
+                        "Exit_status": 0,
+                        "stime": "Tue Mar 22 12:00:00 2022",
+                        "mtime": "Tue Mar 22 12:05:00 2022",
+                    },
+                }
+            }
+        )
+    )
+    assert statuses["1.server"].state == "Q"
+    assert not statuses["1.server"].finished
+    job = statuses["2.server"]
+    assert job.started_at and job.finished_at
+    assert (job.finished_at - job.started_at).total_seconds() == 300
+
+
+def test_track_pbs_pipeline(fake_pbs: PBSBackend):
+    steps = [
+        Step(name="step 1", outputs=["a"], command="true"),
+        Step(name="step 2", inputs=["a"], command="exit 4"),
+        Step(name="step 3", command="true"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"a": Path("a")})
+    pipeline.add_context(_namespace())
+    run = run_pbs_pipeline(pipeline, backend=fake_pbs)
+    run = JobTracker(fake_pbs, sleep=lambda x: None).wait(run)
+    assert run.outcome == "error"
+    returncodes = {x.step_name: x.returncode for x in run.step_runs}
+    assert returncodes == {"step 1": 0, "step 2": 4, "step 3": 0}
+    assert all(x.finished_at for x in run.step_runs)
+
+
+class RecordingBackend(SchedulerBackend):
+    def __init__(self):
+        self.submitted: Dict[str, Tuple[str, List[str]]] = {}
+        # steps are submitted from a thread pool
+        self._ids = itertools.count(1)
+
+    def submit(self, name, command, namespace, depends) -> str:
+        job_id = "{}.test".format(next(self._ids))
+        self.submitted[job_id] = (name, list(depends))
+        return job_id
+
+    def submit_array(self, name, commands, namespace, depends) -> str:
+        job_id = "{}[].test".format(next(self._ids))
+        self.submitted[job_id] = (name, list(depends))
+        return job_id
+
+    def status(self, job_ids):
+        return {}
+
+    def depends_of(self, name: str) -> List[str]:
+        names = {job_id: x for job_id, (x, _) in self.submitted.items()}
+        for job_name, depends in self.submitted.values():
+            if job_name == name:
+                return sorted(names[x] for x in depends)
+        raise KeyError(name)
+
+
+def _recorded_pipeline(steps: List[Step]) -> Pipeline:
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_context(_namespace())
+    return pipeline
+
+
+def test_run_pbs_pipeline_direct_depends():
+    steps = [
+        Step(name="a", outputs=["x"]),
+        Step(name="b", inputs=["x"], outputs=["y"]),
+        Step(name="c", inputs=["x", "y"]),
+    ]
+    backend = RecordingBackend()
+    run_pbs_pipeline(_recorded_pipeline(steps), backend=backend)
+    assert backend.depends_of("b") == ["a"]
+    assert backend.depends_of("c") == ["a", "b"]
+
+    backend = RecordingBackend()
+    run_pbs_pipeline(_recorded_pipeline(steps), backend=backend, reduce_depends=True)
+    assert backend.depends_of("c") == ["b"]
+
+
+def test_run_pbs_pipeline_barrier_jobs():
+    steps = [Step(name=str(i), outputs=[str(i)]) for i in range(5)]
+    steps.append(Step(name="gather", inputs=[str(i) for i in range(5)]))
+    backend = RecordingBackend()
+    run_pbs_pipeline(_recorded_pipeline(steps), backend=backend, max_depends=2)
+    assert backend.depends_of("gather") == [
+        "gather barrier 2.0",
+        "gather barrier 2.1",
+    ]
+    assert backend.depends_of("gather barrier 2.1") == ["gather barrier 1.2"]
+    assert backend.depends_of("gather barrier 1.0") == ["0", "1"]
+    assert all(len(x) <= 2 for _, x in backend.submitted.values())
+
+
+def test_run_pbs_pipeline_map_depends():
+    steps = [
+        MapStep(name="count", over=["a", "b"], outputs=["x"], gather="true"),
+        Step(name="report", inputs=["x"]),
+    ]
+    pipeline = _recorded_pipeline(steps)
+    pipeline.add_resources({"a": Path("a"), "b": Path("b"), "x": Path("x")})
+    backend = RecordingBackend()
+    run = run_pbs_pipeline(pipeline, backend=backend, submit_jobs=4)
+    assert [x.job_id for x in run.step_runs] == ["1[].test", "2.test", "3.test"]
+    assert backend.depends_of("count gather") == ["count"]
+    assert backend.depends_of("report") == ["count gather"]
@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from benchmarks.generators import SHAPES, generate_pipeline, random_inputs
+from benchmarks.suite import compare, main, time_pipeline
+from pypes.exec.depend import get_execution_order, pipeline_to_dag
+
+
+@pytest.mark.parametrize("shape", list(SHAPES))
+@pytest.mark.parametrize("size", [1, 2, 3, 10, 101])
+def test_generated_pipelines(shape: str, size: int):
+    pipeline = generate_pipeline(shape, size)
+    dag = pipeline_to_dag(pipeline)
+    assert len(pipeline.steps) == size
+    assert len(dag.nodes) == size
+    assert len(get_execution_order(dag)) == size
+
+
+def test_generated_shapes():
+    wide = pipeline_to_dag(generate_pipeline("wide", 10))
+    assert len(wide.pred["step 9"]) == 8
+    assert len(wide.succ["step 0"]) == 8
+    deep = pipeline_to_dag(generate_pipeline("deep", 10))
+    assert get_execution_order(deep) == ["step {}".format(i) for i in range(10)]
+    diamond = pipeline_to_dag(generate_pipeline("diamond", 7))
+    assert sorted(diamond.pred["step 3"]) == ["step 1", "step 2"]
+    assert sorted(diamond.succ["step 3"]) == ["step 4", "step 5"]
+    assert random_inputs(50, seed=1) == random_inputs(50, seed=1)
+    assert random_inputs(50, seed=1) != random_inputs(50, seed=2)
+
+
+def test_time_pipeline(tmp_path: Path):
+    results = time_pipeline("diamond", 10, 1, tmp_path)
+    assert set(results) == {
+        "diamond/10/pipeline_to_dag",
+        "diamond/10/get_execution_order",
+        "diamond/10/serialise_pipeline",
+        "diamond/10/deserialise_pipeline",
+        "diamond/10/get_step",
+        "diamond/10/run_pipeline",
+    }
+    assert "deep/10/run_pipeline" not in time_pipeline(
+        "deep", 10, 1, tmp_path, max_run_size=5
+    )
+
+
+def test_compare():
+    baseline = {"a": 1.0, "b": 0.001, "c": 1.0}
+    results = {"a": 1.6, "b": 0.003, "c": 1.2, "d": 10.0}
+    # b is three times slower, but by less than the noise floor
+    assert compare(results, baseline) == ["a took 1.6000s, baseline 1.0000s"]
+    assert compare(results, baseline, scale=2.0) == []
+    assert compare(results, baseline, tolerance=0.1) == [
+        "a took 1.6000s, baseline 1.0000s",
+        "c took 1.2000s, baseline 1.0000s",
+    ]
+
+
+def test_suite_fails_on_regression(tmp_path: Path):
+    baseline_path = tmp_path / "baseline.json"
+    args = ["--shapes", "deep", "--sizes", "2000", "--repeat", "1"]
+    args += ["--max-run-size", "0", "--baseline", str(baseline_path)]
+    assert main(args) == 1
+    assert main(args + ["--update"]) == 0
+    baseline = json.loads(baseline_path.read_text())
+    assert "deep/2000/pipeline_to_dag" in baseline["results"]
+    # a baseline far faster than anything possible
+    baseline["results"] = {k: v / 100 for k, v in baseline["results"].items()}
+    baseline_path.write_text(json.dumps(baseline))
+    assert main(args) == 1
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from pypes.exec.cache import StepCache
+from pypes.exec.pipeline import run_pipeline
+from pypes.models.pipeline import Pipeline
+from pypes.models.step import Step
+
+
+def _counting_pipeline(tmp_path: Path) -> Pipeline:
+    # the command appends to a counter file each time it actually runs
+    resources = {"a": tmp_path / "a", "b": tmp_path / "b"}
+    resources["a"].write_text("abc")
+    counter = tmp_path / "counter"
+    step = Step(
+        name="step 1",
+        inputs=["a"],
+        outputs=["b"],
+        command="echo x >> {} && cp {{{{ a }}}} {{{{ b }}}}".format(counter),
+    )
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=[step])
+    pipeline.add_resources(resources)
+    return pipeline
+
+
+def _runs(tmp_path: Path) -> int:
+    return len((tmp_path / "counter").read_text().split())
+
+
+def test_cache_restores_outputs(tmp_path: Path):
+    cache = StepCache(tmp_path / "cache")
+    pipeline = _counting_pipeline(tmp_path)
+    first = run_pipeline(pipeline, cache=cache)
+    assert first.step_runs[0].outcome == "finished"
+
+    pipeline.resources["b"].unlink()
+    second = run_pipeline(pipeline, cache=cache)
+    assert second.step_runs[0].outcome == "cached"
+    assert pipeline.resources["b"].read_text() == "abc"
+    assert _runs(tmp_path) == 1
+
+
+def test_cache_miss_on_changed_input(tmp_path: Path):
+    cache = StepCache(tmp_path / "cache")
+    pipeline = _counting_pipeline(tmp_path)
+    run_pipeline(pipeline, cache=cache)
+    pipeline.resources["a"].write_text("def")
+    run = run_pipeline(pipeline, cache=cache)
+    assert run.step_runs[0].outcome == "finished"
+    assert pipeline.resources["b"].read_text() == "def"
+    assert _runs(tmp_path) == 2
+
+
+def test_cache_restore_modes(tmp_path: Path):
+    for mode in ["hardlink", "copy"]:
+        cache = StepCache(tmp_path / "cache", restore_mode=mode)
+        pipeline = _counting_pipeline(tmp_path)
+        run_pipeline(pipeline, cache=cache)
+        pipeline.resources["b"].unlink()
+        run = run_pipeline(pipeline, cache=cache)
+        assert run.step_runs[0].outcome == "cached"
+        assert pipeline.resources["b"].read_text() == "abc"
+
+
+def test_cache_hardlink_not_written_through(tmp_path: Path):
+    cache = StepCache(tmp_path / "cache", restore_mode="hardlink")
+    pipeline = _counting_pipeline(tmp_path)
+    pipeline.steps[0].command = "cat {{ a }} > {{ b }}"
+    run_pipeline(pipeline, cache=cache)
+    pipeline.resources["b"].unlink()
+    assert run_pipeline(pipeline, cache=cache).step_runs[0].outcome == "cached"
+
+    # rerunning writes the output in place, not into the restored object
+    pipeline.resources["a"].write_text("XYZ")
+    assert run_pipeline(pipeline, cache=cache).step_runs[0].outcome == "finished"
+    assert pipeline.resources["b"].read_text() == "XYZ"
+    pipeline.resources["a"].write_text("abc")
+    assert run_pipeline(pipeline, cache=cache).step_runs[0].outcome == "cached"
+    assert pipeline.resources["b"].read_text() == "abc"
+
+
+def test_cache_stats_and_prune(tmp_path: Path):
+    cache = StepCache(tmp_path / "cache")
+    pipeline = _counting_pipeline(tmp_path)
+    run_pipeline(pipeline, cache=cache)
+    stats = cache.stats()
+    assert stats.entries == 1 and stats.objects == 1 and stats.size == 3
+
+    stats = cache.prune(max_size=0)
+    assert stats.entries == 0 and stats.objects == 0 and stats.size == 0
+
+
+def test_cache_skips_steps_without_outputs(tmp_path: Path):
+    cache = StepCache(tmp_path / "cache")
+    step = Step(name="step 1", command="echo hello")
+    assert cache.step_key(step, {}, {}) is None
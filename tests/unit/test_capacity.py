@@ -0,0 +1,101 @@
+from pathlib import Path
+from typing import List
+
+from pypes.exec.capacity import Capacity, CapacityPool, detect_capacity
+from pypes.exec.pipeline import run_pipeline, step_pbs_namespace
+from pypes.models.pipeline import Pipeline
+from pypes.models.step import Step
+
+
+def create_logged_step(name: str, log: Path, **requirements) -> Step:
+    return Step(
+        name=name,
+        command="echo '+{0}' >> {1}; sleep 0.2; echo '-{0}' >> {1}".format(name, log),
+        **requirements,
+    )
+
+
+def overlaps(log: Path) -> List[List[str]]:
+    # the set of running steps after each step starts
+    running: List[str] = []
+    seen = []
+    for line in log.read_text().splitlines():
+        if line.startswith("+"):
+            running.append(line[1:])
+            seen.append(sorted(running))
+        else:
+            running.remove(line[1:])
+    return seen
+
+
+def test_detect_capacity():
+    capacity = detect_capacity()
+    assert capacity.cpus >= 1
+    assert detect_capacity(cpus=3, memory=1024) == Capacity(cpus=3, memory=1024)
+
+
+def test_capacity_pool_requirements():
+    pool = CapacityPool(Capacity(cpus=4, memory=1000))
+    assert pool.requirement(Step(name="a")) == (1, 0)
+    # bigger than the machine is clamped so the step can still run alone
+    assert pool.requirement(Step(name="a", cpus=8, memory=5000)) == (4, 1000)
+    pool.acquire((3, 500))
+    assert pool.fits((1, 500))
+    assert not pool.fits((2, 0))
+    assert not pool.fits((1, 0), reserved=(1, 0))
+    pool.release((3, 500))
+    assert pool.free_cpus == 4
+    assert pool.requirement(Step(name="a", memory=5000)) == (1, 1000)
+    assert CapacityPool(Capacity(cpus=1)).requirement(Step(name="a", memory=5)) == (
+        1,
+        0,
+    )
+
+
+def test_run_pipeline_packs_by_cpus(tmp_path: Path):
+    log = tmp_path / "log"
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[create_logged_step(str(i), log, cpus=1) for i in range(4)],
+    )
+    run = run_pipeline(pipeline, jobs=10, capacity=Capacity(cpus=2))
+    assert run.outcome == "finished"
+    assert max(len(x) for x in overlaps(log)) == 2
+
+
+def test_run_pipeline_packs_by_memory(tmp_path: Path):
+    log = tmp_path / "log"
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[create_logged_step(str(i), log, memory=600) for i in range(3)],
+    )
+    run = run_pipeline(pipeline, jobs=10, capacity=Capacity(cpus=8, memory=1000))
+    assert run.outcome == "finished"
+    assert max(len(x) for x in overlaps(log)) == 1
+
+
+def test_run_pipeline_heavy_step_is_not_starved(tmp_path: Path):
+    log = tmp_path / "log"
+    steps = [create_logged_step("light0", log, cpus=1)]
+    steps.append(create_logged_step("heavy", log, cpus=2))
+    steps.extend(create_logged_step("light{}".format(i), log) for i in range(1, 4))
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    run = run_pipeline(pipeline, jobs=10, capacity=Capacity(cpus=2))
+    assert run.outcome == "finished"
+    seen = overlaps(log)
+    assert ["heavy"] in seen
+    # the heavy step holds its cpus, lights queued behind it wait for it
+    assert [x for x in seen if x[0] == "heavy"] == [["heavy"]]
+    assert seen.index(["heavy"]) == 1
+
+
+def test_step_pbs_namespace():
+    namespace = {"ncpus": "4", "walltime": "01:00:00"}
+    assert step_pbs_namespace(namespace, Step(name="a")) is namespace
+    assert step_pbs_namespace(namespace, Step(name="a", cpus=2, memory=1500)) == {
+        "ncpus": "2",
+        "walltime": "01:00:00",
+        "mem": "2kb",
+    }
@@ -0,0 +1,166 @@
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from typer.testing import CliRunner
+
+from pypes.entrypoints import app
+from pypes.models.pipeline import Pipeline
+from pypes.persist import write_pipeline
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def pipeline_dir(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    create_split_merge_pipeline: Callable[..., Pipeline],
+) -> Path:
+    monkeypatch.chdir(tmp_path)
+    write_pipeline(create_split_merge_pipeline())
+    return tmp_path
+
+
+def test_cli_run_local(pipeline_dir: Path):
+    result = runner.invoke(app, ["run", "--local", "--jobs", "2"])
+    assert result.exit_code == 0
+    run = json.loads(result.stdout)
+    assert run["outcome"] == "finished"
+    assert len(run["step_runs"]) == 3
+
+
+def test_cli_cache_stats_and_prune(pipeline_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("PYPES_CACHE_DIR", str(pipeline_dir / "cache"))
+    result = runner.invoke(app, ["run", "--local", "--cache"])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["cache", "stats"])
+    assert result.exit_code == 0
+    assert "entries:    3" in result.stdout
+    result = runner.invoke(app, ["cache", "prune", "--max-size", "0"])
+    assert result.exit_code == 0
+    assert "entries:    0" in result.stdout
+
+
+def test_cli_run_target(pipeline_dir: Path):
+    runner.invoke(app, ["run", "--local"])
+    result = runner.invoke(app, ["run", "--local", "--target", "b"])
+    assert result.exit_code == 0
+    run = json.loads(result.stdout)
+    assert [(x["step_name"], x["outcome"]) for x in run["step_runs"]] == [
+        ("step 1", "skipped")
+    ]
+
+
+def test_cli_run_unknown_step(pipeline_dir: Path):
+    result = runner.invoke(app, ["run", "--local", "--only", "nope"])
+    assert result.exit_code == 2
+    assert "nope is not a step!" in result.output
+
+
+def test_cli_run_resume(pipeline_dir: Path):
+    result = runner.invoke(app, ["run", "--local"])
+    run = json.loads(result.stdout)
+    result = runner.invoke(app, ["run", "--local", "--resume", run["id"]])
+    assert result.exit_code == 0
+    resumed = json.loads(result.stdout)
+    assert resumed["id"] == run["id"]
+    assert [x["id"] for x in resumed["step_runs"]] == [
+        x["id"] for x in run["step_runs"]
+    ]
+
+
+def test_cli_run_resume_unknown_run(pipeline_dir: Path):
+    result = runner.invoke(app, ["run", "--local", "--resume", "nope"])
+    assert result.exit_code != 0
+
+
+def test_cli_history(pipeline_dir: Path):
+    runner.invoke(app, ["run", "--local"])
+    runner.invoke(app, ["run", "--local"])
+    result = runner.invoke(app, ["history"])
+    assert result.exit_code == 0
+    assert len(result.stdout.splitlines()) == 2
+    result = runner.invoke(app, ["history", "--stats"])
+    assert result.exit_code == 0
+    assert [x.split("\t")[:2] for x in result.stdout.splitlines()] == [
+        ["step 1", "2 runs"],
+        ["step 2", "2 runs"],
+        ["step 3", "2 runs"],
+    ]
+    result = runner.invoke(app, ["history", "--step", "step 1", "-n", "1"])
+    assert len(result.stdout.splitlines()) == 1
+
+
+def test_cli_run_ndjson_events(pipeline_dir: Path):
+    result = runner.invoke(app, ["run", "--local", "--events", "ndjson"])
+    assert result.exit_code == 0
+    events = [json.loads(x) for x in result.stdout.splitlines()]
+    assert [x["event"] for x in events[:1] + events[-1:]] == [
+        "pipeline_started",
+        "pipeline_finished",
+    ]
+    assert [x["event"] for x in events].count("step_started") == 3
+    assert [x["event"] for x in events].count("step_finished") == 3
+    assert events[-1]["outcome"] == "finished"
+    assert events[-1]["step_outcomes"] == {"finished": 3}
+
+
+def test_cli_run_ndjson_events_file(pipeline_dir: Path):
+    events_file = pipeline_dir / "events.ndjson"
+    result = runner.invoke(
+        app,
+        ["run", "--local", "--events", "ndjson", "--events-file", str(events_file)],
+    )
+    assert result.exit_code == 0
+    assert result.stdout == ""
+    assert len(events_file.read_text().splitlines()) == 8
+    # without ndjson events the file would silently stay empty
+    result = runner.invoke(app, ["run", "--local", "--events-file", str(events_file)])
+    assert result.exit_code != 0
+    assert "--events-file only applies" in result.output
+
+
+def test_cli_run_unusable_history(pipeline_dir: Path):
+    # a directory can not be opened as a database, the run still happens
+    history_db = pipeline_dir / "history"
+    history_db.mkdir()
+    result = runner.invoke(app, ["run", "--local", "--history-db", str(history_db)])
+    assert result.exit_code == 0
+    assert "warning: could not use the run history" in result.output
+    assert '"outcome": "finished"' in result.output
+
+
+def test_cli_plan(pipeline_dir: Path):
+    result = runner.invoke(app, ["plan", "--jobs", "2"])
+    assert result.exit_code == 0
+    assert "estimated makespan: 2.0s with 2 job(s)" in result.stdout
+    assert "critical path: 2.0s" in result.stdout
+
+
+def test_cli_history_usage(pipeline_dir: Path):
+    runner.invoke(app, ["run", "--local"])
+    result = runner.invoke(app, ["history", "--usage", "--top", "2"])
+    assert result.exit_code == 0
+    lines = result.stdout.splitlines()
+    assert "max_rss:" in lines
+    assert len(lines) == 6 * 3
+
+
+def test_cli_run_builds_dag_once(pipeline_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    from pypes.exec import depend, plan
+    from pypes.exec import pipeline as exec_pipeline
+
+    calls = []
+    original = depend.pipeline_to_dag
+
+    def counting(pipeline: Pipeline):
+        calls.append(pipeline.name)
+        return original(pipeline)
+
+    for module in [depend, exec_pipeline, plan]:
+        monkeypatch.setattr(module, "pipeline_to_dag", counting)
+    result = runner.invoke(app, ["run", "--local", "--only", "step 1"])
+    assert result.exit_code == 0
+    assert len(calls) == 1
@@ -1,8 +1,15 @@
 from typing import Callable
 
-from pypes.exceptions import InvalidDAGException
-from pypes.exec.depend import get_execution_order, pipeline_to_dag
+import pytest
+
+from pypes.exceptions import (
+    DuplicateProducerException,
+    InvalidDAGException,
+    NoMatchingStepException,
+)
+from pypes.exec.depend import get_execution_order, pipeline_to_dag, select_steps
 from pypes.models.pipeline import Pipeline
+from pypes.models.step import Step
 
 
 def test_create_dag(
@@ -35,3 +42,91 @@ def test_dag_exec_order_succeed(
         < exec_order.index("step 2")
         < exec_order.index("step 3")
     )
+
+
+def test_create_dag_duplicate_producer():
+    steps = [
+        Step(name="step 1", outputs=["a"]),
+        Step(name="step 2", outputs=["a"]),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    try:
+        pipeline_to_dag(pipeline)
+        assert False
+    except DuplicateProducerException as e:
+        assert "step 1" in str(e) and "step 2" in str(e)
+
+
+def test_create_dag_edges_per_resource():
+    steps = [
+        Step(name="split", inputs=["raw"], outputs=["left", "right"]),
+        Step(name="merge", inputs=["left", "right"], outputs=["merged"]),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    dag = pipeline_to_dag(pipeline)
+    assert sorted(dag["split"]["merge"]) == ["left", "right"]
+
+
+def test_create_dag_wide_pipeline():
+    width = 5000
+    steps = [Step(name="source", outputs=["raw"])]
+    steps += [
+        Step(name="sample {}".format(i), inputs=["raw"], outputs=["out {}".format(i)])
+        for i in range(width)
+    ]
+    steps.append(Step(name="gather", inputs=["out {}".format(i) for i in range(width)]))
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    dag = pipeline_to_dag(pipeline)
+    assert dag.number_of_nodes() == width + 2
+    assert dag.number_of_edges() == width * 2
+
+
+def _diamond_pipeline() -> Pipeline:
+    steps = [
+        Step(name="split", outputs=["left", "right"]),
+        Step(name="left step", inputs=["left"], outputs=["left out"]),
+        Step(name="right step", inputs=["right"], outputs=["right out"]),
+        Step(name="merge", inputs=["left out", "right out"], outputs=["merged"]),
+        Step(name="report", inputs=["merged"]),
+    ]
+    return Pipeline(name="test pipeline", owner="test", steps=steps)
+
+
+def test_select_steps_nothing_selected():
+    pipeline = _diamond_pipeline()
+    assert select_steps(pipeline, pipeline_to_dag(pipeline)) is None
+
+
+def test_select_steps_target():
+    pipeline = _diamond_pipeline()
+    dag = pipeline_to_dag(pipeline)
+    assert select_steps(pipeline, dag, targets=["left out"]) == {
+        "split",
+        "left step",
+    }
+    assert select_steps(pipeline, dag, targets=["merge"]) == {
+        "split",
+        "left step",
+        "right step",
+        "merge",
+    }
+
+
+def test_select_steps_from_and_only():
+    pipeline = _diamond_pipeline()
+    dag = pipeline_to_dag(pipeline)
+    assert select_steps(pipeline, dag, from_steps=["left step"]) == {
+        "left step",
+        "merge",
+        "report",
+    }
+    assert select_steps(
+        pipeline, dag, targets=["merged"], from_steps=["left step"]
+    ) == {"left step", "merge"}
+    assert select_steps(pipeline, dag, only=["report"]) == {"report"}
+
+
+def test_select_steps_unknown():
+    pipeline = _diamond_pipeline()
+    with pytest.raises(NoMatchingStepException):
+        select_steps(pipeline, pipeline_to_dag(pipeline), targets=["nope"])
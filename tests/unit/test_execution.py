@@ -1,6 +1,9 @@
+import os
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Dict
 
+from pypes.exec.depend import pipeline_to_dag
+from pypes.exec.fresh import stale_steps
 from pypes.exec.pipeline import run_pipeline
 from pypes.models.pipeline import Pipeline
 from pypes.models.step import Step
@@ -27,3 +30,132 @@ def test_run_pipeline_merge_succeed(
     pipeline = create_split_merge_pipeline()
     run = run_pipeline(pipeline)
     assert pipeline.resources["d"].read_text().strip() == "abcabc"
+
+
+def _wait_for_file_command(touch: str, wait_for: str) -> str:
+    return (
+        "touch {} && for i in $(seq 50); do "
+        "[ -f {} ] && exit 0; sleep 0.1; done; exit 1"
+    ).format(touch, wait_for)
+
+
+def test_run_pipeline_parallel(tmp_path: Path):
+    # each step only succeeds if the other one is running at the same time
+    a, b = tmp_path / "a", tmp_path / "b"
+    steps = [
+        Step(name="step a", command=_wait_for_file_command(str(a), str(b))),
+        Step(name="step b", command=_wait_for_file_command(str(b), str(a))),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    run = run_pipeline(pipeline, jobs=2)
+    assert run.outcome == "finished"
+    assert len(run.step_runs) == 2
+
+
+def test_run_pipeline_parallel_respects_dependencies(
+    create_split_merge_pipeline: Callable[..., Pipeline],
+):
+    pipeline = create_split_merge_pipeline()
+    run = run_pipeline(pipeline, jobs=4)
+    assert run.outcome == "finished"
+    assert run.step_runs[-1].step_name == "step 3"
+    assert pipeline.resources["d"].read_text().strip() == "abcabc"
+
+
+def _failing_branch_pipeline() -> Pipeline:
+    steps = [
+        Step(name="fails", outputs=["x"], command="false"),
+        Step(name="after failure", inputs=["x"], command="echo unreachable"),
+        Step(name="independent", command="echo independent"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"x": Path("x")})
+    return pipeline
+
+
+def test_run_pipeline_fail_fast():
+    run = run_pipeline(_failing_branch_pipeline(), jobs=1)
+    assert run.outcome == "error"
+    assert [x.step_name for x in run.step_runs] == ["fails"]
+
+
+def test_run_pipeline_keep_going():
+    run = run_pipeline(_failing_branch_pipeline(), jobs=1, keep_going=True)
+    assert run.outcome == "error"
+    assert sorted(x.step_name for x in run.step_runs) == ["fails", "independent"]
+
+
+def _chain_pipeline(tmp_path: Path) -> Pipeline:
+    resources = {x: tmp_path / x for x in ("a", "b", "c")}
+    resources["a"].write_text("abc")
+    steps = [
+        Step(name="step 1", inputs=["a"], outputs=["b"], command="cp {{a}} {{b}}"),
+        Step(name="step 2", inputs=["b"], outputs=["c"], command="cp {{b}} {{c}}"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources(resources)
+    return pipeline
+
+
+def _outcomes(run) -> Dict[str, str]:
+    return {x.step_name: x.outcome for x in run.step_runs}
+
+
+def test_run_pipeline_incremental_skips_fresh_steps(tmp_path: Path):
+    pipeline = _chain_pipeline(tmp_path)
+    first = run_pipeline(pipeline, incremental=True)
+    assert _outcomes(first) == {"step 1": "finished", "step 2": "finished"}
+    second = run_pipeline(pipeline, incremental=True)
+    assert second.outcome == "finished"
+    assert _outcomes(second) == {"step 1": "skipped", "step 2": "skipped"}
+
+
+def test_run_pipeline_incremental_invalidates_descendants(tmp_path: Path):
+    pipeline = _chain_pipeline(tmp_path)
+    run_pipeline(pipeline)
+    # step 1 is stale, step 2 looks fresh but must rerun after step 1 does
+    a, b, c = (pipeline.resources[x] for x in ("a", "b", "c"))
+    os.utime(b, ns=(1_000_000_000, 1_000_000_000))
+    os.utime(c, ns=(3_000_000_000, 3_000_000_000))
+    os.utime(a, ns=(2_000_000_000, 2_000_000_000))
+    run = run_pipeline(pipeline, incremental=True)
+    assert _outcomes(run) == {"step 1": "finished", "step 2": "finished"}
+
+
+def test_run_pipeline_incremental_empty_output_is_stale(tmp_path: Path):
+    pipeline = _chain_pipeline(tmp_path)
+    pipeline.steps[1].command = "cat {{b}} > {{ c }}"
+    run_pipeline(pipeline)
+    pipeline.resources["c"].write_text("")
+    run = run_pipeline(pipeline, incremental=True)
+    assert _outcomes(run) == {"step 1": "skipped", "step 2": "finished"}
+
+
+def test_run_pipeline_incremental_empty_output_kept(tmp_path: Path):
+    # an output the command writes itself can be empty on purpose
+    pipeline = _chain_pipeline(tmp_path)
+    pipeline.resources["a"].write_text("")
+    run_pipeline(pipeline)
+    run = run_pipeline(pipeline, incremental=True)
+    assert _outcomes(run) == {"step 1": "skipped", "step 2": "skipped"}
+
+
+def test_stale_steps(tmp_path: Path):
+    pipeline = _chain_pipeline(tmp_path)
+    dag = pipeline_to_dag(pipeline)
+    names = {"step 1", "step 2"}
+    assert stale_steps(pipeline, dag, names) == names
+    run_pipeline(pipeline)
+    assert stale_steps(pipeline, dag, names) == set()
+    # step 2 is fresh, but reruns after step 1 does
+    os.utime(pipeline.resources["b"], ns=(1_000_000_000, 1_000_000_000))
+    assert stale_steps(pipeline, dag, names) == names
+    assert stale_steps(pipeline, dag, {"step 2"}) == set()
+
+
+def test_run_pipeline_selected_steps(
+    create_split_merge_pipeline: Callable[..., Pipeline],
+):
+    pipeline = create_split_merge_pipeline()
+    run = run_pipeline(pipeline, steps={"step 1", "step 3"})
+    assert [x.step_name for x in run.step_runs] == ["step 1", "step 3"]
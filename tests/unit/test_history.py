@@ -0,0 +1,145 @@
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pypes.history import HistoryStore, percentile, rank_steps
+from pypes.models.pipeline import Pipeline
+from pypes.models.run import PipelineRun, StepRun
+
+
+def create_pipeline_run(name: str, ran_at: datetime, durations) -> PipelineRun:
+    return PipelineRun(
+        pipeline=Pipeline(name=name, owner="test"),
+        ran_at=ran_at,
+        outcome="finished",
+        step_runs=[
+            (
+                StepRun(
+                    step_name=step_name,
+                    ran_at=ran_at,
+                    finished_at=ran_at + timedelta(milliseconds=ms),
+                    outcome="finished" if ms is not None else "error",
+                    returncode=0,
+                )
+                if ms is not None
+                else StepRun(step_name=step_name, ran_at=ran_at, outcome="error")
+            )
+            for step_name, ms in durations.items()
+        ],
+    )
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([3.0, 1.0, 2.0], 50) == 2.0
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([1.0], 95) == 1.0
+
+
+def test_history_record_and_query(tmp_path: Path):
+    history = HistoryStore(tmp_path / "history.db")
+    start = datetime(2024, 1, 1)
+    for i in range(5):
+        history.record(
+            create_pipeline_run(
+                "p" if i % 2 == 0 else "q",
+                start + timedelta(days=i),
+                {"a": 10 * (i + 1), "b": None},
+            )
+        )
+    runs = history.pipeline_runs()
+    assert len(runs) == 5
+    assert runs[0].ran_at == start + timedelta(days=4)
+    assert [x.pipeline_name for x in history.pipeline_runs("p")] == ["p"] * 3
+    assert len(history.pipeline_runs(since=start + timedelta(days=3))) == 2
+    assert len(history.pipeline_runs(limit=2)) == 2
+
+    step_runs = history.step_runs(step_name="a", limit=2)
+    assert [x.ran_at for x in step_runs] == [
+        start + timedelta(days=4),
+        start + timedelta(days=3),
+    ]
+    assert len(history.step_runs(outcome="error")) == 5
+    history.close()
+
+
+def test_history_step_stats(tmp_path: Path):
+    history = HistoryStore(tmp_path / "history.db")
+    start = datetime(2024, 1, 1)
+    for i in range(10):
+        history.record(
+            create_pipeline_run(
+                "p", start + timedelta(hours=i), {"a": 10 * (i + 1), "b": None}
+            )
+        )
+    stats = {x.step_name: x for x in history.step_stats("p")}
+    assert stats["a"].runs == 10
+    assert stats["a"].p50_ms == 50
+    assert stats["a"].p95_ms == 100
+    assert stats["b"].errors == 10
+    assert stats["b"].p50_ms is None
+
+    last = {x.step_name: x for x in history.step_stats("p", last=2)}
+    assert last["a"].runs == 2
+    assert last["a"].p50_ms == 90
+    history.close()
+
+
+def test_history_record_replaces_resumed_run(tmp_path: Path):
+    history = HistoryStore(tmp_path / "history.db")
+    run = create_pipeline_run("p", datetime(2024, 1, 1), {"a": 10, "b": None})
+    history.record(run)
+    run.step_runs[1] = StepRun(step_name="b", outcome="finished", returncode=0)
+    run.outcome = "finished"
+    history.record(run)
+    assert len(history.pipeline_runs()) == 1
+    assert len(history.step_runs(pipeline_run_id=run.id)) == 3
+    history.close()
+
+
+def test_history_step_usage(tmp_path: Path):
+    history = HistoryStore(tmp_path / "history.db")
+    start = datetime(2024, 1, 1)
+    for i in range(3):
+        run = create_pipeline_run("p", start + timedelta(hours=i), {"a": 10, "b": 20})
+        for step_run, (cpu, rss) in zip(
+            run.step_runs, [(1.0, 100 * (i + 1)), (3.0, 50)]
+        ):
+            step_run.wall_time = cpu
+            step_run.user_time = cpu
+            step_run.system_time = 0.5
+            step_run.max_rss = rss
+            step_run.read_blocks = 0
+            step_run.write_blocks = 8
+        history.record(run)
+    usages = {x.step_name: x for x in history.step_usage("p")}
+    assert usages["a"].runs == 3
+    assert usages["a"].max_rss == 300
+    assert usages["b"].user_time == 3.0
+    assert [x.step_name for x in rank_steps(list(usages.values()), "user_time")] == [
+        "b",
+        "a",
+    ]
+    assert [x.step_name for x in rank_steps(list(usages.values()), "max_rss", 1)] == [
+        "a"
+    ]
+    history.close()
+
+
+def test_history_adds_missing_columns(tmp_path: Path):
+    path = tmp_path / "history.db"
+    connection = sqlite3.connect(str(path))
+    # the step_runs table as it was before resource usage was recorded
+    connection.execute(
+        "create table step_runs (id text primary key, pipeline_run_id text, "
+        "step_name text, ran_at text, finished_at text, duration_ms real, "
+        "outcome text, job_id text, returncode integer, stdout_path text, "
+        "stderr_path text, stdout_bytes integer, stderr_bytes integer)"
+    )
+    connection.close()
+    history = HistoryStore(path)
+    columns = {
+        x["name"] for x in history.connection.execute("pragma table_info(step_runs)")
+    }
+    assert {"max_rss", "user_time", "write_blocks"} <= columns
+    history.close()
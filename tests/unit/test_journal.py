@@ -0,0 +1,81 @@
+from pathlib import Path
+
+from pypes.exec.journal import RunJournal, completed_step_runs, read_journal
+from pypes.exec.pipeline import run_pipeline
+from pypes.models.pipeline import Pipeline
+from pypes.models.run import PipelineRun, StepRun
+from pypes.models.step import Step
+
+
+def create_flaky_pipeline(tmp_path: Path) -> Pipeline:
+    # step 2 fails until the marker file exists
+    marker = tmp_path / "marker"
+    pipeline = Pipeline(
+        name="flaky",
+        owner="test",
+        steps=[
+            Step(name="step 1", command="echo x >> {}".format(tmp_path / "count")),
+            Step(name="step 2", command="test -e {}".format(marker)),
+        ],
+    )
+    return pipeline
+
+
+def test_journal_records_steps(tmp_path: Path):
+    pipeline = create_flaky_pipeline(tmp_path)
+    run = run_pipeline(pipeline, keep_going=True, observers=[RunJournal(tmp_path)])
+    step_runs = read_journal(run.id, tmp_path)
+    assert [(x.step_name, x.outcome) for x in step_runs] == [
+        ("step 1", "finished"),
+        ("step 2", "error"),
+    ]
+    assert [x.step_name for x in completed_step_runs(step_runs)] == ["step 1"]
+
+
+def test_journal_close_before_finish(tmp_path: Path):
+    # a run that raises never reaches pipeline_finished, the caller closes it
+    journal = RunJournal(tmp_path)
+    run = PipelineRun(pipeline=create_flaky_pipeline(tmp_path))
+    journal.pipeline_started(run)
+    journal.step_finished(run, StepRun(step_name="step 1", outcome="finished"))
+    journal.close()
+    journal.close()
+    assert [x.step_name for x in read_journal(run.id, tmp_path)] == ["step 1"]
+
+
+def test_completed_step_runs_latest_wins():
+    step_runs = [
+        StepRun(step_name="a", outcome="error"),
+        StepRun(step_name="b", outcome="finished"),
+        StepRun(step_name="a", outcome="finished"),
+    ]
+    assert sorted(x.step_name for x in completed_step_runs(step_runs)) == ["a", "b"]
+
+
+def test_resume_reruns_only_failed_steps(tmp_path: Path):
+    pipeline = create_flaky_pipeline(tmp_path)
+    run = run_pipeline(pipeline, keep_going=True, observers=[RunJournal(tmp_path)])
+    assert run.outcome == "error"
+
+    (tmp_path / "marker").touch()
+    completed = completed_step_runs(read_journal(run.id, tmp_path))
+    resumed = run_pipeline(
+        pipeline,
+        observers=[RunJournal(tmp_path)],
+        run_id=run.id,
+        completed=completed,
+    )
+    assert resumed.id == run.id
+    assert resumed.outcome == "finished"
+    assert len(resumed.step_runs) == 2
+    assert (tmp_path / "count").read_text() == "x\n"
+    latest = completed_step_runs(read_journal(run.id, tmp_path))
+    assert sorted(x.step_name for x in latest) == ["step 1", "step 2"]
+
+
+def test_read_journal_ignores_truncated_line(tmp_path: Path):
+    pipeline = create_flaky_pipeline(tmp_path)
+    run = run_pipeline(pipeline, keep_going=True, observers=[RunJournal(tmp_path)])
+    with open(tmp_path / "{}.jsonl".format(run.id), "a") as f:
+        f.write('{"type": "step", "step_na')
+    assert len(read_journal(run.id, tmp_path)) == 2
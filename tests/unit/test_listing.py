@@ -0,0 +1,143 @@
+import os
+from pathlib import Path
+
+from pypes.exec.cache import StepCache
+from pypes.exec.fresh import is_step_fresh
+from pypes.exec.listing import ListingIndex, list_files, listing_digest
+from pypes.exec.pipeline import run_pipeline
+from pypes.exec.scatter import map_items
+from pypes.models.pipeline import Pipeline
+from pypes.models.resource import FileSet
+from pypes.models.step import MapStep, Step
+from pypes.persist import deserialise_pipeline, serialise_pipeline
+
+
+def _age(path: Path, seconds: int = 60):
+    # listings of directories changed moments ago are not kept
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10**9))
+
+
+def _sample_dir(tmp_path: Path) -> Path:
+    samples = tmp_path / "samples"
+    (samples / "nested").mkdir(parents=True)
+    for name in ["b.fq", "a.fq", "notes.txt", ".hidden.fq", "nested/c.fq"]:
+        (samples / name).write_text(name)
+    for path in [samples, samples / "nested"]:
+        _age(path)
+    return samples
+
+
+def test_listing_matches_pattern(tmp_path: Path):
+    samples = _sample_dir(tmp_path)
+    index = ListingIndex()
+    names = [Path(x.path).name for x in list_files(FileSet(path=samples), index)]
+    assert names == ["a.fq", "b.fq", "notes.txt"]
+    file_set = FileSet(path=samples, pattern="*.fq", recursive=True)
+    paths = [x.path for x in list_files(file_set, index)]
+    assert paths == [str(samples / x) for x in ["a.fq", "b.fq", "nested/c.fq"]]
+    assert list_files(file_set, index)[0].size == 4
+
+
+def test_listing_rescanned_on_directory_change(tmp_path: Path):
+    samples = _sample_dir(tmp_path)
+    index = ListingIndex()
+    file_set = FileSet(path=samples, pattern="*.fq", recursive=True)
+    for _ in range(3):
+        assert len(list_files(file_set, index)) == 3
+    assert index.scans == 1
+    (samples / "nested" / "d.fq").write_text("d")
+    assert len(list_files(file_set, index)) == 4
+    assert index.scans == 2
+    # a directory changed moments before the scan is scanned again
+    assert len(list_files(file_set, index)) == 4
+    assert index.scans == 3
+
+
+def test_listing_missing_directory(tmp_path: Path):
+    index = ListingIndex()
+    file_set = FileSet(path=tmp_path / "missing")
+    assert list_files(file_set, index) == []
+    assert listing_digest(file_set, index) is None
+    (tmp_path / "missing").mkdir()
+    (tmp_path / "missing" / "a").write_text("a")
+    assert len(list_files(file_set, index)) == 1
+
+
+def test_listing_digest_changes(tmp_path: Path):
+    samples = _sample_dir(tmp_path)
+    index = ListingIndex()
+    file_set = FileSet(path=samples, pattern="*.fq")
+    digest = listing_digest(file_set, index)
+    assert digest == listing_digest(file_set, index)
+    (samples / "e.fq").write_text("e")
+    assert listing_digest(file_set, index) != digest
+
+
+def test_file_set_round_trip(tmp_path: Path):
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    pipeline.add_resources(
+        {"reads": FileSet(path=tmp_path, pattern="*.fq"), "out": tmp_path / "out"}
+    )
+    copied = deserialise_pipeline(serialise_pipeline(pipeline))
+    assert copied.resources == pipeline.resources
+    assert isinstance(copied.resources["reads"], FileSet)
+    assert isinstance(copied.resources["out"], Path)
+
+
+def test_file_set_freshness(tmp_path: Path):
+    samples = _sample_dir(tmp_path)
+    out = tmp_path / "out"
+    out.write_text("out")
+    resources = {"reads": FileSet(path=samples, pattern="*.fq"), "out": out}
+    step = Step(name="count", inputs=["reads"], outputs=["out"])
+    assert is_step_fresh(step, resources)
+    (samples / "new.fq").write_text("new")
+    _age(samples / "new.fq", -60)
+    assert not is_step_fresh(step, resources)
+
+    outputs = {"reads": FileSet(path=tmp_path / "outputs")}
+    producer = Step(name="split", outputs=["reads"])
+    assert not is_step_fresh(producer, outputs)
+    (tmp_path / "outputs").mkdir()
+    assert not is_step_fresh(producer, outputs)
+    (tmp_path / "outputs" / "a.fq").write_text("a")
+    assert is_step_fresh(producer, outputs)
+
+
+def test_file_set_cache_key(tmp_path: Path):
+    samples = _sample_dir(tmp_path)
+    cache = StepCache(tmp_path / "cache")
+    resources = {
+        "reads": FileSet(path=samples, pattern="*.fq"),
+        "out": tmp_path / "out",
+    }
+    step = Step(name="count", inputs=["reads"], outputs=["out"], command="true")
+    key = cache.step_key(step, resources, {})
+    assert key is not None
+    (samples / "e.fq").write_text("e")
+    assert cache.step_key(step, resources, {}) != key
+    producer = Step(name="split", outputs=["reads"], command="true")
+    assert cache.step_key(producer, resources, {}) is None
+
+
+def test_map_step_over_file_set(tmp_path: Path):
+    samples = _sample_dir(tmp_path)
+    step = MapStep(
+        name="count",
+        over=["reads", "extra"],
+        command="wc -c < {{ item }} >> {{ counts }}",
+        outputs=["counts"],
+    )
+    resources = {
+        "reads": FileSet(path=samples, pattern="*.fq"),
+        "extra": samples / "notes.txt",
+    }
+    items = map_items(step, resources, {})
+    assert items == [samples / "a.fq", samples / "b.fq", samples / "notes.txt"]
+
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=[step])
+    pipeline.add_resources({**resources, "counts": tmp_path / "counts"})
+    run = run_pipeline(pipeline)
+    assert run.outcome == "finished"
+    assert (tmp_path / "counts").read_text().split() == ["4", "4", "9"]
@@ -1,11 +1,16 @@
+import os
 from pathlib import Path
 from typing import Callable
 
+import pytest
+
+from pypes import persist
 from pypes.models.pipeline import Pipeline
 from pypes.persist import (
     deserialise_pipeline,
     read_pipeline,
     serialise_pipeline,
+    sidecar_path,
     write_pipeline,
 )
 
@@ -28,4 +33,74 @@ def test_persist_read_write(
     write_pipeline(pipeline, path)
     pipeline2 = read_pipeline(path)
     path.unlink()
+    sidecar_path(path).unlink()
     assert pipeline == pipeline2
+
+
+def test_read_pipeline_uses_sidecar(
+    tmp_path: Path,
+    create_split_merge_pipeline: Callable[..., Pipeline],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    path = tmp_path / ".pipeline.conf"
+    pipeline = create_split_merge_pipeline()
+    write_pipeline(pipeline, path)
+    assert read_pipeline(path) == pipeline
+    assert sidecar_path(path).exists()
+
+    def fail(pipeline_text: str):
+        raise AssertionError("config was parsed again")
+
+    monkeypatch.setattr(persist, "deserialise_pipeline", fail)
+    assert read_pipeline(path) == pipeline
+    # touching the config keeps the sidecar, the content hash still matches
+    os.utime(path, ns=(0, 0))
+    assert read_pipeline(path) == pipeline
+
+
+def test_read_pipeline_sidecar_invalidated(
+    tmp_path: Path, create_split_merge_pipeline: Callable[..., Pipeline]
+):
+    path = tmp_path / ".pipeline.conf"
+    pipeline = create_split_merge_pipeline()
+    write_pipeline(pipeline, path)
+    read_pipeline(path)
+    pipeline.name = "renamed"
+    write_pipeline(pipeline, path)
+    assert read_pipeline(path).name == "renamed"
+
+
+def test_read_pipeline_corrupt_sidecar(
+    tmp_path: Path, create_split_merge_pipeline: Callable[..., Pipeline]
+):
+    path = tmp_path / ".pipeline.conf"
+    pipeline = create_split_merge_pipeline()
+    write_pipeline(pipeline, path)
+    sidecar_path(path).write_bytes(b"not a pickle")
+    assert read_pipeline(path) == pipeline
+
+
+def test_read_pipeline_sidecar_from_older_models(
+    tmp_path: Path,
+    create_split_merge_pipeline: Callable[..., Pipeline],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    path = tmp_path / ".pipeline.conf"
+    pipeline = create_split_merge_pipeline()
+    write_pipeline(pipeline, path)
+    monkeypatch.setattr(
+        persist, "sidecar_version", lambda: (persist.SIDECAR_VERSION, "", "old")
+    )
+    read_pipeline(path)
+    monkeypatch.undo()
+    # the models changed since the sidecar was written, so the config is parsed
+    parsed = []
+    monkeypatch.setattr(
+        persist,
+        "deserialise_pipeline",
+        lambda text: parsed.append(text) or deserialise_pipeline(text),
+    )
+    assert read_pipeline(path) == pipeline
+    assert len(parsed) == 1
+    assert read_pipeline(path) == pipeline
+    assert len(parsed) == 1
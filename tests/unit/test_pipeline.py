@@ -1,7 +1,13 @@
 from pathlib import Path
 from typing import Callable
 
-from pypes.exceptions import KeyAlreadyInUseException, NoMatchingStepException
+import pytest
+
+from pypes.exceptions import (
+    DuplicateStepException,
+    KeyAlreadyInUseException,
+    NoMatchingStepException,
+)
 from pypes.models.pipeline import Pipeline
 from pypes.models.step import Step
 
@@ -57,3 +63,92 @@ def test_pipeline_get_step_failure(create_test_step: Callable[..., Step]):
         assert False
     except NoMatchingStepException:
         assert True
+
+
+def test_pipeline_add_steps():
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    steps = [Step(name="step {}".format(i), command="true") for i in range(1000)]
+    pipeline.add_steps(steps)
+    pipeline.add_step(Step(name="last", command="true"))
+    assert len(pipeline.steps) == 1001
+    assert pipeline.get_step("step 999") is steps[999]
+    assert pipeline.get_step("last").name == "last"
+
+
+def test_pipeline_add_steps_duplicate():
+    pipeline = Pipeline(
+        name="test pipeline", owner="test", steps=[Step(name="a", command="true")]
+    )
+    with pytest.raises(DuplicateStepException):
+        pipeline.add_steps([Step(name="b", command="true"), Step(name="a")])
+    with pytest.raises(DuplicateStepException):
+        pipeline.add_steps([Step(name="b", command="true"), Step(name="b")])
+    # a failed bulk add leaves the pipeline untouched
+    assert [x.name for x in pipeline.steps] == ["a"]
+
+
+def test_pipeline_add_resources_bulk_is_atomic():
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    pipeline.add_context({"c": "x"})
+    with pytest.raises(KeyAlreadyInUseException):
+        pipeline.add_resources({"a": Path("a"), "c": Path("c")})
+    assert pipeline.resources == {}
+    assert pipeline.known_keys == ["c"]
+    pipeline.add_resources({"a": Path("a"), "b": Path("b")})
+    assert pipeline.key_kind("a") == "resource"
+    assert pipeline.key_kind("c") == "context"
+    assert pipeline.key_kind("d") is None
+
+
+def test_pipeline_indexes_survive_round_trip(
+    create_split_merge_pipeline: Callable[..., Pipeline],
+):
+    pipeline = create_split_merge_pipeline()
+    copied = Pipeline(**pipeline.dict())
+    assert copied == pipeline
+    assert copied.key_kind("a") == "resource"
+    with pytest.raises(KeyAlreadyInUseException):
+        copied.add_context({"a": "x"})
+
+
+def test_pipeline_get_step_after_direct_append():
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    pipeline.steps.append(Step(name="a", command="true"))
+    assert pipeline.get_step("a").name == "a"
+
+
+def test_pipeline_indexes_follow_direct_changes():
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    pipeline.add_steps([Step(name="a"), Step(name="b")])
+    pipeline.steps.pop()
+    with pytest.raises(NoMatchingStepException):
+        pipeline.get_step("b")
+    pipeline.add_step(Step(name="b", command="true"))
+    assert pipeline.get_step("b").command == "true"
+
+    pipeline.steps = [Step(name="c")]
+    with pytest.raises(NoMatchingStepException):
+        pipeline.get_step("a")
+    pipeline.add_step(Step(name="a"))
+    pipeline.steps[0] = Step(name="d")
+    assert pipeline.get_step("d").name == "d"
+    with pytest.raises(NoMatchingStepException):
+        pipeline.get_step("c")
+
+    pipeline.add_resources({"r": Path("r")})
+    del pipeline.resources["r"]
+    pipeline.known_keys.remove("r")
+    assert pipeline.key_kind("r") is None
+    pipeline.add_context({"r": "x"})
+    assert pipeline.key_kind("r") == "context"
+
+
+def test_pipeline_equality_ignores_stale_indexes():
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    pipeline.add_steps([Step(name="a"), Step(name="b")])
+    other = Pipeline(**pipeline.dict())
+    pipeline.get_step("b")
+    pipeline.steps.pop()
+    other.steps.pop()
+    other.get_step("a")
+    assert pipeline == other
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pypes.exec.depend import get_bottom_levels, get_critical_path, pipeline_to_dag
+from pypes.exec.pipeline import run_pipeline
+from pypes.exec.plan import (
+    estimate_durations,
+    plan_pipeline,
+    simulate_makespan,
+    step_priorities,
+)
+from pypes.history import HistoryStore
+from pypes.models.pipeline import Pipeline
+from pypes.models.run import PipelineRun, StepRun
+from pypes.models.step import Step
+
+
+def create_diamond_pipeline(**estimates: float) -> Pipeline:
+    # a -> (b, c) -> d, plus an unrelated step e
+    return Pipeline(
+        name="diamond",
+        owner="test",
+        steps=[
+            Step(name="a", outputs=["x"], estimate=estimates.get("a")),
+            Step(name="b", inputs=["x"], outputs=["y"], estimate=estimates.get("b")),
+            Step(name="c", inputs=["x"], outputs=["z"], estimate=estimates.get("c")),
+            Step(name="d", inputs=["y", "z"], estimate=estimates.get("d")),
+            Step(name="e", estimate=estimates.get("e")),
+        ],
+    )
+
+
+def test_bottom_levels_and_critical_path():
+    dag = pipeline_to_dag(create_diamond_pipeline())
+    levels = get_bottom_levels(dag, {"a": 1, "b": 5, "c": 2, "d": 1, "e": 3})
+    assert levels == {"a": 7, "b": 6, "c": 3, "d": 1, "e": 3}
+    assert get_critical_path(dag, levels) == ["a", "b", "d"]
+
+
+def test_estimate_durations_sources(tmp_path: Path):
+    pipeline = create_diamond_pipeline(a=4.0, b=2.0)
+    history = HistoryStore(tmp_path / "history.db")
+    ran_at = datetime(2024, 1, 1)
+    history.record(
+        PipelineRun(
+            pipeline=pipeline,
+            ran_at=ran_at,
+            step_runs=[
+                StepRun(
+                    step_name="b",
+                    ran_at=ran_at,
+                    finished_at=ran_at + timedelta(seconds=10),
+                    outcome="finished",
+                )
+            ],
+        )
+    )
+    durations = estimate_durations(pipeline, history)
+    history.close()
+    assert durations["a"] == (4.0, "estimate")
+    assert durations["b"] == (10.0, "history")
+    # unknown steps get the median of what is known
+    assert durations["c"] == (7.0, "default")
+
+
+def test_step_priorities_without_estimates():
+    pipeline = create_diamond_pipeline()
+    assert step_priorities(pipeline, pipeline_to_dag(pipeline)) is None
+
+
+def test_simulate_makespan():
+    dag = pipeline_to_dag(create_diamond_pipeline())
+    durations = {"a": 1.0, "b": 5.0, "c": 2.0, "d": 1.0, "e": 3.0}
+    levels = get_bottom_levels(dag, durations)
+    assert simulate_makespan(dag, durations, levels, jobs=1) == 12.0
+    assert simulate_makespan(dag, durations, levels, jobs=2) == 7.0
+    assert simulate_makespan(dag, durations, levels, jobs=10) == 7.0
+
+
+def test_plan_pipeline():
+    pipeline = create_diamond_pipeline(a=1, b=5, c=2, d=1, e=3)
+    plan = plan_pipeline(pipeline, jobs=2)
+    assert plan.makespan == 7.0
+    assert plan.critical_path == ["a", "b", "d"]
+    assert plan.critical_path_length == 7.0
+    assert plan.steps["e"].source == "estimate"
+
+
+def test_run_pipeline_longest_path_first(tmp_path: Path):
+    log = tmp_path / "log"
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[
+            Step(name="short", command="echo short >> {}".format(log), estimate=1),
+            Step(
+                name="long",
+                outputs=["x"],
+                command="echo long >> {}".format(log),
+                estimate=1,
+            ),
+            Step(
+                name="after long",
+                inputs=["x"],
+                command="echo after >> {}".format(log),
+                estimate=5,
+            ),
+        ],
+    )
+    pipeline.add_resources({"x": tmp_path / "x"})
+    priorities = step_priorities(pipeline, pipeline_to_dag(pipeline))
+    run = run_pipeline(pipeline, priorities=priorities)
+    assert run.outcome == "finished"
+    assert log.read_text().split() == ["long", "after", "short"]
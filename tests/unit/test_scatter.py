@@ -0,0 +1,184 @@
+from pathlib import Path
+
+import pytest
+
+from pypes.constants import default_pbs_context
+from pypes.exceptions import InvalidTemplateException, SubmissionException
+from pypes.exec.backends.fake import fake_pbs_command
+from pypes.exec.backends.pbs import PBSBackend
+from pypes.exec.depend import pipeline_to_dag
+from pypes.exec.pipeline import run_pbs_pipeline, run_pipeline
+from pypes.exec.template import TemplateCache
+from pypes.models.pipeline import Pipeline
+from pypes.models.resource import FileSet
+from pypes.models.step import MapStep, Step
+
+
+def _sample_pipeline(tmp_path: Path) -> Pipeline:
+    samples = {"s{}".format(i): tmp_path / "s{}.txt".format(i) for i in range(3)}
+    for key, path in samples.items():
+        path.write_text(key)
+    steps = [
+        MapStep(
+            name="count",
+            over=list(samples),
+            command="wc -c < {{ item }} > {{ item }}.{{ index }}.count",
+            gather="cat {{ items }} > {{ total }}",
+            outputs=["total"],
+        ),
+        Step(name="report", inputs=["total"], command="cat {{ total }}"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({**samples, "total": tmp_path / "total"})
+    return pipeline
+
+
+def test_map_step_parses_from_config(tmp_path: Path):
+    pipeline = _sample_pipeline(tmp_path)
+    copied = Pipeline(**pipeline.dict())
+    assert isinstance(copied.steps[0], MapStep)
+    assert type(copied.steps[1]) is Step
+    assert set(pipeline_to_dag(copied).pred["count"]) == set()
+    assert list(pipeline_to_dag(copied).successors("count")) == ["report"]
+
+
+def test_run_map_step(tmp_path: Path):
+    pipeline = _sample_pipeline(tmp_path)
+    run = run_pipeline(pipeline, jobs=3)
+    assert run.outcome == "finished"
+    names = [x.step_name for x in run.step_runs]
+    assert sorted(names[:3]) == ["count[0]", "count[1]", "count[2]"]
+    assert names[3:] == ["count gather", "count", "report"]
+    assert (tmp_path / "s2.txt.2.count").read_text().strip() == "2"
+    assert (tmp_path / "total").read_text() == "s0s1s2"
+
+
+def test_run_map_step_over_glob(tmp_path: Path):
+    steps = [
+        Step(
+            name="make",
+            outputs=["dir"],
+            command="touch {{ dir }}/a.part {{ dir }}/b.part",
+        ),
+        MapStep(
+            name="upper",
+            inputs=["dir"],
+            over="{{ dir }}/*.part",
+            command="echo {{ index }} > {{ item }}",
+        ),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"dir": tmp_path})
+    # the glob only matches once make has run, so it has to expand lazily
+    run = run_pipeline(pipeline)
+    assert run.outcome == "finished"
+    assert (tmp_path / "a.part").read_text().strip() == "0"
+    assert (tmp_path / "b.part").read_text().strip() == "1"
+
+
+def test_run_map_step_empty(tmp_path: Path):
+    steps = [
+        MapStep(
+            name="nothing",
+            over=str(tmp_path / "*.missing"),
+            command="false",
+            gather="echo [{{ items }}] > {{ out }}",
+        )
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"out": tmp_path / "out"})
+    run = run_pipeline(pipeline)
+    assert run.outcome == "finished"
+    assert [x.step_name for x in run.step_runs] == ["nothing gather", "nothing"]
+    assert (tmp_path / "out").read_text().strip() == "[]"
+
+
+def test_run_map_step_shard_failure(tmp_path: Path):
+    pipeline = _sample_pipeline(tmp_path)
+    pipeline.steps[0].command = "test {{ index }} -ne 1"
+    run = run_pipeline(pipeline, jobs=3, keep_going=True)
+    assert run.outcome == "error"
+    outcomes = {x.step_name: x.outcome for x in run.step_runs}
+    assert outcomes == {
+        "count[0]": "finished",
+        "count[1]": "error",
+        "count[2]": "finished",
+        "count": "error",
+    }
+
+
+def test_run_map_step_fail_fast(tmp_path: Path):
+    pipeline = _sample_pipeline(tmp_path)
+    pipeline.steps[0].command = "false"
+    run = run_pipeline(pipeline, jobs=1)
+    assert run.outcome == "error"
+    outcomes = {x.step_name: x.outcome for x in run.step_runs}
+    assert outcomes == {"count[0]": "error", "count": "error"}
+
+
+def test_check_pipeline_map_step(tmp_path: Path):
+    pipeline = _sample_pipeline(tmp_path)
+    TemplateCache().check_pipeline(pipeline)
+    pipeline.steps[0].over = ["s0", "nope"]
+    pipeline.steps[0].gather = "cat {{ item }}"
+    with pytest.raises(InvalidTemplateException) as e:
+        TemplateCache().check_pipeline(pipeline)
+    assert "maps over undefined resources: nope" in str(e.value)
+    assert "'count' gather uses undefined names: item" in str(e.value)
+
+
+def test_run_pbs_map_step(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("PYPES_FAKE_PBS_DIR", str(tmp_path / "fake_pbs"))
+    backend = PBSBackend(
+        jobs_dir=tmp_path / "jobs",
+        qsub_command=fake_pbs_command("qsub"),
+        qstat_command=fake_pbs_command("qstat"),
+    )
+    pipeline = _sample_pipeline(tmp_path)
+    pipeline.add_context(dict(default_pbs_context, conda_env=""))
+    run = run_pbs_pipeline(pipeline, backend=backend)
+    assert [(x.step_name, x.job_id) for x in run.step_runs] == [
+        ("count", "1[].fake"),
+        ("count gather", "2.fake"),
+        ("report", "3.fake"),
+    ]
+    assert (tmp_path / "total").read_text() == "s0s1s2"
+
+
+def test_run_pbs_map_step_rejects_unusable_globs(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("PYPES_FAKE_PBS_DIR", str(tmp_path / "fake_pbs"))
+    backend = PBSBackend(
+        jobs_dir=tmp_path / "jobs",
+        qsub_command=fake_pbs_command("qsub"),
+        qstat_command=fake_pbs_command("qstat"),
+    )
+    steps = [
+        Step(name="make", outputs=["dir"], command="touch {{ dir }}/a.part"),
+        MapStep(name="upper", inputs=["dir"], over="{{ dir }}/*.part"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"dir": tmp_path})
+    pipeline.add_context(dict(default_pbs_context, conda_env=""))
+    # the glob would be expanded before make has run
+    with pytest.raises(SubmissionException) as e:
+        run_pbs_pipeline(pipeline, backend=backend)
+    assert "map over resource keys of single files" in str(e.value)
+    assert not (tmp_path / "a.part").exists()
+
+    # a file set written upstream would be listed before it is written too
+    (tmp_path / "old.part").write_text("old")
+    pipeline.steps = [
+        Step(name="make", outputs=["parts"], command="touch {{ dir }}/a.part"),
+        MapStep(name="upper", over=["parts"]),
+    ]
+    pipeline.add_resources({"parts": FileSet(path=tmp_path, pattern="*.part")})
+    with pytest.raises(SubmissionException):
+        run_pbs_pipeline(pipeline, backend=backend)
+    assert not (tmp_path / "a.part").exists()
+
+    pipeline.steps = [MapStep(name="upper", over=str(tmp_path / "*.missing"))]
+    with pytest.raises(SubmissionException) as e:
+        run_pbs_pipeline(pipeline, backend=backend)
+    assert "nothing to map over" in str(e.value)
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+import pypes
+from pypes.models.pipeline import Pipeline
+from pypes.persist import write_pipeline
+
+# about twice what each command imports today, so a heavy import sneaking
+# back in fails the test but noise does not
+HELP_BUDGET_US = 500_000
+CACHE_BUDGET_US = 600_000
+RUN_BUDGET_US = 1_000_000
+
+INTERACTIVE_MODULES = ["prompt_toolkit", "names_generator", "pypes.cli.utils"]
+EXEC_MODULES = ["networkx", "jinja2"]
+
+
+def import_times(args: List[str], cwd: Path) -> Tuple[Dict[str, int], int]:
+    env = dict(os.environ, PYTHONPATH=str(Path(pypes.__file__).parents[1]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "pypes", *args],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    times: Dict[str, int] = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+        # only top level imports count towards the total, nested ones are
+        # already part of their parent's cumulative time
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return times, total
+
+
+@pytest.mark.parametrize(
+    "args,forbidden,budget",
+    [
+        (["--help"], INTERACTIVE_MODULES + EXEC_MODULES, HELP_BUDGET_US),
+        (["history"], INTERACTIVE_MODULES + EXEC_MODULES, HELP_BUDGET_US),
+        (["cache", "stats"], INTERACTIVE_MODULES + ["networkx"], CACHE_BUDGET_US),
+        (["run", "--local"], INTERACTIVE_MODULES, RUN_BUDGET_US),
+    ],
+)
+def test_startup_imports(
+    args: List[str],
+    forbidden: List[str],
+    budget: int,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    create_split_merge_pipeline: Callable[..., Pipeline],
+):
+    monkeypatch.setenv("PYPES_CACHE_DIR", str(tmp_path / "cache"))
+    write_pipeline(create_split_merge_pipeline(), tmp_path / ".pipeline.conf")
+    times, total = import_times(args, tmp_path)
+    imported = [
+        x for x in forbidden if any(y == x or y.startswith(x + ".") for y in times)
+    ]
+    assert imported == []
+    assert total < budget
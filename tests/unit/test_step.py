@@ -1,6 +1,13 @@
+import asyncio
+import gzip
+from pathlib import Path
 from typing import Callable
 
-from pypes.exec.step import run_step
+import pytest
+from pydantic import ValidationError
+
+from pypes.exec.spool import LogConfig
+from pypes.exec.step import render_command, run_step, run_step_async
 from pypes.models.step import Step
 
 
@@ -46,3 +53,104 @@ def test_step_returncode():
     )
     step_run = run_step(step, {}, {})
     assert step_run.returncode == 0
+
+
+def test_step_large_output_does_not_block():
+    # more than a pipe buffer on both streams at once
+    step = Step(
+        name="test step",
+        command="head -c 1000000 /dev/zero | tr '\\\\0' a; "
+        "head -c 1000000 /dev/zero | tr '\\\\0' b >&2",
+    )
+    step_run = run_step(step, {}, {})
+    assert step_run.outcome == "finished"
+    assert step_run.stdout_bytes == step_run.stderr_bytes == 1000000
+
+
+def test_step_run_async_many_concurrent():
+    async def run_all():
+        steps = [Step(name=str(i), command="echo {}".format(i)) for i in range(50)]
+        return await asyncio.gather(*(run_step_async(x, {}, {}) for x in steps))
+
+    step_runs = asyncio.run(run_all())
+    assert [x.stdout.strip() for x in step_runs] == [str(i) for i in range(50)]
+
+
+def test_step_output_excerpt():
+    step = Step(name="test step", command="seq 1 100000")
+    step_run = run_step(step, {}, {}, logs=LogConfig(excerpt_size=16))
+    assert step_run.stdout.startswith("1\n2\n3\n")
+    assert step_run.stdout.endswith("99999\n100000\n")
+    assert "bytes omitted" in step_run.stdout
+    assert step_run.stdout_path is None
+
+
+def test_step_output_log_files(tmp_path: Path):
+    step = Step(name="test step", command="seq 1 100000; >&2 echo oops")
+    logs = LogConfig(path=tmp_path, compress=True, excerpt_size=16)
+    step_run = run_step(step, {}, {}, logs=logs)
+    assert step_run.stdout_path and step_run.stdout_path.endswith(".stdout.gz")
+    with gzip.open(step_run.stdout_path) as f:
+        assert len(f.read()) == step_run.stdout_bytes
+    assert Path(step_run.stderr_path or "").read_bytes() != b""
+    assert step_run.stderr == "oops\n"
+
+
+def test_step_resource_usage(tmp_path: Path):
+    # burn some cpu in a grandchild, wait4 accounts for the whole tree
+    step = Step(
+        name="busy",
+        command="python3 -c 'b = bytearray(64 * 1024 * 1024); sum(range(3000000))'",
+    )
+    step_run = run_step(step, {}, {})
+    assert step_run.returncode == 0
+    assert step_run.wall_time is not None and step_run.wall_time > 0
+    assert step_run.user_time is not None and step_run.user_time > 0
+    assert step_run.system_time is not None
+    assert step_run.max_rss is not None and step_run.max_rss >= 64 * 1024 * 1024
+    assert step_run.read_blocks is not None
+    assert step_run.write_blocks is not None
+
+
+def test_step_resource_usage_on_failure():
+    step_run = run_step(Step(name="fail", command="exit 3"), {}, {})
+    assert step_run.returncode == 3
+    assert step_run.wall_time is not None
+
+
+def test_step_argv(tmp_path: Path):
+    # arguments are passed through as they are, spaces and all
+    step = Step(
+        name="test step",
+        argv=["printf", "%s|", "{{ path }}", "$HOME", "a b"],
+    )
+    resources = {"path": tmp_path / "with space"}
+    step_run = run_step(step, resources, {})
+    assert step_run.outcome == "finished"
+    assert step_run.stdout == "{}|$HOME|a b|".format(tmp_path / "with space")
+    assert render_command(
+        step, resources, {}
+    ) == "printf '%s|' '{}' '$HOME' 'a b'".format(tmp_path / "with space")
+
+
+def test_step_argv_missing_program():
+    step = Step(name="test step", argv=["pypes-no-such-program", "x"])
+    step_run = run_step(step, {}, {})
+    assert step_run.outcome == "error"
+    assert step_run.returncode == 127
+    assert "pypes-no-such-program" in step_run.stderr
+
+
+def test_step_argv_not_executable(tmp_path: Path):
+    script = tmp_path / "script"
+    script.write_text("echo hi\n")
+    script.chmod(0o755)
+    step_run = run_step(Step(name="test step", argv=[str(script)]), {}, {})
+    assert step_run.outcome == "error"
+    assert step_run.returncode == 126
+    assert "Exec format error" in step_run.stderr
+
+
+def test_step_argv_not_empty():
+    with pytest.raises(ValidationError):
+        Step(name="test step", argv=[])
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import pytest
+
+from pypes.constants import default_pbs_context
+from pypes.exceptions import InvalidTemplateException
+from pypes.exec.pipeline import run_pipeline
+from pypes.exec.template import TemplateCache
+from pypes.models.pipeline import Pipeline
+from pypes.models.step import Step
+
+
+def test_template_compiled_once():
+    templates = TemplateCache()
+    assert templates.get("echo {{ a }}") is templates.get("echo {{ a }}")
+    assert templates.render("echo {{ a }}", a="b") == "echo b"
+
+
+def test_template_plain_text_not_compiled():
+    templates = TemplateCache()
+    assert templates.render("--flag=1", a="b") == "--flag=1"
+    assert templates._templates == {}
+    assert templates.render("echo {{ a }}\n", a="b") == "echo b"
+
+
+def test_template_names():
+    templates = TemplateCache()
+    assert templates.names("cp {{ a }} {{ b }} {% if c %}{% endif %}") == {
+        "a",
+        "b",
+        "c",
+    }
+
+
+def test_check_pipeline_undefined_names():
+    steps = [
+        Step(name="step 1", command="cp {{ a }} {{ b }}"),
+        Step(name="step 2", command="echo {{ message }}"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"a": Path("a")})
+    with pytest.raises(InvalidTemplateException) as e:
+        TemplateCache().check_pipeline(pipeline)
+    assert "'step 1' uses undefined names: b" in str(e.value)
+    assert "'step 2' uses undefined names: message" in str(e.value)
+
+
+def test_check_pipeline_argv():
+    steps = [Step(name="step 1", argv=["cp", "{{ a }}", "{{ b }}"])]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    pipeline.add_resources({"a": Path("a")})
+    with pytest.raises(InvalidTemplateException) as e:
+        TemplateCache().check_pipeline(pipeline)
+    assert "'step 1' uses undefined names: b" in str(e.value)
+
+
+def test_check_pipeline_syntax_error():
+    steps = [Step(name="step 1", command="echo {{ a ")]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    with pytest.raises(InvalidTemplateException):
+        TemplateCache().check_pipeline(pipeline)
+
+
+def test_check_pipeline_pbs_header():
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    with pytest.raises(InvalidTemplateException):
+        TemplateCache().check_pipeline(pipeline, pbs=True)
+    pipeline.add_context(default_pbs_context)
+    TemplateCache().check_pipeline(pipeline, pbs=True)
+
+
+def test_run_pipeline_fails_before_running(tmp_path: Path):
+    marker = tmp_path / "marker"
+    steps = [
+        Step(name="step 1", command="touch {}".format(marker)),
+        Step(name="step 2", command="echo {{ missing }}"),
+    ]
+    pipeline = Pipeline(name="test pipeline", owner="test", steps=steps)
+    with pytest.raises(InvalidTemplateException):
+        run_pipeline(pipeline)
+    assert not marker.exists()
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from pypes.exec.observers import RunObserver
+from pypes.exec.pipeline import run_pipeline, run_pipeline_async
+from pypes.exec.step import run_step, step_timeout
+from pypes.models.pipeline import Pipeline
+from pypes.models.step import Step
+from pypes.units import InvalidDurationException, parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration("04:00:00") == 4 * 3600
+    assert parse_duration("1:30") == 90
+    assert parse_duration("0.5") == 0.5
+    for text in ["", "1:2:3:4", "abc", "-1"]:
+        with pytest.raises(InvalidDurationException):
+            parse_duration(text)
+
+
+def test_step_timeout_defaults_to_walltime():
+    assert step_timeout(Step(name="a"), {}) is None
+    assert step_timeout(Step(name="a"), {"walltime": "00:01:00"}) == 60
+    assert step_timeout(Step(name="a", walltime="2"), {"walltime": "00:01:00"}) == 2
+
+
+def test_step_timeout_kills_process_group():
+    # the backgrounded sleep is in the same process group and dies too,
+    # otherwise it would hold the output pipes open
+    started = time.monotonic()
+    step_run = run_step(
+        Step(name="hang", command="sleep 30 & sleep 30; wait"), {}, {}, timeout=0.3
+    )
+    assert time.monotonic() - started < 10
+    assert step_run.outcome == "timeout"
+    assert step_run.returncode == -signal.SIGTERM
+
+
+def test_run_pipeline_walltime_from_context():
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[Step(name="hang", command="sleep 30")],
+        context={"walltime": "0.3"},
+    )
+    run = run_pipeline(pipeline)
+    assert run.outcome == "error"
+    assert run.step_runs[0].outcome == "timeout"
+
+
+def test_run_pipeline_fail_fast_cancels_siblings():
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[
+            Step(name="slow", command="sleep 30"),
+            Step(name="fails", command="sleep 0.2; false"),
+        ],
+    )
+    started = time.monotonic()
+    run = run_pipeline(pipeline, jobs=2)
+    assert time.monotonic() - started < 10
+    assert run.outcome == "error"
+    outcomes = {x.step_name: x.outcome for x in run.step_runs}
+    assert outcomes == {"fails": "error", "slow": "cancelled"}
+
+
+def test_run_pipeline_keep_going_does_not_cancel():
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[
+            Step(name="slow", command="sleep 0.5"),
+            Step(name="fails", command="false"),
+        ],
+    )
+    run = run_pipeline(pipeline, jobs=2, keep_going=True)
+    outcomes = {x.step_name: x.outcome for x in run.step_runs}
+    assert outcomes == {"fails": "error", "slow": "finished"}
+
+
+def test_run_pipeline_sigint_kills_running_steps():
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[
+            Step(name="first", command="sleep 30"),
+            Step(name="second", command="sleep 30"),
+        ],
+    )
+
+    async def interrupted_run():
+        asyncio.get_running_loop().call_later(0.3, os.kill, os.getpid(), signal.SIGINT)
+        return await run_pipeline_async(pipeline, jobs=2)
+
+    started = time.monotonic()
+    run = asyncio.run(interrupted_run())
+    assert time.monotonic() - started < 10
+    assert run.outcome == "cancelled"
+    assert sorted(x.outcome for x in run.step_runs) == ["cancelled", "cancelled"]
+
+
+def test_run_pipeline_error_kills_running_steps(tmp_path):
+    pid_file = tmp_path / "pid"
+    pipeline = Pipeline(
+        name="test pipeline",
+        owner="test",
+        steps=[
+            Step(name="slow", command="echo $$ > {}; exec sleep 30".format(pid_file)),
+            Step(name="quick", command="sleep 0.3"),
+        ],
+    )
+
+    class Broken(RunObserver):
+        def step_finished(self, pipeline_run, step_run):
+            raise RuntimeError("observer failed")
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        run_pipeline(pipeline, jobs=2, observers=[Broken()])
+    assert time.monotonic() - started < 10
+    # the slow step was killed and reaped before run_pipeline returned
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
@@ -0,0 +1,103 @@
+from typing import Dict, List
+
+import pytest
+
+from pypes.exceptions import JobStatusException
+from pypes.exec.backends import SchedulerBackend
+from pypes.exec.track import JobTracker
+from pypes.models.job import JobStatus
+from pypes.models.pipeline import Pipeline
+from pypes.models.run import PipelineRun, StepRun
+
+
+class ScriptedBackend(SchedulerBackend):
+    """Replays a fixed list of job states, one per status call."""
+
+    def __init__(self, states: List[Dict[str, str]]):
+        self.states = states
+        self.calls: List[List[str]] = []
+        self.submitted: List[str] = []
+
+    def submit(self, name, command, namespace, depends) -> str:
+        self.submitted.append(name)
+        return str(len(self.submitted))
+
+    def submit_array(self, name, commands, namespace, depends) -> str:
+        self.submitted.append(name)
+        return "{}[]".format(len(self.submitted))
+
+    def status(self, job_ids: List[str]) -> Dict[str, JobStatus]:
+        self.calls.append(job_ids)
+        states = self.states[min(len(self.calls), len(self.states)) - 1]
+        return {
+            job_id: JobStatus(
+                job_id=job_id,
+                state="F" if state.isdigit() else state,
+                exit_status=int(state) if state.isdigit() else None,
+            )
+            for job_id, state in states.items()
+            if job_id in job_ids
+        }
+
+
+def _submitted_run(*job_ids: str) -> PipelineRun:
+    pipeline = Pipeline(name="test pipeline", owner="test")
+    step_runs = [
+        StepRun(step_name="step {}".format(x), job_id=x, outcome="submitted")
+        for x in job_ids
+    ]
+    return PipelineRun(pipeline=pipeline, step_runs=step_runs, outcome="submitted")
+
+
+def test_tracker_batches_and_backs_off():
+    backend = ScriptedBackend(
+        [
+            {"1": "Q", "2": "Q"},
+            {"1": "Q", "2": "Q"},
+            {"1": "R", "2": "Q"},
+            {"1": "0", "2": "R"},
+            {"2": "2"},
+        ]
+    )
+    sleeps: List[float] = []
+    tracker = JobTracker(backend, min_interval=1, max_interval=10, sleep=sleeps.append)
+    updates: List[str] = []
+    run = tracker.wait(
+        _submitted_run("1", "2"),
+        on_update=lambda x: updates.append("{} {}".format(x.job_id, x.outcome)),
+    )
+
+    # one status call per poll, only asking about outstanding jobs
+    assert backend.calls[0] == ["1", "2"]
+    assert backend.calls[-1] == ["2"]
+    assert sleeps == [1.5, 2.25, 1, 1]
+    assert updates == ["1 running", "1 finished", "2 running", "2 error"]
+    assert run.outcome == "error"
+    assert [x.returncode for x in run.step_runs] == [0, 2]
+
+
+def test_tracker_gives_up_on_missing_jobs():
+    backend = ScriptedBackend([{"1": "B", "2": "Q"}, {"1": "B"}, {"1": "0"}])
+    tracker = JobTracker(backend, max_missing=2, sleep=lambda x: None)
+    updates: List[str] = []
+    run = tracker.wait(
+        _submitted_run("1", "2"),
+        on_update=lambda x: updates.append("{} {}".format(x.job_id, x.outcome)),
+    )
+    # an array job in state B has started, job 2 was lost
+    assert updates == ["1 running", "1 finished", "2 error"]
+    assert run.outcome == "error"
+    assert [x.returncode for x in run.step_runs] == [0, -1]
+
+
+def test_tracker_timeout():
+    backend = ScriptedBackend([{"1": "Q"}])
+    now = [0.0]
+
+    def sleep(seconds: float):
+        now[0] += seconds
+
+    tracker = JobTracker(backend, min_interval=1, sleep=sleep, clock=lambda: now[0])
+    with pytest.raises(JobStatusException):
+        tracker.wait(_submitted_run("1"), timeout=10)
+    assert now[0] <= 10